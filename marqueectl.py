@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+"""
+Command line client for the marquee process, meant for hook scripts. All the
+commands of an event are sent in one go over a single connection, without waiting
+for any responses (unless 'get_state' is used), and the marquee process is only
+started if connecting to it fails.
+
+Commands are JSON arrays with the name of a command followed by its arguments
+(same as the arguments of the corresponding function in 'marqueemanager'), given
+either as arguments or as one JSON array of commands on stdin:
+
+    marqueectl.py '["clear"]' '["show_image", "/path/to/marquee.png", 64]' '["set_state", "_last_event", "game-select"]'
+
+The state commands and the events are handled by the marquee process as soon as they
+arrive, consecutive runs of the other commands (except 'close', which is only
+honored on its own) are sent as a single command list. The
+response to each 'get_state', 'get_states', 'compare_and_set_states' and
+'handle_event' is printed as a line of JSON. This only needs the standard library, so
+running it with 'python3 -S' shaves a bit off the interpreter startup
+"""
+
+import json
+import sys
+
+import marqueemanager as mm
+
+# Commands and the functions that build them
+COMMANDS = {
+    'clear': mm.clear_command,
+    'show_image': mm.show_image_command,
+    'grow_image': mm.grow_image_command,
+    'flyout': mm.flyout_command,
+    'pulse_image': mm.pulse_image_command,
+    'play_videos': mm.play_videos_command,
+    'horizontal_scroll_images': mm.horizontal_scroll_images_command,
+    'vertical_scroll_images': mm.vertical_scroll_images_command,
+    'set_background_color': mm.set_background_color_command,
+    'prefetch': mm.prefetch_command,
+    'set_memory_budget': mm.set_memory_budget_command,
+    'cpu_usage_visualization': mm.cpu_usage_visualization_command,
+    'set_state': mm.set_state_command,
+    'event': mm.event_command,
+    'handle_event': lambda event, args: mm._make_command(mm.COMMAND_HANDLE_EVENT, {
+        'event': event,
+        'args': args}),
+    'get_state': lambda key: mm._make_command(mm.COMMAND_GET_STATE, {'key': key}),
+    'set_states': mm.set_states_command,
+    'get_states': lambda keys: mm._make_command(mm.COMMAND_GET_STATES, {'keys': keys}),
+    'compare_and_set_states': lambda expected, values: mm._make_command(mm.COMMAND_COMPARE_AND_SET_STATES, {
+        'expected': expected,
+        'values': values}),
+    'noop': lambda: mm._make_command(mm.COMMAND_NOOP),
+    'close': lambda: mm._make_command(mm.COMMAND_CLOSE),
+}
+
+# Commands the command listener handles itself (i.e. they can't be part of a command list)
+LISTENER_COMMANDS = {'set_state', 'get_state', 'set_states', 'get_states', 'compare_and_set_states', 'event', 'handle_event'}
+
+# Commands the marquee process responds to
+RESPONSE_COMMANDS = {'get_state', 'get_states', 'compare_and_set_states', 'handle_event'}
+
+TIMEOUT = 0.5
+
+
+def build_frames(commands):
+    """
+    Build the frames to send for a list of commands, returns the frames (as one
+    buffer) and the number of responses to expect
+    """
+    frames = bytearray()
+    command_list = []
+    response_count = 0
+
+    def flush_command_list():
+        if len(command_list) == 1:
+            frames.extend(mm._encode_frame(command_list[0]))
+        elif command_list:
+            frames.extend(mm._encode_frame(mm._make_command(mm.COMMAND_COMMAND_LIST, {'commands': list(command_list)})))
+        command_list.clear()
+
+    for name, *args in commands:
+        if name not in COMMANDS:
+            raise ValueError(f'Unknown command: {name}')
+        command = COMMANDS[name](*args)
+        if name in LISTENER_COMMANDS or name == 'close':
+            flush_command_list()
+            frames.extend(mm._encode_frame(command))
+            response_count += name in RESPONSE_COMMANDS
+        else:
+            command_list.append(command)
+    flush_command_list()
+
+    return frames, response_count
+
+
+def connect(start, display_idx, event_handlers=None):
+    """
+    Connect to the marquee process, starting it first if it isn't running (and 'start' is set)
+    """
+    try:
+        return mm._connect(mm._get_address(), TIMEOUT)
+    except (ConnectionRefusedError, FileNotFoundError, TimeoutError):
+        if not start or mm.start_marquee(display_idx, event_handlers=event_handlers) < 0:
+            return None
+    try:
+        return mm._connect(mm._get_address(), TIMEOUT)
+    except OSError:
+        return None
+
+
+def send_frames(sock, frames, response_count):
+    """
+    Send frames and receive the responses
+    """
+    sock.sendall(frames)
+    reader = mm._FrameReader(sock, buffer_size=4096)
+    return [mm._receive_on_socket(reader) for _ in range(response_count)]
+
+
+USAGE = """usage: marqueectl.py [--display IDX] [--address ADDRESS] [--event-handlers PATH] [--no-start] [COMMAND ...]
+
+Send commands (JSON arrays) to the marquee process, read from stdin if omitted
+
+  --display IDX      display used if the marquee process is started
+  --address ADDRESS  address of the marquee process, 'unix:<path>' or 'tcp:<host>:<port>'
+  --event-handlers PATH
+                     module with the event handlers, if the marquee process is started
+  --no-start         don't start the marquee process if it isn't running
+"""
+
+
+def usage_error(message):
+    sys.stderr.write(f'{USAGE}\nmarqueectl.py: error: {message}\n')
+    sys.exit(2)
+
+
+def error(message):
+    sys.stderr.write(f'marqueectl.py: error: {message}\n')
+    sys.exit(1)
+
+
+def main():
+    # Note: Arguments are parsed by hand, since importing argparse takes longer than the rest
+    display_idx = mm.DISPLAY_ONLY_MARQUEE
+    start = True
+    event_handlers = None
+    command_args = []
+    args = sys.argv[1:]
+    while args:
+        arg = args.pop(0)
+        if arg in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif arg == '--no-start':
+            start = False
+        elif arg in ('--display', '--address', '--event-handlers'):
+            if not args:
+                usage_error(f'{arg} expects a value')
+            value = args.pop(0)
+            try:
+                if arg == '--display':
+                    display_idx = int(value)
+                elif arg == '--event-handlers':
+                    event_handlers = value
+                else:
+                    mm.set_address(mm._address_from_str(value))
+            except ValueError:
+                usage_error(f'invalid value for {arg}: {value}')
+        else:
+            command_args.append(arg)
+
+    try:
+        if command_args:
+            commands = [json.loads(command) for command in command_args]
+        else:
+            commands = json.load(sys.stdin)
+        frames, response_count = build_frames(commands)
+    except (ValueError, TypeError) as ex:
+        # Note: Arguments of the wrong type fail to encode with ValueError
+        usage_error(str(ex))
+
+    sock = connect(start, display_idx, event_handlers)
+    if sock is None:
+        error("can't connect to the marquee process")
+    try:
+        with sock:
+            responses = send_frames(sock, frames, response_count)
+    except (OSError, EOFError) as ex:
+        error(f'lost connection to the marquee process: {ex!r}')
+
+    for response in responses:
+        print(json.dumps(response))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
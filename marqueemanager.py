@@ -1,13 +1,19 @@
 from abc import ABC, abstractmethod
+from collections import deque, OrderedDict
 import socket
 import struct
 import time
 import pickle
 import os
+import sys
 
 HOST = 'localhost'
 PORT = 6000
 
+# Unix domain socket used on platforms that support it, TCP (HOST, PORT) is the
+# fallback. A leading '@' denotes the (Linux only) abstract socket namespace
+UNIX_SOCKET_PATH = '@marqueemanager' if sys.platform.startswith('linux') else '/tmp/marqueemanager.sock'
+
 COMMAND_CLEAR = 'clear'
 COMMAND_SHOW_IMAGE = 'showimage'
 COMMAND_GROW_IMAGE = 'growimage'
@@ -23,34 +29,131 @@ COMMAND_GET_STATE = 'getstate'
 COMMAND_COMMAND_LIST = 'commandlist'
 COMMAND_CLOSE = 'close'
 COMMAND_NOOP = 'noop'
+COMMAND_GET_METRICS = 'getmetrics'
+COMMAND_EVENT = 'event'
+COMMAND_GET_STATES = 'getstates'
+COMMAND_SET_STATES = 'setstates'
+COMMAND_COMPARE_AND_SET_STATES = 'comparesetstates'
+COMMAND_SUBSCRIBE_STATE = 'subscribestate'
+COMMAND_PREFETCH = 'prefetch'
+COMMAND_SET_MEMORY_BUDGET = 'setmemorybudget'
+COMMAND_HANDLE_EVENT = 'handleevent'
 
 DISPLAY_ONLY_MARQUEE = -1
 DISPLAY_DEBUG = -2
 
+# Time per rendered frame spent processing queued commands, whatever doesn't fit
+# is carried over to the next frame (at least one command is processed per frame)
+COMMAND_TIME_BUDGET_SECONDS = 0.008
+
+# Number of worker threads that load media for new effects, so loading never
+# blocks rendering (see 'RenderManager.add_pending_effect')
+WORKER_THREAD_COUNT = min(4, os.cpu_count() or 1)
+
+# Prefetched media (see 'prefetch') is kept until it's used, as long as it fits in
+# these limits (oldest is dropped first). Prefetched images are kept as textures
+PREFETCH_MAX_BYTES = 64 * 1024 * 1024
+PREFETCH_MAX_VIDEOS = 4
+
+# Textures no longer used by any effect are kept around (least recently used are
+# destroyed first) as long as all cached textures fit in this budget
+TEXTURE_CACHE_BUDGET_BYTES = 128 * 1024 * 1024
+
+# Memory the textures, surfaces and video decoders of the marquee process may use (see
+# 'ResourceManager', and 'set_memory_budget' to change it). Once it's reached, cached
+# textures are evicted and effects that don't fit anyway are refused
+MEMORY_BUDGET_BYTES = 384 * 1024 * 1024
+
+# Estimated decoder memory of an opened video, in frames of its size (BGR)
+VIDEO_DECODER_FRAME_COUNT = 8
+
+# Decoded frames buffered ahead of playback (per video), see 'VideoDecoder'
+VIDEO_FRAME_RING_SIZE = 4
+
+# How a video decoder catches up when it falls behind playback (e.g. after the render
+# loop stalled): gaps of up to VIDEO_GRAB_MAX_FRAMES frames are skipped with 'grab'
+# (decoded, but not converted), larger gaps by seeking VIDEO_SEEK_AHEAD_SECONDS past
+# the frame that's due, to make up for the time the seek takes (it decodes from the
+# previous keyframe). A VIDEO_GRAB_MAX_FRAMES of None disables seeking
+VIDEO_GRAB_MAX_FRAMES = 15
+VIDEO_SEEK_AHEAD_SECONDS = 0.25
+
+# Videos are cropped to the part that's visible on the output (e.g. with 'fill') and
+# downscaled to the size they're drawn at, if that's at least this many times smaller
+VIDEO_DOWNSCALE_MIN_RATIO = 1.25
+
+# Largest scale (relative to fitting the output) images are drawn at, i.e. 'pulse_image'.
+# Raster images larger than needed at this scale are downscaled when they're loaded
+MAX_IMAGE_SCALE = 1.25
+
+# Max width/height of the textures images are packed into (see 'TextureAtlas'), also
+# limited by what the renderer supports
+ATLAS_MAX_SIZE = 4096
+
+# Decoded/rasterized images are kept on disk, see 'RasterCache'. The least recently
+# used entries are removed once the cache exceeds this size
+RASTER_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
 FIT_FILL = 'fill'
 FIT_FIT = 'fit'
 FIT_STRETCH = 'stretch'
 FIT_CENTER = 'center'
 
-def start_marquee(display_idx=DISPLAY_ONLY_MARQUEE):
+PREFETCH_IMAGE = 'image'
+PREFETCH_VIDEO = 'video'
+
+CODEC_BINARY = 'binary'
+CODEC_PICKLE = 'pickle'
+
+# Results of 'handle_event'
+EVENT_HANDLED = 'handled'
+EVENT_NO_HANDLER = 'nohandler'
+EVENT_NO_HANDLERS = 'nohandlers'
+EVENT_FAILED = 'failed'
+
+def start_marquee(display_idx=DISPLAY_ONLY_MARQUEE, address=None, codec=None, event_handlers=None):
     """
-    Start the marquee process
+    Start the marquee process. If 'address' is specified, the marquee process
+    listens on that address and it becomes the address used by all the client
+    functions (see 'set_address'). Similarly, 'codec' selects the wire format
+    (see 'set_codec'); the marquee process only accepts pickled commands if it
+    was started with CODEC_PICKLE. 'event_handlers' is the path of a module with
+    the handlers for the events sent with 'event' (see '_load_event_handlers')
     """
-
-    # This checks if a marquee process is already running. This is
-    # not really concurrency safe, i.e. if two processes call start_marquee
-    # in rapid succession, this would not catch it-- TODO: Come up with a better approach
+    if address is not None:
+        set_address(address)
+    if codec is not None:
+        set_codec(codec)
+
+    # This checks if a marquee process is already running. If two processes call
+    # start_marquee in rapid succession, the second marquee process fails to bind the
+    # address and exits, which '_wait_for_ready_signal' detects (POSIX only)
     if noop():
         return 0
 
     import subprocess
-    import sys
+
+    # On POSIX, the marquee process signals readiness through an inherited pipe as
+    # soon as its command listener is up. Elsewhere we poll the marquee process
+    ready_read_fd, ready_write_fd = os.pipe() if os.name != 'nt' else (None, None)
 
     # Start the marquee process
     flags = subprocess.DETACHED_PROCESS if os.name == 'nt' else 0
+    args = [sys.executable, __file__, str(display_idx), _address_to_str(_get_address()), _codec]
+    args.append(str(ready_write_fd) if ready_write_fd is not None else '-')
+    if event_handlers is not None:
+        args.append(os.path.abspath(event_handlers))
     process = subprocess.Popen(
-        [sys.executable, __file__, str(display_idx)],
-        creationflags=flags)
+        args,
+        creationflags=flags,
+        pass_fds=(ready_write_fd,) if ready_write_fd is not None else ())
+
+    # Give up after a while if the marquee process isn't responding
+    MAX_WAIT_TIME_SECONDS = 6
+
+    if ready_read_fd is not None:
+        os.close(ready_write_fd)
+        return _wait_for_ready_signal(ready_read_fd, MAX_WAIT_TIME_SECONDS)
 
     # Wait for the marquee process/window to be ready
     t0 = time.time()
@@ -59,8 +162,6 @@ def start_marquee(display_idx=DISPLAY_ONLY_MARQUEE):
             # If the marquee process crashed we return false
             return -1
 
-        # Give up after a while if the marquee process isn't responding
-        MAX_WAIT_TIME_SECONDS = 6
         elapsed = time.time() - t0
         if elapsed > MAX_WAIT_TIME_SECONDS:
             return -1
@@ -72,6 +173,35 @@ def start_marquee(display_idx=DISPLAY_ONLY_MARQUEE):
             time.sleep(0.1)
 
 
+_READY_SIGNAL = b'R'
+
+
+def _wait_for_ready_signal(ready_fd, timeout):
+    """
+    Wait for the marquee process to signal that it's ready, see 'start_marquee'
+    """
+    import select
+    try:
+        readable, _, _ = select.select([ready_fd], [], [], timeout)
+        if not readable:
+            return -1
+        if os.read(ready_fd, 1) == _READY_SIGNAL:
+            return 1
+        # The pipe was closed without a signal, i.e. the marquee process exited early. This
+        # happens if another marquee process (started concurrently) already has the address
+        return 0 if noop() else -1
+    finally:
+        os.close(ready_fd)
+
+
+def _signal_ready(ready_fd):
+    """
+    Tell the process that started us that we're ready, see 'start_marquee'
+    """
+    os.write(ready_fd, _READY_SIGNAL)
+    os.close(ready_fd)
+
+
 def horizontal_scroll_images_command(image_paths: list[str], speed: float, reverse: bool, margin: float, spacing: float, svg_aa_factor: float):
     return _make_command(COMMAND_HORZ_SCROLL_IMAGES, {
         'images': image_paths,
@@ -169,6 +299,38 @@ def set_background_color(r, g, b):
     return _send_marquee_command(set_background_color_command(r, g, b))
 
 
+def prefetch_command(paths: list[str], kind: str, height: float = 1.0, svg_aa_factor: float = 1.0):
+    return _make_command(COMMAND_PREFETCH, {
+        'paths': paths,
+        'kind': kind,
+        'height': height,
+        'svgaafactor': svg_aa_factor})
+
+
+def prefetch(paths: list[str], kind: str, height: float = 1.0, svg_aa_factor: float = 1.0):
+    """
+    Load media in the background ahead of the effects that use it (e.g. the marquees
+    of the games next to the selected one), without displaying it. 'kind' is
+    PREFETCH_IMAGE or PREFETCH_VIDEO. Images are loaded at 'height' (as a fraction of
+    the display height, like 'flyout') and 'svg_aa_factor', the defaults match
+    'show_image', 'grow_image' and 'pulse_image'
+    """
+    return _send_marquee_command(prefetch_command(paths, kind, height, svg_aa_factor))
+
+
+def set_memory_budget_command(budget_bytes: int):
+    return _make_command(COMMAND_SET_MEMORY_BUDGET, {
+        'budget': budget_bytes})
+
+
+def set_memory_budget(budget_bytes: int):
+    """
+    Set the memory budget of the marquee process (see MEMORY_BUDGET_BYTES). The
+    memory in use is reported by 'get_metrics'
+    """
+    return _send_marquee_command(set_memory_budget_command(budget_bytes))
+
+
 def command_list(commands: list[str]):
     return _send_marquee_command(_make_command(COMMAND_COMMAND_LIST, {
         'commands': commands }))
@@ -205,276 +367,1856 @@ def get_state(key):
         'key': key}))
 
 
-def _make_command(command_name, arguments=None):
-    return {
-        'name': command_name,
-        'arguments': arguments}
+def read_state(key):
+    """
+    Like 'get_state', but reads the value from the state snapshot the marquee process
+    publishes in shared memory, so it takes microseconds rather than a round trip.
+    Falls back to 'get_state' if there is no snapshot. Note: A change sent just before
+    (e.g. with 'set_state') may not be visible yet, since it's applied asynchronously
+    """
+    values = _read_state_snapshot()
+    if values is None:
+        return get_state(key)
+    return values.get(key)
 
 
-def _send_on_socket(sock, payload):
+def get_states(keys: list):
     """
-    Serialize and send payload via socket
+    Get the values of several keys in a single round trip, returns a list with the
+    values in the same order (None for keys that aren't set)
     """
-    buffer = pickle.dumps(payload)
-    buffer_size_bytes = struct.pack('<Q', len(buffer))
-    sock.sendall(buffer_size_bytes)
-    sock.sendall(buffer)
+    return _send_marquee_command_and_receive_response(_make_command(COMMAND_GET_STATES, {
+        'keys': keys}))
+
+
+def set_states_command(values: dict):
+    return _make_command(COMMAND_SET_STATES, {
+        'values': values})
 
 
-def _receive_on_socket(connection):
+def set_states(values: dict):
     """
-    Receive and de-serialize payload via socket
+    Set several keys at once
     """
-    def receive(connection, byte_count):
-        result = b''
-        while len(result) < byte_count:
-            chunk = connection.recv(byte_count - len(result))
-            if chunk:
-                result += chunk
-        return result
-    buffer_size_bytes = receive(connection, 8)
-    buffer_size = struct.unpack('<Q', buffer_size_bytes)[0]
-    buffer = receive(connection, buffer_size)
-    return pickle.loads(buffer)
+    return _send_marquee_command(set_states_command(values))
 
 
-def _send_marquee_command(command):
+def compare_and_set_states(expected: dict, values: dict):
     """
-    Send command to marquee process. Used by clients (including other
-    processes) who wants to interact with the marquee screen
+    Set the keys in 'values', but only if all the keys in 'expected' currently have
+    the expected values (None for keys that aren't set). Returns whether the values
+    were set, or None if the marquee process couldn't be reached or the arguments
+    aren't dicts. E.g. to only
+    update the last event if it changed, and find out whether it did:
+
+        compare_and_set_states({'_last_event': previous}, {'_last_event': current})
     """
-    TIMEOUT = 0.5
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        try:
-            sock.settimeout(TIMEOUT)
-            sock.connect((HOST, PORT))
-            _send_on_socket(sock, command)
-            return True
-        except (ConnectionRefusedError, TimeoutError) as ex:
-            return False
+    return _send_marquee_command_and_receive_response(_make_command(COMMAND_COMPARE_AND_SET_STATES, {
+        'expected': expected,
+        'values': values}))
 
 
-def _send_marquee_command_and_receive_response(command):
+def event_command(event: str, args: list[str]):
+    return _make_command(COMMAND_EVENT, {
+        'event': event,
+        'args': args})
+
+
+def event(event: str, args: list[str]):
     """
-    Similar to "_send_marquee_command", but this one receives a response too
+    Send an event (e.g. from a frontend hook script) to be handled by the marquee
+    process, see 'start_marquee'. The handler takes care of building the scene
     """
-    TIMEOUT = 0.5
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        try:
-            sock.settimeout(TIMEOUT)
-            sock.connect((HOST, PORT))
-            _send_on_socket(sock, command)
-            return _receive_on_socket(sock)
-        except (ConnectionRefusedError, TimeoutError) as ex:
-            return None
+    return _send_marquee_command(event_command(event, args))
 
-#
-# Below here, "server side" rendering logic
-#
 
-def _get_fit_rect(iw, ih, rw, rh, fit=FIT_FIT, margin=0):
+def handle_event(event: str, args: list[str]):
+    """
+    Like 'event', but waits for the handler to run. Returns EVENT_HANDLED,
+    EVENT_NO_HANDLER, EVENT_NO_HANDLERS (the marquee process was started without
+    handlers, e.g. by 'marqueectl.py') or EVENT_FAILED, or None if the marquee
+    process couldn't be reached
+    """
+    return _send_marquee_command_and_receive_response(_make_command(COMMAND_HANDLE_EVENT, {
+        'event': event,
+        'args': args}))
 
-    ih = float(ih)
-    iw = float(iw)
 
-    rh = float(rh)
-    rw = float(rw)
+def set_address(address):
+    """
+    Set the address of the marquee process used by the client functions. This is
+    either a (host, port) tuple for TCP, or a path for a unix domain socket (prefix
+    the path with '@' to use the abstract namespace). Passing None restores the default
+    """
+    global _address
+    _address = address
 
-    sx = (rw - 2 * margin) / iw
-    sy = (rh - 2 * margin) / ih
 
-    if fit == FIT_FILL:
-        s = max(sx, sy)
+def set_codec(codec):
+    """
+    Set the wire format used by the client functions, CODEC_BINARY (default) or
+    CODEC_PICKLE. The latter is only supported for compatibility with older clients
+    """
+    global _codec
+    assert codec in (CODEC_BINARY, CODEC_PICKLE)
+    _codec = codec
 
-    elif fit == FIT_FIT:
-        s = min(sx, sy)
 
-    elif fit == FIT_STRETCH:
-        return sdl2.SDL_FRect(x=margin, y=margin, w=rw - 2 * margin, h=rh - 2 * margin)
+def _get_address():
+    if _address is not None:
+        return _address
+    if hasattr(socket, 'AF_UNIX'):
+        return UNIX_SOCKET_PATH
+    return (HOST, PORT)
 
-    elif fit == FIT_CENTER:
-        s = 1.0
 
-    dw = iw * s
-    dh = ih * s
-    dx = (rw - dw) * 0.5
-    dy = (rh - dh) * 0.5
+def _address_to_str(address):
+    """
+    Encode address as a string, so it can be passed on the command line
+    """
+    if isinstance(address, str):
+        return f'unix:{address}'
+    host, port = address
+    return f'tcp:{host}:{port}'
 
-    return sdl2.SDL_FRect(x=dx, y=dy, w=dw, h=dh)
 
+def _address_from_str(address_str):
+    kind, _, address = address_str.partition(':')
+    if kind == 'unix':
+        return address
+    host, _, port = address.rpartition(':')
+    return (host, int(port))
 
-class Animation(ABC):
 
-    @abstractmethod
-    def restart(self, start_time=None):
-        pass
+def _create_socket(address):
+    """
+    Create a socket for the address, returns the socket and the address in the
+    form expected by 'connect' and 'bind'
+    """
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if address.startswith('@'):
+            address = '\0' + address[1:]
+        return sock, address
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    return sock, tuple(address)
 
-    @abstractmethod
-    def total_duration(self):
-        pass
 
-    @abstractmethod
-    def evaluate(self, eval_time=None):
-        pass
+def _is_connection_closed(sock):
+    """
+    Check whether the other end closed a (persistent) connection. Sending on it would
+    still succeed, but whatever is sent is lost
+    """
+    import select
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        # Note: Nothing is sent unasked on a client connection, so anything to read is the end of it
+        return bool(readable)
+    except (OSError, ValueError):
+        return True
 
 
-class ValueAnimation(Animation):
+def _connect(address, timeout):
     """
-    Animates a single numerical value
+    Connect to the marquee process
     """
-    def __init__(self, begin, end, duration=0, start_time=None, ease=False, repeat=False, linger_duration=0, start_delay=0):
-        assert duration >= 0.0
-        self.begin = begin
-        self.end = end
-        self.duration = duration
-        self.start_delay = start_delay
-        self.linger_duration = linger_duration
-        self.ease = ease
-        self.repeat = repeat
-        self.restart(start_time)
+    sock, sock_address = _create_socket(address)
+    try:
+        sock.settimeout(timeout)
+        deadline = time.time() + timeout
+        while True:
+            try:
+                sock.connect(sock_address)
+                break
+            except BlockingIOError:
+                # Note: Unix domain sockets fail right away (rather than block) when the
+                # listener's backlog is full, so we wait a bit for the listener to catch up
+                if time.time() > deadline:
+                    raise TimeoutError('Timed out connecting to marquee process')
+                time.sleep(0.001)
+        if sock.family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except:
+        sock.close()
+        raise
+    return sock
+
+
+def get_metrics():
+    """
+    Get performance metrics of the marquee process (e.g. command queue depth)
+    """
+    return _send_marquee_command_and_receive_response(_make_command(COMMAND_GET_METRICS))
 
-    def restart(self, start_time=None):
-        self.start_time = time.time() if start_time is None else start_time
 
-    def total_duration(self):
-        return self.start_delay + self.duration + self.linger_duration
+def _make_command(command_name, arguments=None):
+    return {
+        'name': command_name,
+        'arguments': arguments}
 
-    def evaluate(self, eval_time=None):
-        eval_time = time.time() if eval_time is None else eval_time
-        dt = eval_time - self.start_time
 
-        if dt < 0:
-            return self.begin, False
+#
+# Binary wire format. A payload starts with a header (magic byte, format version and
+# payload kind), followed by a table with the strings used as command arguments, so e.g.
+# an image path used by several commands in a command list is only sent once. Then
+# follows either a command or a value (the response to 'getstate'). A command is an
+# opcode followed by its arguments, with the order and types given by '_COMMAND_SCHEMAS'.
+# Strings in the table are referenced by 16-bit index (starting at 1, 0 is None), and
+# all counts are varints
+#
 
-        total_duration = self.total_duration()
-        if self.repeat and dt > total_duration:
-            dt %= total_duration
+WIRE_FORMAT_VERSION = 2
+
+# Note: Pickled payloads start with 0x80, so we can tell the two formats apart
+_WIRE_MAGIC = 0x4D
+
+_PAYLOAD_COMMAND = 0
+_PAYLOAD_VALUE = 1
+
+_FIELD_FLOAT = 'd'
+_FIELD_BOOL = '?'
+_FIELD_STR = 'H'
+_FIELD_COLOR = 'ddd'
+_FIELD_STR_LIST = 'strlist'
+_FIELD_VALUE = 'value'
+_FIELD_COMMAND_LIST = 'commandlist'
+
+_VALUE_NONE = 0
+_VALUE_FALSE = 1
+_VALUE_TRUE = 2
+_VALUE_INT = 3
+_VALUE_FLOAT = 4
+_VALUE_STR = 5
+_VALUE_LIST = 6
+_VALUE_DICT = 7
+
+# Note: The opcode of a command is its index in this list, so new commands must
+# be appended at the end. Any other change requires bumping WIRE_FORMAT_VERSION
+_COMMAND_SCHEMAS = [
+    (COMMAND_NOOP, ()),
+    (COMMAND_CLOSE, ()),
+    (COMMAND_CLEAR, ()),
+    (COMMAND_SHOW_IMAGE, (
+        ('image', _FIELD_STR),
+        ('margin', _FIELD_FLOAT))),
+    (COMMAND_GROW_IMAGE, (
+        ('image', _FIELD_STR),
+        ('startmargin', _FIELD_FLOAT),
+        ('endmargin', _FIELD_FLOAT),
+        ('duration', _FIELD_FLOAT),
+        ('fade', _FIELD_STR))),
+    (COMMAND_FLYOUT, (
+        ('image', _FIELD_STR),
+        ('alpha', _FIELD_FLOAT),
+        ('height', _FIELD_FLOAT),
+        ('margin', _FIELD_FLOAT),
+        ('delay', _FIELD_FLOAT))),
+    (COMMAND_PULSE_IMAGE, (
+        ('image', _FIELD_STR),)),
+    (COMMAND_PLAY_VIDEOS, (
+        ('videos', _FIELD_STR_LIST),
+        ('margin', _FIELD_FLOAT),
+        ('alpha', _FIELD_FLOAT),
+        ('fit', _FIELD_STR),
+        ('delay', _FIELD_FLOAT))),
+    (COMMAND_HORZ_SCROLL_IMAGES, (
+        ('images', _FIELD_STR_LIST),
+        ('speed', _FIELD_FLOAT),
+        ('reverse', _FIELD_BOOL),
+        ('margin', _FIELD_FLOAT),
+        ('spacing', _FIELD_FLOAT),
+        ('svgaafactor', _FIELD_FLOAT))),
+    (COMMAND_VERT_SCROLL_IMAGES, (
+        ('images', _FIELD_STR_LIST),)),
+    (COMMAND_BACKGROUND, (
+        ('color', _FIELD_COLOR),)),
+    (COMMAND_CPU_USAGE_VISUALIZATION, ()),
+    (COMMAND_SET_STATE, (
+        ('key', _FIELD_VALUE),
+        ('value', _FIELD_VALUE))),
+    (COMMAND_GET_STATE, (
+        ('key', _FIELD_VALUE),)),
+    (COMMAND_COMMAND_LIST, (
+        ('commands', _FIELD_COMMAND_LIST),)),
+    (COMMAND_GET_METRICS, ()),
+    (COMMAND_EVENT, (
+        ('event', _FIELD_STR),
+        ('args', _FIELD_STR_LIST))),
+    (COMMAND_GET_STATES, (
+        ('keys', _FIELD_VALUE),)),
+    (COMMAND_SET_STATES, (
+        ('values', _FIELD_VALUE),)),
+    (COMMAND_COMPARE_AND_SET_STATES, (
+        ('expected', _FIELD_VALUE),
+        ('values', _FIELD_VALUE))),
+    (COMMAND_SUBSCRIBE_STATE, (
+        ('keys', _FIELD_VALUE),)),
+    (COMMAND_PREFETCH, (
+        ('paths', _FIELD_STR_LIST),
+        ('kind', _FIELD_STR),
+        ('height', _FIELD_FLOAT),
+        ('svgaafactor', _FIELD_FLOAT))),
+    (COMMAND_SET_MEMORY_BUDGET, (
+        ('budget', _FIELD_VALUE),)),
+    (COMMAND_HANDLE_EVENT, (
+        ('event', _FIELD_STR),
+        ('args', _FIELD_STR_LIST))),
+]
+
+_OPCODES = {name: opcode for opcode, (name, _) in enumerate(_COMMAND_SCHEMAS)}
+
+_HEADER = struct.Struct('<BBB')
+_DOUBLE = struct.Struct('<d')
+_COLOR = struct.Struct('<' + _FIELD_COLOR)
+
+# Maximum number of distinct strings in a single payload
+_MAX_STRINGS = 0xFFFF
+
+# Maximum nesting of values and command lists in a single payload
+_MAX_NESTING = 32
+
+
+def _compile_schema(fields):
+    """
+    Compile the fields of a command schema into a list of (field, keys, struct, string
+    keys) steps. Runs of fixed size fields are merged into one step (with field None)
+    and a precompiled struct, so they can be packed and unpacked with a single call. The
+    string keys are the ones to look up in the string table. Other fields get a step of
+    their own
+    """
+    steps = []
+    run = []
+    def flush():
+        if run:
+            steps.append((
+                None,
+                tuple(key for key, _ in run),
+                struct.Struct('<' + ''.join(field for _, field in run)),
+                tuple(key for key, field in run if field == _FIELD_STR)))
+            run.clear()
+    for key, field in fields:
+        if field in (_FIELD_STR_LIST, _FIELD_VALUE, _FIELD_COMMAND_LIST, _FIELD_COLOR):
+            flush()
+            steps.append((field, key, None, ()))
+        else:
+            run.append((key, field))
+    flush()
+    return steps
 
-        if dt < self.start_delay:
-            return self.begin, False
 
-        if dt < self.start_delay + self.duration:
-            r = (dt - self.start_delay) / self.duration
-            if self.ease:
-                r = r - 1.0
-                r = -(r * r * r * r - 1.0)
-            return self.begin + (self.end - self.begin) * r, False
+_COMMAND_STEPS = [_compile_schema(fields) for _, fields in _COMMAND_SCHEMAS]
 
-        return self.end, dt > total_duration
 
+def _write_varint(buffer, n):
+    while n >= 0x80:
+        buffer.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buffer.append(n)
 
-class AnimationSequence(Animation):
 
-    def __init__(self, *animations, repeat=False):
-        self.animations = animations
-        self.idx = 0
-        self.repeat = repeat
+def _read_varint(buffer, pos):
+    n = buffer[pos]
+    pos += 1
+    if n < 0x80:
+        return n, pos
+    n &= 0x7F
+    shift = 7
+    while True:
+        b = buffer[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
 
-    def restart(self, start_time=None):
-        self.idx = 0
-        for anim in self.animations:
-            anim.restart(start_time)
 
-    def total_duration(self):
-        sum = 0.0
-        for anim in self.animations:
-            sum += anim.total_duration()
-        return sum
+class _BinaryEncoder(object):
+    """
+    Encodes a single payload, see '_encode_binary'
+    """
+    def __init__(self):
+        self.body = bytearray()
+        self.strings = {}
+
+    def intern(self, s):
+        if s is None:
+            return 0
+        idx = self.strings.get(s)
+        if idx is None:
+            if not isinstance(s, str):
+                raise TypeError(f'Expected a string, got {type(s).__name__}')
+            if '\0' in s:
+                raise ValueError('Strings must not contain NUL characters')
+            idx = self.strings[s] = len(self.strings) + 1
+            if idx >= _MAX_STRINGS:
+                raise ValueError('Too many strings in payload')
+        return idx
+
+    def write_value(self, value):
+        body = self.body
+        if value is None:
+            body.append(_VALUE_NONE)
+        elif value is False:
+            body.append(_VALUE_FALSE)
+        elif value is True:
+            body.append(_VALUE_TRUE)
+        elif isinstance(value, int):
+            # Zigzag encoding, so small negative numbers are small too
+            body.append(_VALUE_INT)
+            _write_varint(body, (value << 1) if value >= 0 else ((-value << 1) - 1))
+        elif isinstance(value, float):
+            body.append(_VALUE_FLOAT)
+            body += _DOUBLE.pack(value)
+        elif isinstance(value, str):
+            # Note: State values are stored inline (they may contain anything)
+            encoded = value.encode('utf-8')
+            body.append(_VALUE_STR)
+            _write_varint(body, len(encoded))
+            body += encoded
+        elif isinstance(value, (list, tuple)):
+            body.append(_VALUE_LIST)
+            _write_varint(body, len(value))
+            for item in value:
+                self.write_value(item)
+        elif isinstance(value, dict):
+            body.append(_VALUE_DICT)
+            _write_varint(body, len(value))
+            for key, item in value.items():
+                self.write_value(key)
+                self.write_value(item)
+        else:
+            raise TypeError(f'Unsupported value type: {type(value).__name__}')
+
+    def write_command(self, command):
+        name = command['name']
+        args = command['arguments']
+        opcode = _OPCODES.get(name)
+        if opcode is None:
+            raise ValueError(f'Unknown command: {name}')
+        body = self.body
+        body.append(opcode)
+        for field, keys, step, str_keys in _COMMAND_STEPS[opcode]:
+            if field is None:
+                if str_keys:
+                    body += step.pack(*[self.intern(args[key]) if key in str_keys else args[key] for key in keys])
+                else:
+                    body += step.pack(*[args[key] for key in keys])
+            elif field == _FIELD_STR_LIST:
+                items = args[keys]
+                _write_varint(body, len(items))
+                body += struct.pack(f'<{len(items)}H', *[self.intern(item) for item in items])
+            elif field == _FIELD_VALUE:
+                self.write_value(args[keys])
+            elif field == _FIELD_COMMAND_LIST:
+                child_commands = args[keys]
+                _write_varint(body, len(child_commands))
+                for child_command in child_commands:
+                    self.write_command(child_command)
+            else:
+                body += _COLOR.pack(*args[keys])
 
-    def evaluate(self, eval_time=None):
-        anim = self.animations[self.idx]
-        val, done = anim.evaluate(eval_time)
-        if done and (self.idx < len(self.animations) - 1 or self.repeat):
-            old_anim = self.animations[self.idx]
-            new_anim_start_time = old_anim.start_time + old_anim.total_duration()
-            self.idx += 1
-            self.idx %= len(self.animations)
-            new_anim = self.animations[self.idx]
-            new_anim.restart(new_anim_start_time)
-            return val, False
-        return val, done
+    def finish(self, payload_kind):
+        buffer = bytearray(_HEADER.pack(_WIRE_MAGIC, WIRE_FORMAT_VERSION, payload_kind))
+        table = '\0'.join(self.strings).encode('utf-8')
+        _write_varint(buffer, len(table))
+        buffer += table
+        buffer += self.body
+        return buffer
 
 
-class ColorAnimation(Animation):
+class _BinaryDecoder(object):
+    """
+    Decodes a single payload, see '_decode_binary'
+    """
+    def __init__(self, buffer):
+        self.buffer = buffer
+        length, pos = _read_varint(buffer, _HEADER.size)
+        self.pos = pos + length
+        if self.pos > len(buffer):
+            raise ValueError('Truncated string table')
+        self.strings = [None] + str(buffer[pos:self.pos], 'utf-8').split('\0')
+
+    def read_value(self, depth=0):
+        buffer = self.buffer
+        tag = buffer[self.pos]
+        self.pos += 1
+        if tag == _VALUE_NONE:
+            return None
+        elif tag == _VALUE_FALSE:
+            return False
+        elif tag == _VALUE_TRUE:
+            return True
+        elif tag == _VALUE_INT:
+            n, self.pos = _read_varint(buffer, self.pos)
+            return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+        elif tag == _VALUE_FLOAT:
+            value, = _DOUBLE.unpack_from(buffer, self.pos)
+            self.pos += _DOUBLE.size
+            return value
+        elif tag == _VALUE_STR:
+            length, pos = _read_varint(buffer, self.pos)
+            self.pos = pos + length
+            if self.pos > len(buffer):
+                raise ValueError('Truncated string')
+            return str(buffer[pos:self.pos], 'utf-8')
+        elif tag == _VALUE_LIST:
+            count, self.pos = _read_varint(buffer, self.pos)
+            depth = self._nest(depth)
+            return [self.read_value(depth) for _ in range(count)]
+        elif tag == _VALUE_DICT:
+            count, self.pos = _read_varint(buffer, self.pos)
+            depth = self._nest(depth)
+            result = {}
+            for _ in range(count):
+                key = self.read_value(depth)
+                result[key] = self.read_value(depth)
+            return result
+        raise ValueError(f'Unknown value tag: {tag}')
+
+    @staticmethod
+    def _nest(depth):
+        if depth >= _MAX_NESTING:
+            raise ValueError('Payload nested too deeply')
+        return depth + 1
+
+    def read_command(self, depth=0):
+        # Note: This runs on the command listener thread for every command, hence the
+        # locals and the fast path for runs of fixed size fields
+        buffer = self.buffer
+        strings = self.strings
+        pos = self.pos
+        opcode = buffer[pos]
+        pos += 1
+        if opcode >= len(_COMMAND_SCHEMAS):
+            raise ValueError(f'Unknown opcode: {opcode}')
+        args = {}
+        for field, keys, step, str_keys in _COMMAND_STEPS[opcode]:
+            if field is None:
+                args.update(zip(keys, step.unpack_from(buffer, pos)))
+                pos += step.size
+                for key in str_keys:
+                    args[key] = strings[args[key]]
+            elif field == _FIELD_STR_LIST:
+                count, pos = _read_varint(buffer, pos)
+                indices = struct.unpack_from(f'<{count}H', buffer, pos)
+                pos += 2 * count
+                args[keys] = [strings[idx] for idx in indices]
+            elif field == _FIELD_VALUE:
+                self.pos = pos
+                args[keys] = self.read_value(depth)
+                pos = self.pos
+            elif field == _FIELD_COMMAND_LIST:
+                count, self.pos = _read_varint(buffer, pos)
+                child_depth = self._nest(depth)
+                args[keys] = [self.read_command(child_depth) for _ in range(count)]
+                pos = self.pos
+            else:
+                args[keys] = _COLOR.unpack_from(buffer, pos)
+                pos += _COLOR.size
+        self.pos = pos
+        return {'name': _COMMAND_SCHEMAS[opcode][0], 'arguments': args if args else None}
 
-    def __init__(self, begin, end, duration, start_time=None, ease=False, repeat=False):
-        assert isinstance(begin, tuple) and len(begin) == 3
-        assert isinstance(end, tuple) and len(end) == 3
-        self.r = ValueAnimation(begin[0], end[0], duration, start_time, ease, repeat)
-        self.g = ValueAnimation(begin[1], end[1], duration, start_time, ease, repeat)
-        self.b = ValueAnimation(begin[2], end[2], duration, start_time, ease, repeat)
 
-    def restart(self, start_time=None):
-        self.r.restart(start_time)
-        self.g.restart(start_time)
-        self.b.restart(start_time)
+def _encode_binary(payload, payload_kind):
+    encoder = _BinaryEncoder()
+    if payload_kind == _PAYLOAD_COMMAND:
+        encoder.write_command(payload)
+    else:
+        encoder.write_value(payload)
+    return encoder.finish(payload_kind)
 
-    def total_duration(self):
-        return max(
-            self.r.total_duration(),
-            self.g.total_duration(),
-            self.b.total_duration())
 
-    def evaluate(self, eval_time=None):
-        eval_time = time.time() if eval_time is None else eval_time
-        r_val, r_done = self.r.evaluate(eval_time)
-        g_val, g_done = self.g.evaluate(eval_time)
-        b_val, b_done = self.b.evaluate(eval_time)
-        return (r_val, g_val, b_val), all([r_done, g_done, b_done])
+def _decode_binary(buffer):
+    """
+    Decode binary payload, raises ValueError if the payload is malformed
+    """
+    magic, version, payload_kind = _HEADER.unpack_from(buffer, 0)
+    if magic != _WIRE_MAGIC or version != WIRE_FORMAT_VERSION:
+        raise ValueError(f'Unsupported wire format (version {version})')
+    try:
+        decoder = _BinaryDecoder(buffer)
+        if payload_kind == _PAYLOAD_COMMAND:
+            return decoder.read_command()
+        return decoder.read_value()
+    except (IndexError, TypeError, struct.error, RecursionError) as ex:
+        raise ValueError('Malformed payload') from ex
 
 
-class Image(object):
+def _encode_payload(payload, codec, payload_kind):
     """
-    Small wrapper class for images
+    Encode payload in the given wire format, raises ValueError if it can't be encoded
+    (e.g. arguments of the wrong type)
     """
-    def __init__(self, renderer, path, height=0, width=0, svg_aa_factor=1):
+    try:
+        if codec == CODEC_PICKLE:
+            return pickle.dumps(payload)
+        return _encode_binary(payload, payload_kind)
+    except (KeyError, TypeError, struct.error, RecursionError, pickle.PicklingError) as ex:
+        raise ValueError(f'Can\'t encode payload: {ex}') from ex
 
-        MAX_DIM = 8192
-        if path.lower().endswith('.svg'):
-            self.surface = sdl2.ext.image.load_svg(path, int(width * svg_aa_factor), int(height * svg_aa_factor), as_argb=True)
-            # Don't exceed max allowed texture size
-            if self.surface.w > MAX_DIM or self.surface.h > MAX_DIM:
-                sx = MAX_DIM / float(self.surface.w)
-                sy = MAX_DIM / float(self.surface.h)
-                s = min(sx, sy)
-                sdl2.SDL_FreeSurface(self.surface)
-                self.surface = sdl2.ext.image.load_svg(path, int(width * s), int(height * s), as_argb=True)
-        else:
-            self.surface = sdl2.ext.image.load_img(path, as_argb=True)
 
-        assert self.surface.w <= MAX_DIM
-        assert self.surface.h <= MAX_DIM
+def _decode_payload(buffer, allow_pickle):
+    """
+    Decode payload in either wire format, returns the payload and the codec used
+    """
+    if len(buffer) < _HEADER.size:
+        raise ValueError('Truncated payload')
+    if buffer[0] == _WIRE_MAGIC:
+        return _decode_binary(buffer), CODEC_BINARY
+    if not allow_pickle:
+        raise ValueError('Pickled payloads are not accepted')
+    return pickle.loads(buffer), CODEC_PICKLE
 
-        self.tex = sdl2.SDL_CreateTextureFromSurface(renderer, self.surface)
-        sdl2.SDL_SetTextureBlendMode(self.tex, sdl2.SDL_BLENDMODE_BLEND)
 
-    def cleanup(self):
-        sdl2.SDL_DestroyTexture(self.tex)
-        sdl2.SDL_FreeSurface(self.surface)
+def _encode_frame(payload, codec=None, payload_kind=_PAYLOAD_COMMAND):
+    """
+    Serialize payload into a size prefixed frame
+    """
+    buffer = _encode_payload(payload, codec or _codec, payload_kind)
+    return _FRAME_HEADER.pack(len(buffer)) + buffer
 
-    @property
-    def texture(self):
-        return self.tex
 
-    @property
-    def rect(self):
-        return sdl2.SDL_Rect(x=0, y=0, w=self.surface.w, h=self.surface.h)
+def _send_on_socket(sock, payload, codec=None, payload_kind=_PAYLOAD_COMMAND):
+    """
+    Serialize and send payload via socket
+    """
+    # Note: Send the size prefix and the payload in one go, two separate small
+    # writes interact badly with Nagle's algorithm on persistent connections
+    sock.sendall(_encode_frame(payload, codec, payload_kind))
 
-    @property
-    def width(self):
-        return self.surface.w
 
-    @property
-    def height(self):
-        return self.surface.h
+# Largest frame we accept, anything bigger is treated as a protocol error
+MAX_FRAME_SIZE = 16 * 1024 * 1024
 
+# Once the first byte of a frame has arrived, the rest must arrive within this time
+FRAME_TIMEOUT = 2.0
 
-class Effect(ABC):
+_FRAME_HEADER = struct.Struct('<Q')
+
+
+class _FrameReader(object):
     """
-    Effect base class
+    Buffered reader for size prefixed frames. Data is received directly into a
+    preallocated buffer (which only grows if a frame doesn't fit), and several
+    pipelined frames may be served from a single 'recv_into' call. Works with both
+    blocking ('read_frame') and non-blocking ('receive' + 'next_frame') sockets
     """
-    @abstractmethod
-    def render(self, renderer):
+    def __init__(self, sock, buffer_size=64 * 1024, max_frame_size=MAX_FRAME_SIZE, frame_timeout=FRAME_TIMEOUT):
+        self.sock = sock
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.max_frame_size = max_frame_size
+        self.frame_timeout = frame_timeout
+
+    @property
+    def has_partial_frame(self):
+        return self.start < self.end
+
+    def _get_frame_size(self):
+        """
+        Get the size of the next frame (including the size prefix), or None if
+        not enough bytes are buffered to tell
+        """
+        if self.end - self.start < _FRAME_HEADER.size:
+            return None
+        frame_size, = _FRAME_HEADER.unpack_from(self.buffer, self.start)
+        if frame_size > self.max_frame_size:
+            raise ValueError(f'Frame too large ({frame_size} bytes)')
+        return _FRAME_HEADER.size + frame_size
+
+    def next_frame(self):
+        """
+        Get the next frame if it has been received completely, otherwise None. The
+        returned memoryview is only valid until the next call to 'receive'
+        """
+        frame_size = self._get_frame_size()
+        if frame_size is None or self.end - self.start < frame_size:
+            return None
+        frame = self.view[self.start + _FRAME_HEADER.size:self.start + frame_size]
+        self.start += frame_size
+        if self.start == self.end:
+            self.start = self.end = 0
+        return frame
+
+    def receive(self):
+        """
+        Receive whatever is available on the socket (a single 'recv_into' call)
+        """
+        # Make room for the rest of the pending frame, either by moving the unconsumed
+        # bytes to the front of the buffer or, if the frame is too big, by growing it
+        required = self._get_frame_size() or _FRAME_HEADER.size
+        if self.start + required > len(self.buffer):
+            pending = self.view[self.start:self.end]
+            if required > len(self.buffer):
+                self.buffer = bytearray(max(required, 2 * len(self.buffer)))
+            else:
+                pending = bytes(pending)
+            self.buffer[:len(pending)] = pending
+            self.view = memoryview(self.buffer)
+            self.end -= self.start
+            self.start = 0
+
+        byte_count_received = self.sock.recv_into(self.view[self.end:])
+        if byte_count_received == 0:
+            raise EOFError('Connection closed by peer')
+        self.end += byte_count_received
+
+    def read_frame(self):
+        """
+        Receive a single frame (blocking). The returned memoryview is only valid until the next call
+        """
+        timeout = self.sock.gettimeout()
+        try:
+            deadline = None
+            while True:
+                frame = self.next_frame()
+                if frame is not None:
+                    return frame
+
+                # The frame has started, from here on it must complete before the deadline
+                if deadline is None and self.has_partial_frame and self.frame_timeout is not None:
+                    deadline = time.monotonic() + self.frame_timeout
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError('Timed out receiving frame')
+                    self.sock.settimeout(remaining)
+
+                self.receive()
+        finally:
+            self.sock.settimeout(timeout)
+
+
+def _receive_on_socket(reader):
+    """
+    Receive and de-serialize payload via socket. Used by clients, so pickled
+    payloads are only accepted if the client itself is using the pickle codec
+    """
+    payload, _ = _decode_payload(reader.read_frame(), allow_pickle=_codec == CODEC_PICKLE)
+    return payload
+
+
+class Session(object):
+    """
+    Persistent client connection to the marquee process. Commands are pipelined
+    over a single socket, which is (re)connected on demand. While a session is
+    active (i.e. used as a context manager) all the module level functions, such
+    as 'show_image' or 'get_state', are sent through it:
+
+        with Session():
+            clear()
+            show_image(path, 8)
+
+    If 'address' is not specified the address set with 'set_address' is used
+    """
+    TIMEOUT = 0.5
+
+    def __init__(self, address=None):
+        self.address = address
+        self.sock = None
+        self.reader = None
+        self.previous_session = None
+
+    def __enter__(self):
+        global _active_session
+        self.previous_session = _active_session
+        _active_session = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active_session
+        _active_session = self.previous_session
+        self.previous_session = None
+        self.close()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            self.reader = None
+
+    def _transact(self, command, expect_response):
+        try:
+            frame = _encode_frame(command)
+        except ValueError:
+            return None if expect_response else False
+        # Note: If the connection was dropped (e.g. the marquee process was restarted) we
+        # reconnect and retry once; if we can't connect at all we give up right away. Once
+        # the command was sent it's never sent again, the marquee process may have run it
+        for _ in range(2):
+            try:
+                if self.sock is not None and _is_connection_closed(self.sock):
+                    self.close()
+                if self.sock is None:
+                    address = self.address if self.address is not None else _get_address()
+                    self.sock = _connect(address, self.TIMEOUT)
+                    self.reader = _FrameReader(self.sock, buffer_size=4096)
+            except (ConnectionRefusedError, FileNotFoundError, TimeoutError):
+                self.close()
+                break
+            except OSError:
+                self.close()
+                continue
+            try:
+                self.sock.sendall(frame)
+            except OSError:
+                self.close()
+                continue
+            try:
+                return _receive_on_socket(self.reader) if expect_response else True
+            except (OSError, EOFError):
+                self.close()
+                break
+        return None if expect_response else False
+
+    def send(self, command):
+        """
+        Send command without waiting for the marquee process to handle it
+        """
+        return self._transact(command, expect_response=False)
+
+    def send_and_receive(self, command):
+        """
+        Send command and wait for the response
+        """
+        return self._transact(command, expect_response=True)
+
+
+class StateSubscription(object):
+    """
+    Connection on which the marquee process pushes state changes, so there is no
+    need to poll with 'get_state'. Subscribes to the given keys, or to all keys if
+    'keys' is None. The current values of the keys are sent right away:
+
+        with StateSubscription(['_last_event']) as subscription:
+            while True:
+                changes = subscription.receive()
+
+    If 'address' is not specified the address set with 'set_address' is used.
+    Raises ConnectionError etc. if the marquee process can't be reached, and
+    ValueError if 'keys' can't be encoded
+    """
+    TIMEOUT = 0.5
+
+    def __init__(self, keys=None, address=None):
+        frame = _encode_frame(_make_command(COMMAND_SUBSCRIBE_STATE, {
+            'keys': keys}))
+        address = address if address is not None else _get_address()
+        self.sock = _connect(address, self.TIMEOUT)
+        self.reader = _FrameReader(self.sock, buffer_size=4096)
+        self.sock.sendall(frame)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.sock.close()
+
+    def fileno(self):
+        """
+        Socket file descriptor, so the subscription can be used with 'select'
+        """
+        return self.sock.fileno()
+
+    def receive(self, timeout=None):
+        """
+        Wait for the next change. Returns a dict with the changed keys and their new
+        values, or None if nothing changed within 'timeout' seconds. Raises EOFError
+        if the marquee process went away
+        """
+        self.sock.settimeout(timeout)
+        try:
+            return _receive_on_socket(self.reader)
+        except TimeoutError:
+            if self.reader.has_partial_frame:
+                raise
+            return None
+
+
+#
+# State snapshot in shared memory. The command listener publishes the client state store
+# to a memory mapped file (in /dev/shm where available), which clients read without
+# involving the listener. The layout is a header followed by the state store as a binary
+# payload (see '_encode_binary'). The header has a sequence number which is odd while
+# the snapshot is being written, a reader retries if the sequence number is odd or
+# changed while it copied the payload (i.e. a seqlock)
+#
+
+_SNAPSHOT_MAGIC = 0x4D515353
+
+# Magic, process ID of the writer, sequence number, payload length and padding
+_SNAPSHOT_HEADER = struct.Struct('<IIQII')
+_SNAPSHOT_SEQUENCE = struct.Struct('<Q')
+_SNAPSHOT_SEQUENCE_OFFSET = 8
+
+# Payload length used if the state store doesn't fit (or can't be encoded)
+_SNAPSHOT_UNAVAILABLE = 0xFFFFFFFF
+
+SNAPSHOT_SIZE = 64 * 1024
+
+_SNAPSHOT_MAX_RETRIES = 100
+
+
+def _state_snapshot_path(address):
+    folder = '/dev/shm'
+    if not os.path.isdir(folder):
+        import tempfile
+        folder = tempfile.gettempdir()
+    name = ''.join(c if c.isalnum() else '_' for c in _address_to_str(address))
+    return os.path.join(folder, f'marqueemanager-state-{name}')
+
+
+class _StateSnapshotReader(object):
+    """
+    Reads the state snapshot published by the marquee process, see '_StateSnapshotWriter'
+    """
+    def __init__(self, path):
+        import mmap
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # The values last read, only decoded again if the sequence number changed
+        self.sequence = None
+        self.values = None
+
+    def close(self):
+        self.buffer.close()
+
+    def read(self):
+        """
+        Read a consistent copy of the state store, returns None if the snapshot is
+        unavailable, or was left behind by a marquee process that is gone. The
+        returned dict must not be modified
+        """
+        buffer = self.buffer
+        for _ in range(_SNAPSHOT_MAX_RETRIES):
+            magic, pid, sequence, length, _ = _SNAPSHOT_HEADER.unpack_from(buffer, 0)
+            if magic != _SNAPSHOT_MAGIC or length == _SNAPSHOT_UNAVAILABLE:
+                return None
+            if sequence & 1:
+                # Being written right now
+                continue
+            if sequence != self.sequence:
+                payload = buffer[_SNAPSHOT_HEADER.size:_SNAPSHOT_HEADER.size + length]
+                if _SNAPSHOT_SEQUENCE.unpack_from(buffer, _SNAPSHOT_SEQUENCE_OFFSET)[0] != sequence:
+                    continue
+                self.values = _decode_binary(payload)
+                self.sequence = sequence
+            if os.name != 'nt':
+                try:
+                    os.kill(pid, 0)
+                except ProcessLookupError:
+                    return None
+                except PermissionError:
+                    pass
+            return self.values
+        return None
+
+
+# Snapshot reader used by the client functions, and the address it was opened for
+_state_snapshot = None
+_state_snapshot_address = None
+
+
+def _read_state_snapshot():
+    """
+    Read the state snapshot of the marquee process, returns None if there is none
+    """
+    global _state_snapshot, _state_snapshot_address
+    address = _get_address()
+    for _ in range(2):
+        if _state_snapshot is None or _state_snapshot_address != address:
+            if _state_snapshot is not None:
+                _state_snapshot.close()
+                _state_snapshot = None
+            try:
+                _state_snapshot = _StateSnapshotReader(_state_snapshot_path(address))
+            except (OSError, ValueError):
+                return None
+            _state_snapshot_address = address
+        values = _state_snapshot.read()
+        if values is not None:
+            return values
+        # Note: The marquee process may have been restarted, which replaces the snapshot
+        # file, so we open it again before giving up
+        _state_snapshot.close()
+        _state_snapshot = None
+    return None
+
+
+# Address used by the client functions, see 'set_address'
+_address = None
+
+# Wire format used by the client functions, see 'set_codec'
+_codec = CODEC_BINARY
+
+# Session used by the module level functions, see 'Session'
+_active_session = None
+
+
+def _send_marquee_command(command):
+    """
+    Send command to marquee process. Used by clients (including other
+    processes) who wants to interact with the marquee screen
+    """
+    if _active_session is not None:
+        return _active_session.send(command)
+
+    TIMEOUT = 0.5
+    try:
+        frame = _encode_frame(command)
+        with _connect(_get_address(), TIMEOUT) as sock:
+            sock.sendall(frame)
+            return True
+    except (ConnectionError, FileNotFoundError, TimeoutError, ValueError) as ex:
+        return False
+
+
+def _send_marquee_command_and_receive_response(command):
+    """
+    Similar to "_send_marquee_command", but this one receives a response too
+    """
+    if _active_session is not None:
+        return _active_session.send_and_receive(command)
+
+    TIMEOUT = 0.5
+    try:
+        frame = _encode_frame(command)
+        with _connect(_get_address(), TIMEOUT) as sock:
+            sock.sendall(frame)
+            return _receive_on_socket(_FrameReader(sock, buffer_size=4096))
+    except (ConnectionError, FileNotFoundError, TimeoutError, EOFError, ValueError) as ex:
+        return None
+
+#
+# Below here, "server side" rendering logic
+#
+
+def _get_fit_rect(iw, ih, rw, rh, fit=FIT_FIT, margin=0):
+
+    ih = float(ih)
+    iw = float(iw)
+
+    rh = float(rh)
+    rw = float(rw)
+
+    sx = (rw - 2 * margin) / iw
+    sy = (rh - 2 * margin) / ih
+
+    if fit == FIT_FILL:
+        s = max(sx, sy)
+
+    elif fit == FIT_FIT:
+        s = min(sx, sy)
+
+    elif fit == FIT_STRETCH:
+        return sdl2.SDL_FRect(x=margin, y=margin, w=rw - 2 * margin, h=rh - 2 * margin)
+
+    elif fit == FIT_CENTER:
+        s = 1.0
+
+    dw = iw * s
+    dh = ih * s
+    dx = (rw - dw) * 0.5
+    dy = (rh - dh) * 0.5
+
+    return sdl2.SDL_FRect(x=dx, y=dy, w=dw, h=dh)
+
+
+class Animation(ABC):
+
+    @abstractmethod
+    def restart(self, start_time=None):
+        pass
+
+    @abstractmethod
+    def total_duration(self):
+        pass
+
+    @abstractmethod
+    def evaluate(self, eval_time=None):
+        pass
+
+
+class ValueAnimation(Animation):
+    """
+    Animates a single numerical value
+    """
+    def __init__(self, begin, end, duration=0, start_time=None, ease=False, repeat=False, linger_duration=0, start_delay=0):
+        assert duration >= 0.0
+        self.begin = begin
+        self.end = end
+        self.duration = duration
+        self.start_delay = start_delay
+        self.linger_duration = linger_duration
+        self.ease = ease
+        self.repeat = repeat
+        self.restart(start_time)
+
+    def restart(self, start_time=None):
+        self.start_time = time.time() if start_time is None else start_time
+
+    def total_duration(self):
+        return self.start_delay + self.duration + self.linger_duration
+
+    def evaluate(self, eval_time=None):
+        eval_time = time.time() if eval_time is None else eval_time
+        dt = eval_time - self.start_time
+
+        if dt < 0:
+            return self.begin, False
+
+        total_duration = self.total_duration()
+        if self.repeat and dt > total_duration:
+            dt %= total_duration
+
+        if dt < self.start_delay:
+            return self.begin, False
+
+        if dt < self.start_delay + self.duration:
+            r = (dt - self.start_delay) / self.duration
+            if self.ease:
+                r = r - 1.0
+                r = -(r * r * r * r - 1.0)
+            return self.begin + (self.end - self.begin) * r, False
+
+        return self.end, dt > total_duration
+
+
+class AnimationSequence(Animation):
+
+    def __init__(self, *animations, repeat=False):
+        self.animations = animations
+        self.idx = 0
+        self.repeat = repeat
+
+    def restart(self, start_time=None):
+        self.idx = 0
+        for anim in self.animations:
+            anim.restart(start_time)
+
+    def total_duration(self):
+        sum = 0.0
+        for anim in self.animations:
+            sum += anim.total_duration()
+        return sum
+
+    def evaluate(self, eval_time=None):
+        anim = self.animations[self.idx]
+        val, done = anim.evaluate(eval_time)
+        if done and (self.idx < len(self.animations) - 1 or self.repeat):
+            old_anim = self.animations[self.idx]
+            new_anim_start_time = old_anim.start_time + old_anim.total_duration()
+            self.idx += 1
+            self.idx %= len(self.animations)
+            new_anim = self.animations[self.idx]
+            new_anim.restart(new_anim_start_time)
+            return val, False
+        return val, done
+
+
+class ColorAnimation(Animation):
+
+    def __init__(self, begin, end, duration, start_time=None, ease=False, repeat=False):
+        assert isinstance(begin, tuple) and len(begin) == 3
+        assert isinstance(end, tuple) and len(end) == 3
+        self.r = ValueAnimation(begin[0], end[0], duration, start_time, ease, repeat)
+        self.g = ValueAnimation(begin[1], end[1], duration, start_time, ease, repeat)
+        self.b = ValueAnimation(begin[2], end[2], duration, start_time, ease, repeat)
+
+    def restart(self, start_time=None):
+        self.r.restart(start_time)
+        self.g.restart(start_time)
+        self.b.restart(start_time)
+
+    def total_duration(self):
+        return max(
+            self.r.total_duration(),
+            self.g.total_duration(),
+            self.b.total_duration())
+
+    def evaluate(self, eval_time=None):
+        eval_time = time.time() if eval_time is None else eval_time
+        r_val, r_done = self.r.evaluate(eval_time)
+        g_val, g_done = self.g.evaluate(eval_time)
+        b_val, b_done = self.b.evaluate(eval_time)
+        return (r_val, g_val, b_val), all([r_done, g_done, b_done])
+
+
+def _get_raster_cache_dir():
+    """
+    Get the folder of the raster cache, in the user's cache folder
+    """
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'marqueemanager', 'raster')
+
+
+class _MappedPixels(object):
+    """
+    Pixels of a raster cache entry, memory mapped from disk. Must outlive the surface using them
+    """
+    def __init__(self, mapping, offset, size):
+        import ctypes
+        self.mapping = mapping
+        self.pixels = (ctypes.c_ubyte * size).from_buffer(mapping, offset)
+
+    def close(self):
+        # Note: The ctypes array must be gone before the mapping can be closed
+        self.pixels = None
+        self.mapping.close()
+
+
+class RasterCache(object):
+    """
+    Persistent cache of decoded/rasterized images, so e.g. the logos don't have to be
+    rasterized again every time the marquee process starts. Each entry is a file with
+    a small header followed by the raw ARGB8888 pixels, which is memory mapped and
+    used as the pixels of a surface directly. Entries are keyed by source path,
+    modification time, target size and SVG AA factor. The least recently used entries
+    (by file modification time, which is bumped on every hit) are removed once the
+    cache exceeds 'max_bytes'. Thread safe, images are loaded on worker threads
+    """
+    MAGIC = b'MQRC'
+    VERSION = 1
+
+    # Magic, version, width, height and pitch
+    HEADER = struct.Struct('<4sIIII')
+
+    def __init__(self, folder, max_bytes=RASTER_CACHE_MAX_BYTES):
+        from threading import Lock
+        self.lock = Lock()
+        self.folder = folder
+        self.max_bytes = max_bytes
+        # Total size of the entries, determined on the first store
+        self.total_bytes = None
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def _entry_path(self, path, height, width, svg_aa_factor):
+        import hashlib
+        # Note: Normalized, so e.g. an AA factor of 1 and 1.0 (or one that went through
+        # the wire format) hit the same entry
+        key = repr((os.path.abspath(path), os.stat(path).st_mtime_ns, int(height), int(width),
+                    round(float(svg_aa_factor), 6)))
+        return os.path.join(self.folder, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.raw')
+
+    def load(self, path, height, width, svg_aa_factor):
+        """
+        Get the cached surface and its mapped pixels (close those after freeing the surface), or None
+        """
+        import mmap
+        entry_path = self._entry_path(path, height, width, svg_aa_factor)
+        try:
+            with open(entry_path, 'rb') as f:
+                # Note: A private mapping is writable (which ctypes needs) but shares the
+                # page cache with the file as long as nothing is written to it
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (OSError, ValueError):
+            self._count(hit=False)
+            return None
+
+        if len(mapping) >= self.HEADER.size:
+            magic, version, w, h, pitch = self.HEADER.unpack_from(mapping, 0)
+        else:
+            magic, version, w, h, pitch = None, None, 0, 0, 0
+        if magic != self.MAGIC or version != self.VERSION or len(mapping) < self.HEADER.size + pitch * h:
+            # Truncated or from an older version
+            mapping.close()
+            self._remove(entry_path)
+            self._count(hit=False)
+            return None
+
+        pixels = _MappedPixels(mapping, self.HEADER.size, pitch * h)
+        surface = sdl2.SDL_CreateRGBSurfaceWithFormatFrom(pixels.pixels, w, h, 32, pitch, sdl2.SDL_PIXELFORMAT_ARGB8888)
+        if not surface:
+            pixels.close()
+            self._count(hit=False)
+            return None
+
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        self._count(hit=True)
+        return surface.contents, pixels
+
+    def _count(self, hit):
+        with self.lock:
+            if hit:
+                self.hit_count += 1
+            else:
+                self.miss_count += 1
+
+    def store(self, path, height, width, svg_aa_factor, surface):
+        """
+        Add a surface (in ARGB8888 format) to the cache
+        """
+        import ctypes
+        import threading
+        if surface.format.contents.format != sdl2.SDL_PIXELFORMAT_ARGB8888:
+            return
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            entry_path = self._entry_path(path, height, width, svg_aa_factor)
+            temp_path = f'{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, surface.w, surface.h, surface.pitch))
+                f.write(ctypes.string_at(surface.pixels, surface.pitch * surface.h))
+        except OSError:
+            return
+
+        with self.lock:
+            # Note: The entry may exist already, e.g. when two workers missed the same
+            # image, so only the difference in size counts
+            try:
+                replaced_bytes = os.stat(entry_path).st_size
+            except OSError:
+                replaced_bytes = 0
+            try:
+                os.replace(temp_path, entry_path)
+            except OSError:
+                self._remove(temp_path)
+                return
+            if self.total_bytes is None:
+                self.total_bytes = sum(size for _, size, _ in self._list_entries())
+            else:
+                self.total_bytes += self.HEADER.size + surface.pitch * surface.h - replaced_bytes
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def is_full(self):
+        return self.total_bytes is not None and self.total_bytes >= self.max_bytes
+
+    def _list_entries(self):
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.raw'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._list_entries())
+        self.total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_path in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            if self._remove(entry_path):
+                self.total_bytes -= size
+
+    @staticmethod
+    def _remove(entry_path):
+        # Note: On POSIX a mapped entry stays valid after it's removed
+        try:
+            os.unlink(entry_path)
+            return True
+        except OSError:
+            return False
+
+
+# Raster cache of the marquee process, see '_main'
+_raster_cache = None
+
+# Size raster images must cover when they're drawn as large as possible, (0, 0) if
+# they're loaded at their native size. See '_set_output_size'
+_raster_image_box = (0, 0)
+
+
+def _set_output_size(w, h):
+    """
+    Set the size of the output the images are loaded for, raster images are downscaled
+    to the largest size they can be drawn at on it (rather than minified every frame)
+    """
+    global _raster_image_box
+    import math
+    _raster_image_box = (math.ceil(w * MAX_IMAGE_SCALE), math.ceil(h * MAX_IMAGE_SCALE))
+
+
+def _normalize_image_args(path, height, width, svg_aa_factor):
+    """
+    Get the arguments an image is actually loaded with. Raster images are loaded at
+    the same size whatever the effect, so only their path matters
+    """
+    if path.lower().endswith('.svg'):
+        return path, height, width, svg_aa_factor
+    box_w, box_h = _raster_image_box
+    return path, box_h, box_w, 1
+
+
+def _stretch_surface(surface, w, h):
+    """
+    Resample a surface (bilinear), the surface is freed
+    """
+    try:
+        stretched = sdl2.SDL_CreateRGBSurfaceWithFormat(0, w, h, 32, surface.format.contents.format)
+        if not stretched or sdl2.SDL_SoftStretchLinear(surface, None, stretched, None) != 0:
+            sdl2.SDL_FreeSurface(stretched)
+            raise SDLError()
+    finally:
+        sdl2.SDL_FreeSurface(surface)
+    return stretched.contents
+
+
+def _downscale_surface(surface, box_w, box_h):
+    """
+    Downscale a surface to the smallest size that still covers the box (if it's
+    larger), the surface is freed if it's downscaled
+    """
+    s = max(box_w / surface.w, box_h / surface.h)
+    if s >= 1.0:
+        return surface
+    w = max(1, round(surface.w * s))
+    h = max(1, round(surface.h * s))
+    # Note: Halve first, a bilinear filter averages 2x2 pixels when halving but skips
+    # pixels when minifying any further (i.e. this is a box filter, mostly)
+    while surface.w >= w * 2 and surface.h >= h * 2:
+        surface = _stretch_surface(surface, surface.w // 2, surface.h // 2)
+    if surface.w != w or surface.h != h:
+        surface = _stretch_surface(surface, w, h)
+    return surface
+
+
+def _decode_surface(path, height=0, width=0, svg_aa_factor=1):
+    """
+    Load an image file into a surface (in ARGB8888 format), SVGs are rasterized at the
+    given size and raster images are downscaled to cover it (if they're larger)
+    """
+    MAX_DIM = 8192
+    if path.lower().endswith('.svg'):
+        surface = sdl2.ext.image.load_svg(path, int(width * svg_aa_factor), int(height * svg_aa_factor), as_argb=True)
+        # Don't exceed max allowed texture size
+        if surface.w > MAX_DIM or surface.h > MAX_DIM:
+            sx = MAX_DIM / float(surface.w)
+            sy = MAX_DIM / float(surface.h)
+            s = min(sx, sy)
+            sdl2.SDL_FreeSurface(surface)
+            surface = sdl2.ext.image.load_svg(path, int(width * s), int(height * s), as_argb=True)
+    else:
+        surface = sdl2.ext.image.load_img(path, as_argb=True)
+        if width > 0 and height > 0:
+            surface = _downscale_surface(surface, width, height)
+
+    assert surface.w <= MAX_DIM
+    assert surface.h <= MAX_DIM
+    return surface
+
+
+def _load_surface(path, height=0, width=0, svg_aa_factor=1):
+    """
+    Load an image into a surface, through the raster cache (if there is one). Returns
+    the surface and the mapped pixels backing it (None if the surface owns its pixels)
+    """
+    path, height, width, svg_aa_factor = _normalize_image_args(path, height, width, svg_aa_factor)
+    raster_cache = _raster_cache
+    if raster_cache is not None:
+        cached = raster_cache.load(path, height, width, svg_aa_factor)
+        if cached is not None:
+            _track_memory(ResourceManager.SURFACE, _surface_bytes(cached[0]))
+            return cached
+
+    surface = _decode_surface(path, height, width, svg_aa_factor)
+    if raster_cache is not None:
+        raster_cache.store(path, height, width, svg_aa_factor, surface)
+    _track_memory(ResourceManager.SURFACE, _surface_bytes(surface))
+    return surface, None
+
+
+def _surface_bytes(surface):
+    return surface.w * surface.h * 4
+
+
+def _free_surface(surface, pixels):
+    _track_memory(ResourceManager.SURFACE, -_surface_bytes(surface))
+    sdl2.SDL_FreeSurface(surface)
+    if pixels is not None:
+        pixels.close()
+
+
+class Image(object):
+    """
+    Small wrapper class for images. 'loaded' is the surface (and mapped pixels, see
+    '_load_surface') if the image was already loaded, e.g. on a worker thread. The
+    surface is freed once it's uploaded to the texture
+    """
+    def __init__(self, renderer, path, height=0, width=0, svg_aa_factor=1, loaded=None):
+        surface, pixels = loaded if loaded is not None else _load_surface(path, height, width, svg_aa_factor)
+        try:
+            self.tex = sdl2.SDL_CreateTextureFromSurface(renderer, surface)
+            if not self.tex:
+                raise SDLError()
+            self.w = surface.w
+            self.h = surface.h
+        finally:
+            _free_surface(surface, pixels)
+        sdl2.SDL_SetTextureBlendMode(self.tex, sdl2.SDL_BLENDMODE_BLEND)
+        _track_memory(ResourceManager.TEXTURE, self.byte_size)
+
+    def cleanup(self):
+        sdl2.SDL_DestroyTexture(self.tex)
+        _track_memory(ResourceManager.TEXTURE, -self.byte_size)
+
+    @property
+    def texture(self):
+        return self.tex
+
+    @property
+    def rect(self):
+        return sdl2.SDL_Rect(x=0, y=0, w=self.w, h=self.h)
+
+    @property
+    def width(self):
+        return self.w
+
+    @property
+    def height(self):
+        return self.h
+
+    @property
+    def byte_size(self):
+        return self.w * self.h * 4
+
+
+class TextureAtlas(object):
+    """
+    Images (given as the arguments of '_acquire_image') packed into as few textures
+    ('pages') as possible, so they can all be drawn with one 'SDL_RenderGeometryRaw'
+    call per page. 'regions' has the page index and texture coordinates of the quad
+    (top left, top right, bottom left, bottom right) of each image, 'sizes' the size
+    of each image
+    """
+    # Transparent pixels between the images, so filtering doesn't bleed into the neighbors
+    PADDING = 1
+
+    def __init__(self, renderer, images, max_size=ATLAS_MAX_SIZE):
+        # Note: The same image may be in the list more than once, it's only packed once
+        surfaces = {}
+        try:
+            for image in images:
+                if image not in surfaces:
+                    loaded = _prepared_images.pop(image, None)
+                    surfaces[image] = loaded if loaded is not None else _load_surface(*image)
+            self._create_pages(renderer, list(surfaces), [surfaces[image][0] for image in surfaces], max_size)
+        finally:
+            for loaded in surfaces.values():
+                _free_surface(*loaded)
+
+        unique_indices = {image: idx for idx, image in enumerate(surfaces)}
+        self.regions = [self.regions[unique_indices[image]] for image in images]
+        self.sizes = [self.sizes[unique_indices[image]] for image in images]
+
+    def _create_pages(self, renderer, images, surfaces, max_size):
+        info = sdl2.SDL_RendererInfo()
+        if sdl2.SDL_GetRendererInfo(renderer, info) == 0 and info.max_texture_width > 0:
+            max_size = min(max_size, info.max_texture_width, info.max_texture_height)
+
+        # Shelf packing, in order. Pages (and their size) as lists of (image index, x, y)
+        pages = []
+        placements = []
+        page_w = page_h = x = y = row_h = 0
+        for idx, image_surface in enumerate(surfaces):
+            w = image_surface.w + self.PADDING
+            h = image_surface.h + self.PADDING
+            if x + w > max_size and x > 0:
+                x, y, row_h = 0, y + row_h, 0
+            if y + h > max_size and y > 0:
+                pages.append((placements, page_w, page_h))
+                placements = []
+                page_w = page_h = x = y = row_h = 0
+            placements.append((idx, x, y))
+            x += w
+            row_h = max(row_h, h)
+            page_w = max(page_w, x)
+            page_h = max(page_h, y + row_h)
+        if placements:
+            pages.append((placements, page_w, page_h))
+
+        self.textures = []
+        self.regions = [None] * len(images)
+        self.sizes = [(image_surface.w, image_surface.h) for image_surface in surfaces]
+        self.byte_size = 0
+        for page_idx, (placements, page_w, page_h) in enumerate(pages):
+            surface = sdl2.SDL_CreateRGBSurfaceWithFormat(0, page_w, page_h, 32, sdl2.SDL_PIXELFORMAT_ARGB8888)
+            if not surface:
+                raise SDLError()
+            try:
+                for idx, x, y in placements:
+                    # Note: Copy the pixels as they are, i.e. without blending
+                    image_surface = surfaces[idx]
+                    sdl2.SDL_SetSurfaceBlendMode(image_surface, sdl2.SDL_BLENDMODE_NONE)
+                    sdl2.SDL_BlitSurface(image_surface, None, surface, sdl2.SDL_Rect(x, y, image_surface.w, image_surface.h))
+
+                    u0, v0 = x / page_w, y / page_h
+                    u1, v1 = (x + image_surface.w) / page_w, (y + image_surface.h) / page_h
+                    self.regions[idx] = (page_idx, (u0, v0, u1, v0, u0, v1, u1, v1))
+
+                tex = sdl2.SDL_CreateTextureFromSurface(renderer, surface)
+                if not tex:
+                    raise SDLError()
+            finally:
+                sdl2.SDL_FreeSurface(surface)
+            sdl2.SDL_SetTextureBlendMode(tex, sdl2.SDL_BLENDMODE_BLEND)
+            self.textures.append(tex)
+            self.byte_size += page_w * page_h * 4
+        _track_memory(ResourceManager.TEXTURE, self.byte_size)
+
+    def cleanup(self):
+        for tex in self.textures:
+            sdl2.SDL_DestroyTexture(tex)
+        self.textures.clear()
+        _track_memory(ResourceManager.TEXTURE, -self.byte_size)
+
+
+class TextureCache(object):
+    """
+    Cache of loaded images (i.e. textures), keyed by path, target size, SVG AA factor
+    and file modification time. Images are shared (and refcounted) between the effects
+    using them, so e.g. growing the same marquee twice only loads it once. Images no
+    longer in use are kept in LRU order while everything fits in 'budget_bytes'.
+    Only used on the main thread
+    """
+    def __init__(self, renderer, budget_bytes=TEXTURE_CACHE_BUDGET_BYTES):
+        self.renderer = renderer
+        self.budget_bytes = budget_bytes
+        # Key -> [image, refcount], the unused images are also in 'idle' (oldest first)
+        self.entries = {}
+        self.idle = OrderedDict()
+        self.total_bytes = 0
+        self.hit_count = 0
+        self.miss_count = 0
+        self.evicted_count = 0
+
+    @staticmethod
+    def _image_bytes(image):
+        return image.byte_size
+
+    @staticmethod
+    def _key(path, height, width, svg_aa_factor):
+        return _normalize_image_args(path, height, width, svg_aa_factor) + (os.stat(path).st_mtime_ns,)
+
+    def contains(self, path, height=0, width=0, svg_aa_factor=1):
+        try:
+            return self._key(path, height, width, svg_aa_factor) in self.entries
+        except OSError:
+            return False
+
+    def acquire(self, path, height=0, width=0, svg_aa_factor=1, loaded=None):
+        """
+        Get the image, loading it if it isn't cached (unless it was already loaded,
+        see 'Image'). Must be released with 'release'
+        """
+        key = self._key(path, height, width, svg_aa_factor)
+        if loaded is not None and key in self.entries:
+            _free_surface(*loaded)
+        return self._acquire(key, lambda: Image(self.renderer, path, height=height, width=width, svg_aa_factor=svg_aa_factor, loaded=loaded))
+
+    def _atlas_key(self, images):
+        return (TextureAtlas,) + tuple(self._key(*image) for image in images)
+
+    def contains_atlas(self, images):
+        try:
+            return self._atlas_key(images) in self.entries
+        except OSError:
+            return False
+
+    def acquire_atlas(self, images):
+        """
+        Get the atlas of the images (see 'TextureAtlas'), creating it if it isn't
+        cached. Must be released with 'release'
+        """
+        return self._acquire(self._atlas_key(images), lambda: TextureAtlas(self.renderer, images))
+
+    def _acquire(self, key, create):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hit_count += 1
+            if entry[1] == 0:
+                del self.idle[key]
+            entry[1] += 1
+            return entry[0]
+
+        self.miss_count += 1
+        image = create()
+        image.cache_key = key
+        self.entries[key] = [image, 1]
+        self.total_bytes += self._image_bytes(image)
+        self._evict()
+        return image
+
+    def release(self, image):
+        entry = self.entries[image.cache_key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            self.idle[image.cache_key] = image
+            self._evict()
+
+    def _evict(self, budget_bytes=None):
+        budget_bytes = self.budget_bytes if budget_bytes is None else budget_bytes
+        while self.total_bytes > budget_bytes and self.idle:
+            key, image = self.idle.popitem(last=False)
+            del self.entries[key]
+            self.total_bytes -= self._image_bytes(image)
+            self.evicted_count += 1
+            image.cleanup()
+
+    def trim(self, size):
+        """
+        Evict unused images until 'size' bytes are freed (or nothing is left to evict)
+        """
+        self._evict(max(0, self.total_bytes - size))
+
+    def cleanup(self):
+        for image, _ in self.entries.values():
+            image.cleanup()
+        self.entries.clear()
+        self.idle.clear()
+        self.total_bytes = 0
+
+    def get_metrics(self):
+        return {
+            'texturecachehits': self.hit_count,
+            'texturecachemisses': self.miss_count,
+            'texturecacheevicted': self.evicted_count,
+            'texturecachebytes': self.total_bytes,
+            'texturecachecount': len(self.entries)}
+
+
+# Texture cache of the marquee process, see '_main'
+_texture_cache = None
+
+
+# Images loaded ahead of creating an effect (on a worker thread), by the arguments
+# of '_acquire_image', see 'RenderManager.activate_pending_effects'
+_prepared_images = {}
+
+
+def _acquire_image(renderer, path, height=0, width=0, svg_aa_factor=1):
+    """
+    Load an image through the texture cache (if there is one), release it with '_release_image'
+    """
+    loaded = _prepared_images.pop((path, height, width, svg_aa_factor), None)
+    if _texture_cache is None:
+        return Image(renderer, path, height=height, width=width, svg_aa_factor=svg_aa_factor, loaded=loaded)
+    return _texture_cache.acquire(path, height=height, width=width, svg_aa_factor=svg_aa_factor, loaded=loaded)
+
+
+def _acquire_atlas(renderer, images):
+    """
+    Get the atlas of images (given as the arguments of '_acquire_image'), through the
+    texture cache (if there is one). Release it with '_release_image'
+    """
+    if _texture_cache is None:
+        return TextureAtlas(renderer, images)
+    return _texture_cache.acquire_atlas(images)
+
+
+def _release_image(image):
+    if _texture_cache is None or not hasattr(image, 'cache_key'):
+        image.cleanup()
+    else:
+        _texture_cache.release(image)
+
+
+class ResourceManager(object):
+    """
+    Tracks the memory of the textures, surfaces (i.e. images not uploaded yet) and
+    video decoders of the marquee process, and keeps it within 'budget_bytes' by
+    evicting cached textures and refusing the effects that don't fit anyway. Memory
+    may be tracked on any thread (see '_track_memory'), the rest is only used on the
+    main thread
+    """
+    TEXTURE = 'texture'
+    SURFACE = 'surface'
+    DECODER = 'decoder'
+
+    def __init__(self, budget_bytes=MEMORY_BUDGET_BYTES):
+        from threading import Lock
+        self.lock = Lock()
+        self.budget_bytes = budget_bytes
+        self.totals = {self.TEXTURE: 0, self.SURFACE: 0, self.DECODER: 0}
+        self.refused_count = 0
+        self.last_refused = None
+        # Memory used by each effect (as effect name, bytes), updated every frame
+        self.effect_usage = []
+
+    @property
+    def total_bytes(self):
+        return sum(self.totals.values())
+
+    def track(self, kind, size):
+        with self.lock:
+            self.totals[kind] += size
+
+    def set_budget(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.reserve(0)
+
+    def reserve(self, size):
+        """
+        Make room for 'size' more bytes, evicting the textures no effect uses if needed.
+        Returns False if it doesn't fit in the budget anyway, i.e. the effect that
+        needs it should be refused
+        """
+        excess = self.total_bytes + size - self.budget_bytes
+        if excess > 0 and _texture_cache is not None:
+            _texture_cache.trim(excess)
+            excess = self.total_bytes + size - self.budget_bytes
+            # Note: Prefetched images are only dropped as a last resort
+            if excess > 0 and _prefetcher is not None:
+                _prefetcher.trim(excess)
+                _texture_cache.trim(excess)
+                excess = self.total_bytes + size - self.budget_bytes
+        return excess <= 0
+
+    def refuse(self, effect_name, size):
+        self.refused_count += 1
+        self.last_refused = [effect_name, size]
+
+    def update_effects(self, effects):
+        self.effect_usage = [[type(effect).__name__, effect.memory_usage()] for effect in effects]
+
+    def get_metrics(self):
+        with self.lock:
+            totals = dict(self.totals)
+        return {
+            'memorytexture': totals[self.TEXTURE],
+            'memorysurface': totals[self.SURFACE],
+            'memorydecoder': totals[self.DECODER],
+            'memorytotal': sum(totals.values()),
+            'memorybudget': self.budget_bytes,
+            'memoryeffects': self.effect_usage,
+            'effectsrefused': self.refused_count,
+            'effectlastrefused': self.last_refused}
+
+
+# Resource manager of the marquee process, see '_main'
+_resource_manager = None
+
+
+def _track_memory(kind, size):
+    """
+    Track memory that was allocated (or freed, if 'size' is negative), see 'ResourceManager'
+    """
+    resource_manager = _resource_manager
+    if resource_manager is not None:
+        resource_manager.track(kind, size)
+
+
+class Effect(ABC):
+    """
+    Effect base class
+    """
+    @abstractmethod
+    def render(self, renderer):
         pass
 
     @abstractmethod
@@ -489,6 +2231,12 @@ class Effect(ABC):
     def cleanup(self):
         pass
 
+    def memory_usage(self):
+        """
+        Memory used by the effect in bytes (shared textures are counted by every effect using them)
+        """
+        return 0
+
 
 class FlyoutEffect(Effect):
     """
@@ -499,7 +2247,7 @@ class FlyoutEffect(Effect):
         self.alpha = alpha
         self.height_pct = height_pct
         self.margin = margin
-        self.image = Image(renderer, image_path, height=int(h * height_pct))
+        self.image = _acquire_image(renderer, image_path, height=int(h * height_pct))
         self.fade_anim = ValueAnimation(0.0, 1.0, 2.0, ease=True)
         self.translate_anim = ValueAnimation(0.0, 1.0, 4.0, ease=True, start_delay=start_delay)
         self.stopping = False
@@ -542,8 +2290,11 @@ class FlyoutEffect(Effect):
         if self.stopping and fade_animation_done and translate_animation_done:
             self.stopped = True
 
+    def memory_usage(self):
+        return self.image.byte_size
+
     def cleanup(self):
-        self.image.cleanup()
+        _release_image(self.image)
 
 
 class GrowImageEffect(Effect):
@@ -564,7 +2315,7 @@ class GrowImageEffect(Effect):
 
         self.fade_anim = ValueAnimation(start_fade, end_fade, duration, ease=True)
         _, h = _get_renderer_dimensions(renderer)
-        self.image = Image(renderer, image_path, height=h)
+        self.image = _acquire_image(renderer, image_path, height=h)
         self.stopping = False
         self.stopped = False
 
@@ -594,8 +2345,11 @@ class GrowImageEffect(Effect):
         if self.stopping and fade_anim_done:
             self.stopped = True
 
+    def memory_usage(self):
+        return self.image.byte_size
+
     def cleanup(self):
-        self.image.cleanup()
+        _release_image(self.image)
 
 
 class ShowImageEffect(Effect):
@@ -605,7 +2359,7 @@ class ShowImageEffect(Effect):
     def __init__(self, renderer, image_path, margin):
         _, h = _get_renderer_dimensions(renderer)
         self.margin = margin
-        self.image = Image(renderer, image_path, height=h)
+        self.image = _acquire_image(renderer, image_path, height=h)
         self.fade_anim = ValueAnimation(0.0, 1.0, 1.5, ease=True)
         self.stopping = False
         self.stopped = False
@@ -635,8 +2389,266 @@ class ShowImageEffect(Effect):
         if self.stopping and fade_animation_done:
             self.stopped = True
 
+    def memory_usage(self):
+        return self.image.byte_size
+
     def cleanup(self):
-        self.image.cleanup()
+        _release_image(self.image)
+
+
+# Video playback metrics, reported by 'get_metrics'. Only updated on the main thread
+_video_metrics = {
+    # Frames that weren't decoded by the time they were due (i.e. shown late)
+    'videounderruns': 0,
+    # Decoded frames that were skipped because the render loop fell behind
+    'videooverruns': 0,
+    # Frames the decoders skipped to catch up with playback, by grabbing or seeking
+    'videoframesgrabbed': 0,
+    'videoframesseeked': 0,
+    'videoseeks': 0}
+
+
+class VideoDecoder(object):
+    """
+    Decodes a video on a thread of its own, into a ring of preallocated frame buffers
+    stamped with their presentation time. The frames are cropped to 'crop' (x, y, w, h),
+    scaled to 'size' and converted to the pixel format of the texture (planar IYUV or
+    BGRA), so the render thread only picks the frame to present (see 'get_frame') and
+    uploads it in one go. The decoder owns the video, it's released on the decoder
+    thread once closed. When it falls behind playback it catches up as set by
+    'grab_max_frames' and 'seek_ahead_seconds' (see VIDEO_GRAB_MAX_FRAMES)
+    """
+    # Decoder threads still running (i.e. maybe still releasing their video)
+    threads = set()
+
+    def __init__(self, video, pixel_format, crop, size, ring_size=VIDEO_FRAME_RING_SIZE, grab_max_frames=None,
+                 seek_ahead_seconds=None):
+        from threading import Thread, Condition
+        self.video = video
+        self.grab_max_frames = VIDEO_GRAB_MAX_FRAMES if grab_max_frames is None else grab_max_frames
+        self.seek_ahead_seconds = VIDEO_SEEK_AHEAD_SECONDS if seek_ahead_seconds is None else seek_ahead_seconds
+        # Note: Some containers don't report a frame rate (or frame count)
+        self.fps = video.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        video_w = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        video_h = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        x, y, crop_w, crop_h = crop
+        w, h = size
+        if pixel_format == sdl2.SDL_PIXELFORMAT_IYUV:
+            self.conversion = cv2.COLOR_BGR2YUV_I420
+            frame_shape = (h * 3 // 2, w)
+        else:
+            self.conversion = cv2.COLOR_BGR2BGRA
+            frame_shape = (h, w, 4)
+        # Note: Frames are decoded to BGR (all OpenCV does, at full size) and then cropped
+        # (a view), scaled and converted into the ring
+        self.decoded_frame = np.empty((video_h, video_w, 3), np.uint8)
+        self.crop = (slice(y, y + crop_h), slice(x, x + crop_w))
+        # Note: Halved first, then scaled bilinearly (see '_downscale_surface'), since
+        # OpenCV's area filter is slow for anything but integer ratios
+        self.scale_steps = []
+        while crop_w >= w * 2 and crop_h >= h * 2:
+            crop_w //= 2
+            crop_h //= 2
+            self.scale_steps.append((np.empty((crop_h, crop_w, 3), np.uint8), cv2.INTER_AREA))
+        if (crop_w, crop_h) != (w, h):
+            self.scale_steps.append((np.empty((h, w, 3), np.uint8), cv2.INTER_LINEAR))
+        self.frames = [np.empty(frame_shape, np.uint8) for _ in range(ring_size)]
+        self.timestamps = [0.0] * ring_size
+        self.ring_size = ring_size
+        self.ring_bytes = self.decoded_frame.nbytes + ring_size * self.frames[0].nbytes + sum(
+            scaled_frame.nbytes for scaled_frame, _ in self.scale_steps)
+        self.memory_bytes = self.ring_bytes + VideoPlaybackEffect._decoder_bytes(video)
+        _track_memory(ResourceManager.DECODER, self.ring_bytes)
+
+        # Frames decoded and frames released by the render thread so far, the frames in
+        # between are in the ring (the oldest being the one presented). Shared with the
+        # decoder thread, which restarts from the beginning whenever 'generation' changes
+        self.condition = Condition()
+        self.write_count = 0
+        self.read_count = 0
+        self.end_of_video = False
+        self.generation = 0
+        self.closed = False
+        # Set once the decoder thread is done, e.g. because decoding failed
+        self.stopped = False
+        # Catch-up metrics not added to '_video_metrics' yet (by the render thread)
+        self.pending_metrics = {}
+
+        # Presentation state, only used on the render thread (except 'start_time')
+        self.start_time = None
+        self.presented = False
+        self.late_frame_count = None
+        self.ended = False
+
+        self.thread = Thread(target=self._decode, name='Marquee video decoder thread', daemon=True)
+        VideoDecoder.threads.add(self.thread)
+        self.thread.start()
+
+    def _decode(self):
+        generation = None
+        frame_idx = 0
+        try:
+            while True:
+                with self.condition:
+                    while not self.closed and generation == self.generation and (
+                            self.end_of_video or self.write_count - self.read_count >= self.ring_size):
+                        self.condition.wait()
+                    if self.closed:
+                        return
+                    rewind = generation != self.generation
+                    generation = self.generation
+                    slot = self.write_count % self.ring_size
+                    start_time = self.start_time
+
+                if rewind:
+                    self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    frame_idx = 0
+                    start_time = None
+
+                # Catch up if the frame is late already
+                ret = True
+                if start_time is not None:
+                    ret, frame_idx = self._catch_up(frame_idx, int((time.time() - start_time) * self.fps))
+
+                # Note: Decoded straight into the buffer, a frame of a different size
+                # (which wouldn't fit the texture) ends the video
+                if ret:
+                    ret, frame = self.video.read(self.decoded_frame)
+                    ret = ret and frame is not None and frame.shape == self.decoded_frame.shape
+                if ret:
+                    frame = frame[self.crop]
+                    for scaled_frame, interpolation in self.scale_steps:
+                        frame = cv2.resize(frame, scaled_frame.shape[1::-1], dst=scaled_frame, interpolation=interpolation)
+                    cv2.cvtColor(frame, self.conversion, dst=self.frames[slot])
+
+                with self.condition:
+                    # Restarted while decoding, the frame is from before that
+                    if generation != self.generation:
+                        continue
+                    if not ret:
+                        self.end_of_video = True
+                    else:
+                        self.timestamps[slot] = frame_idx / self.fps
+                        self.write_count += 1
+                        frame_idx += 1
+                    self.condition.notify_all()
+        finally:
+            # Note: No more frames are coming, whatever stopped the decoder thread
+            with self.condition:
+                self.stopped = True
+                self.end_of_video = True
+                self.condition.notify_all()
+            VideoPlaybackEffect._close_video(self.video)
+            _track_memory(ResourceManager.DECODER, -self.ring_bytes)
+            VideoDecoder.threads.discard(self.thread)
+
+    def _catch_up(self, frame_idx, due_frame_idx):
+        """
+        Skip the frames before the one that's due (on the decoder thread), returns
+        whether the video goes on and the index of the next frame
+        """
+        gap = due_frame_idx - frame_idx
+        if gap <= 0:
+            return True, frame_idx
+
+        if self.grab_max_frames is not None and gap > self.grab_max_frames:
+            target_idx = due_frame_idx + int(self.seek_ahead_seconds * self.fps)
+            if 0 < self.frame_count <= target_idx:
+                return False, frame_idx
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, target_idx)
+            self._add_metrics(videoseeks=1, videoframesseeked=target_idx - frame_idx)
+            return True, target_idx
+
+        for idx in range(gap):
+            if not self.video.grab():
+                self._add_metrics(videoframesgrabbed=idx)
+                return False, frame_idx + idx
+        self._add_metrics(videoframesgrabbed=gap)
+        return True, due_frame_idx
+
+    def _add_metrics(self, **metrics):
+        with self.condition:
+            for name, value in metrics.items():
+                self.pending_metrics[name] = self.pending_metrics.get(name, 0) + value
+
+    def get_frame(self, now):
+        """
+        Get the frame to present at time 'now' (the video starts playing with its first
+        frame), None if no frame is decoded yet. Also returns whether it's a different
+        frame than last time. Sets 'ended' once the last frame was presented long enough
+        """
+        with self.condition:
+            available = self.write_count - self.read_count
+            if available == 0:
+                self.ended = self.end_of_video
+                return None, False
+            if self.start_time is None:
+                self.start_time = now - self.timestamps[self.read_count % self.ring_size]
+            t = now - self.start_time
+
+            # Skip to the latest frame that's due, the skipped frames were decoded for nothing
+            presented = self.presented
+            new_frame = not presented
+            skipped_count = 0
+            while available > 1 and self.timestamps[(self.read_count + 1) % self.ring_size] <= t:
+                skipped_count += not presented
+                presented = False
+                self.read_count += 1
+                available -= 1
+                new_frame = True
+            if new_frame:
+                self.condition.notify_all()
+
+            # The next frame is due but it isn't decoded yet (counted once per frame)
+            timestamp = self.timestamps[self.read_count % self.ring_size]
+            if available == 1 and t >= timestamp + 1.0 / self.fps:
+                if self.end_of_video:
+                    self.ended = True
+                elif self.late_frame_count != self.read_count:
+                    self.late_frame_count = self.read_count
+                    _video_metrics['videounderruns'] += 1
+
+            frame = self.frames[self.read_count % self.ring_size]
+            pending_metrics = self.pending_metrics
+            self.pending_metrics = {}
+
+        _video_metrics['videooverruns'] += skipped_count
+        for name, value in pending_metrics.items():
+            _video_metrics[name] += value
+        self.presented = True
+        return frame, new_frame
+
+    def rewind(self):
+        """
+        Play the video again from the beginning
+        """
+        with self.condition:
+            self.generation += 1
+            self.read_count = self.write_count
+            self.end_of_video = self.stopped
+            self.start_time = None
+            self.condition.notify_all()
+        self.presented = False
+        self.late_frame_count = None
+        self.ended = False
+
+    def close(self):
+        """
+        Stop decoding, the video is released once the decoder thread is done with it
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    @staticmethod
+    def join_threads(timeout=None):
+        """
+        Wait for the closed decoders to release their videos, the process may abort if
+        it exits while one is at it
+        """
+        for thread in list(VideoDecoder.threads):
+            thread.join(timeout)
 
 
 class VideoPlaybackEffect(Effect):
@@ -654,14 +2666,24 @@ class VideoPlaybackEffect(Effect):
         self.fade_anim = ValueAnimation(0.0, 0.0, 0.0, ease=True)
 
         self.last_frame = None
-        self.next_frame_idx = 0
+        self.playing = False
         self.video_idx = 0
-        self.loaded_video_path = None
         self.creation_time = time.time()
         self.awaiting_first_playback = True
 
-        self.video = None
+        self.decoder = None
         self.tex = None
+        self.tex_format = None
+        self.tex_size = None
+        self.tex_bytes = 0
+        # Where the texture is drawn, see '_get_frame_geometry'
+        self.dst_rect = None
+
+        # The next video of the playlist is opened (on a worker thread, see '_open_video')
+        # and starts decoding while the current one plays, see '_preload_next_video'
+        self.video_future = None
+        self.next_decoder = None
+        self.next_geometry = None
 
         self.stopping = False
         self.stopped = False
@@ -675,71 +2697,147 @@ class VideoPlaybackEffect(Effect):
     def is_stopped(self):
         return self.stopped
 
-    def _load_video(self, renderer, video_path):
+    @staticmethod
+    def _open_video(video_path):
+        """
+        Open a video, on a worker thread. Returns None if the video can't be opened
+        """
+        # Note: The video modules take a while to import, so this is done here too
+        _import_video_modules()
 
         if not os.path.isfile(video_path):
-            return None, None
-
-        # Load new video
+            return None
         video = cv2.VideoCapture(video_path)
-        w = video.get(cv2.CAP_PROP_FRAME_WIDTH)
-        h = video.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        if not video.isOpened():
+            video.release()
+            return None
+        _track_memory(ResourceManager.DECODER, VideoPlaybackEffect._decoder_bytes(video))
+        return video
+
+    @staticmethod
+    def _decoder_bytes(video):
+        """
+        Estimated memory used by the decoder of a video
+        """
+        return int(video.get(cv2.CAP_PROP_FRAME_WIDTH)) * int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)) * 3 * VIDEO_DECODER_FRAME_COUNT
+
+    @staticmethod
+    def _close_video(video):
+        _track_memory(ResourceManager.DECODER, -VideoPlaybackEffect._decoder_bytes(video))
+        video.release()
+
+    @staticmethod
+    def _release_video(future):
+        """
+        Done callback of a video that was opened for nothing
+        """
+        if not future.cancelled() and future.exception() is None and future.result() is not None:
+            VideoPlaybackEffect._close_video(future.result())
+
+    @staticmethod
+    def _get_texture_format(renderer, w, h):
+        """
+        Pixel format of the texture for a video, planar YUV (1.5 bytes per pixel) if the
+        renderer supports it natively, BGRA (4 bytes per pixel) otherwise
+        """
+        # Note: The chroma planes are subsampled 2x2, so odd sizes don't work
+        if w % 2 == 0 and h % 2 == 0:
+            info = sdl2.SDL_RendererInfo()
+            if sdl2.SDL_GetRendererInfo(renderer, info) == 0 and \
+                    sdl2.SDL_PIXELFORMAT_IYUV in info.texture_formats[:info.num_texture_formats]:
+                return sdl2.SDL_PIXELFORMAT_IYUV
+        return sdl2.SDL_PIXELFORMAT_BGRA32
+
+    def _get_frame_geometry(self, renderer, video):
+        """
+        Get the part of the video that's visible (as x, y, w, h), the size and pixel
+        format it's decoded to (i.e. those of the texture) and the rect it's drawn to
+        """
+        import math
+        video_w = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        video_h = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        rw, rh = _get_renderer_dimensions(renderer)
+        fit_rect = _get_fit_rect(video_w, video_h, rw, rh, fit=self.fit, margin=self.margin)
+        sx = fit_rect.w / video_w
+        sy = fit_rect.h / video_h
+
+        # Note: Rounded out to whole pixels, so the visible part may stick out a bit
+        x0 = min(video_w - 1, max(0, math.floor(-fit_rect.x / sx)))
+        y0 = min(video_h - 1, max(0, math.floor(-fit_rect.y / sy)))
+        x1 = max(x0 + 1, min(video_w, math.ceil((rw - fit_rect.x) / sx)))
+        y1 = max(y0 + 1, min(video_h, math.ceil((rh - fit_rect.y) / sy)))
+        crop = (x0, y0, x1 - x0, y1 - y0)
+        dst_rect = sdl2.SDL_FRect(fit_rect.x + x0 * sx, fit_rect.y + y0 * sy, crop[2] * sx, crop[3] * sy)
+
+        w, h = crop[2], crop[3]
+        if min(sx, sy) * VIDEO_DOWNSCALE_MIN_RATIO <= 1.0:
+            w = min(w, math.ceil(dst_rect.w))
+            h = min(h, math.ceil(dst_rect.h))
+
+        # Note: Downscaled frames are stored as BGRA, IYUV would halve their chroma
+        # resolution (again, the video's chroma is subsampled already)
+        if (w, h) != crop[2:]:
+            tex_format = sdl2.SDL_PIXELFORMAT_BGRA32
+        else:
+            tex_format = self._get_texture_format(renderer, w, h)
+        return crop, (w, h), tex_format, dst_rect
+
+    def _create_texture(self, renderer, size, tex_format):
+        """
+        Create the texture the frames are copied to, returns None if it doesn't fit in
+        the memory budget
+        """
+        w, h = size
+        tex_bytes = w * h * 3 // 2 if tex_format == sdl2.SDL_PIXELFORMAT_IYUV else w * h * 4
+        if _resource_manager is not None and not _resource_manager.reserve(tex_bytes):
+            _resource_manager.refuse(type(self).__name__, tex_bytes)
+            return None
 
         # Create texture
         tex = sdl2.SDL_CreateTexture(
             renderer,
-            sdl2.SDL_PIXELFORMAT_ABGR32,
+            tex_format,
             sdl2.SDL_TEXTUREACCESS_STREAMING,
-            int(w), int(h))
+            w, h)
+        if not tex:
+            return None
         sdl2.SDL_SetTextureBlendMode(tex, sdl2.SDL_BLENDMODE_BLEND)
+        self.tex_format = tex_format
+        self.tex_size = size
+        self.tex_bytes = tex_bytes
+        _track_memory(ResourceManager.TEXTURE, tex_bytes)
 
-        return video, tex
-
-    def _get_frame(self):
-
-        # Compute desired frame index
-        dt = time.time() - self.t0
-        desired_frame_idx = int(round(dt * self.fps))
-
-        if desired_frame_idx < self.next_frame_idx:
-            # We're ahead, just re-use the last frame until we're caught up
-            return self.last_frame
+        return tex
 
-        else:
-            # We're behind, we need to read some throw-away frames to catch up
-            catchup_frames = desired_frame_idx - self.next_frame_idx
-            for i in range(catchup_frames):
-                ret, _ = self.video.read()
-                self.next_frame_idx += 1
-
-            # This is the frame we will use
-            ret, frame = self.video.read()
-            self.next_frame_idx += 1
-            return frame
+    def _destroy_texture(self):
+        if self.tex is not None:
+            sdl2.SDL_DestroyTexture(self.tex)
+            _track_memory(ResourceManager.TEXTURE, -self.tex_bytes)
+            self.tex = None
+            self.tex_format = None
+            self.tex_size = None
+            self.tex_bytes = 0
+        self.last_frame = None
 
     def _copy_frame_to_tex(self, frame, tex):
         """
-        Copy numpy (ndarray) to SDL texture
+        Upload a frame (already in the pixel format of the texture, see 'VideoDecoder')
+        to the texture
         """
-        # Get video frame dimensions
-        w = frame.shape[1]
-        h = frame.shape[0]
-
-        # Copy pixels from the decoded video 'frame' to the texture
-        tex_pixels_ptr = c_void_p()
-        tex_pixels_pitch = c_int()
-        sdl2.SDL_LockTexture(tex, None, byref(tex_pixels_ptr), byref(tex_pixels_pitch))
-        tex_pixels = cast(tex_pixels_ptr, POINTER(c_ubyte * (tex_pixels_pitch.value * h))).contents
-        bytes_per_pixel = int(tex_pixels_pitch.value / w)
-        tex_pixels_ndarray = np.ndarray((h, w, bytes_per_pixel), np.uint8, buffer=tex_pixels)
-
-        # TODO:
-        # Figure out why '/home/thomas/ES-DE/downloaded_media/snes/videos/Spot Goes to Hollywood (USA) (Proto).mp4' is broken when
-        # using 3-channel textures. Using 4-channel textures seems to fix it, but requires some extra work as seen below.
-        np.copyto(tex_pixels_ndarray[:,:,1:4], frame)
-        tex_pixels_ndarray[:, :, 0] = int(255)
-
-        sdl2.SDL_UnlockTexture(tex)
+        if self.tex_format == sdl2.SDL_PIXELFORMAT_IYUV:
+            # Note: The planes are stored one after the other, U and V at half the size
+            w = frame.shape[1]
+            h = frame.shape[0] * 2 // 3
+            y_plane = frame.ctypes.data
+            u_plane = y_plane + w * h
+            v_plane = u_plane + w * h // 4
+            sdl2.SDL_UpdateYUVTexture(
+                tex, None,
+                cast(y_plane, POINTER(c_ubyte)), w,
+                cast(u_plane, POINTER(c_ubyte)), w // 2,
+                cast(v_plane, POINTER(c_ubyte)), w // 2)
+        else:
+            sdl2.SDL_UpdateTexture(tex, None, frame.ctypes.data, frame.strides[0])
 
     def render(self, renderer):
 
@@ -759,74 +2857,142 @@ class VideoPlaybackEffect(Effect):
                 self.fade_anim = ValueAnimation(0.0, 1.0, 1.0, ease=True)
                 self.awaiting_first_playback = False
 
-        # When 'last_frame' is undefined, it indicates that either 1) no video has
-        # been loaded yet OR 2) a video played to completion - in either case we have
-        # to prepare the next video
-        if self.last_frame is None:
-
-            # Get video path
-            video_path = self.video_paths[self.video_idx]
-            assert video_path is not None
-            self.video_idx += 1
-            self.video_idx %= len(self.video_paths)
+        # Get the next video ready while the current one plays, a single video is rewound instead
+        if self.next_decoder is None and (self.decoder is None or len(self.video_paths) > 1):
+            if not self._preload_next_video(renderer):
+                # Failed to load the only video in the list, terminating effect
+                self.stopped = True
+                return
 
-            if video_path != self.loaded_video_path:
-                # This is a new video, load it
-                self.cleanup()
-                self.video, self.tex = self._load_video(renderer, video_path)
-                if self.video is None or self.tex is None:
-                    if len(self.video_paths) == 1:
-                        # Failed to load the only video in the list, terminating effect
-                        self.stopped = True
+        # When not playing, either 1) no video has been loaded yet OR 2) a video
+        # played to completion - in either case we switch to the next video (if it's
+        # ready, the last frame is shown until then)
+        if not self.playing:
+            if self.next_decoder is not None:
+                if not self._start_next_video(renderer) and len(self.video_paths) == 1:
+                    self.stopped = True
                     return
-                self.loaded_video_path = video_path
-
-            # Reset state
-            self.fps = self.video.get(cv2.CAP_PROP_FPS)
-            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            self.t0 = time.time()
-            self.next_frame_idx = 0
-            self.fade_anim = ValueAnimation(0.0, 1.0, 1.0, ease=True)
-
-        # Decode frame for current time
-        self.last_frame = self._get_frame()
-        if self.last_frame is None:
+            elif self.decoder is not None and len(self.video_paths) == 1:
+                # Same video again
+                self.decoder.rewind()
+                self.playing = True
+
+        if self.decoder is None:
+            # Still opening the video, nothing to render yet
+            if self.stopping:
+                self.stopped = True
             return
 
-        # Copy frame to texture
-        self._copy_frame_to_tex(self.last_frame, self.tex)
+        # Get the frame for the current time, the next video starts once the last frame was shown
+        frame, new_frame = self.decoder.get_frame(time.time())
+        if self.decoder.ended:
+            self.playing = False
+        if frame is not None:
+            self.last_frame = frame
+            # Copy frame to texture (unless it's still there)
+            if new_frame:
+                self._copy_frame_to_tex(frame, self.tex)
+        elif self.last_frame is None:
+            # Nothing decoded yet
+            if self.stopping:
+                self.stopped = True
+            return
+        # Note: Otherwise the video is starting over (or the next one is), the texture
+        # still has its last frame
 
         # Set texture alpha value
         value, fade_animation_done = self.fade_anim.evaluate()
         sdl2.SDL_SetTextureAlphaMod(self.tex, int(value * self.alpha * 255.0))
 
-        # Get video frame dimensions
-        w = self.last_frame.shape[1]
-        h = self.last_frame.shape[0]
-
         # Render
-        src_rect = sdl2.SDL_Rect(0, 0, w, h)
-        rw, rh = _get_renderer_dimensions(renderer)
-        dst_rect = _get_fit_rect(w, h, rw, rh, fit=self.fit, margin=self.margin)
         sdl2.SDL_RenderCopyF(
             renderer,
             self.tex,
-            src_rect,
-            dst_rect)
+            None,
+            self.dst_rect)
 
         # Handle effect termination
         if self.stopping and fade_animation_done:
             self.stopped = True
 
+    def _preload_next_video(self, renderer):
+        """
+        Open the next video of the playlist (on a worker thread, unless it was
+        prefetched) and start decoding it, so it's ready to go without a gap once the
+        current one ends. Returns False if it failed and there's no other video to try
+        """
+        if self.video_future is None:
+            video_path = self.video_paths[self.video_idx]
+            assert video_path is not None
+            self.video_idx += 1
+            self.video_idx %= len(self.video_paths)
+            if _prefetcher is not None:
+                self.video_future = _prefetcher.take_video(video_path)
+            if self.video_future is None:
+                self.video_future = _run_in_worker(self._open_video, video_path)
+
+        if not self.video_future.done():
+            return True
+        try:
+            video = self.video_future.result()
+        except Exception:
+            # Note: Broken video files (or a broken OpenCV install) shouldn't take down the render loop
+            video = None
+        self.video_future = None
+        if video is None:
+            # Note: The video after it is tried next frame
+            return len(self.video_paths) > 1
+
+        self.next_geometry = self._get_frame_geometry(renderer, video)
+        crop, size, tex_format, _ = self.next_geometry
+        self.next_decoder = VideoDecoder(video, tex_format, crop, size)
+        return True
+
+    def _start_next_video(self, renderer):
+        """
+        Switch to the next video (decoding already), the texture is reused if it has
+        the right size and format. Returns False if the texture doesn't fit in the
+        memory budget
+        """
+        _, size, tex_format, dst_rect = self.next_geometry
+        decoder = self.next_decoder
+        self.next_decoder = None
+        self.next_geometry = None
+
+        if self.tex is None and not self.stopping:
+            # Nothing shown yet, fade in once there is
+            self.fade_anim = ValueAnimation(0.0, 1.0, 1.0, ease=True)
+        if self.decoder is not None:
+            self.decoder.close()
+            self.decoder = None
+        if (self.tex_size, self.tex_format) != (size, tex_format):
+            self._destroy_texture()
+            self.tex = self._create_texture(renderer, size, tex_format)
+            if self.tex is None:
+                decoder.close()
+                return False
+
+        self.decoder = decoder
+        self.dst_rect = dst_rect
+        self.playing = True
+        return True
+
     def cleanup(self):
-        if self.video is not None:
-            #self.video.close()
-            self.video.release()
-            self.video = None
+        if self.video_future is not None:
+            self.video_future.add_done_callback(self._release_video)
+            self.video_future = None
 
-        if self.tex is not None:
-            sdl2.SDL_DestroyTexture(self.tex)
-            self.tex = None
+        for decoder in (self.decoder, self.next_decoder):
+            if decoder is not None:
+                decoder.close()
+        self.decoder = None
+        self.next_decoder = None
+        self.next_geometry = None
+        self._destroy_texture()
+
+    def memory_usage(self):
+        return self.tex_bytes + sum(
+            decoder.memory_bytes for decoder in (self.decoder, self.next_decoder) if decoder is not None)
 
 
 class PulseImageEffect(Effect):
@@ -835,7 +3001,7 @@ class PulseImageEffect(Effect):
     """
     def __init__(self, renderer, image_path):
         _, h = _get_renderer_dimensions(renderer)
-        self.image = Image(renderer, image_path, height=h)
+        self.image = _acquire_image(renderer, image_path, height=h)
         self.fade_anim = ValueAnimation(0.0, 1.0, 1.5, ease=True)
 
         grow = ValueAnimation(1, 1.25, 0.25, ease=True)
@@ -884,8 +3050,11 @@ class PulseImageEffect(Effect):
         if self.stopping and fade_animation_done:
             self.stopped = True
 
+    def memory_usage(self):
+        return self.image.byte_size
+
     def cleanup(self):
-        self.image.cleanup()
+        _release_image(self.image)
 
 
 class HorizontalScrollImagesEffect(Effect):
@@ -899,23 +3068,27 @@ class HorizontalScrollImagesEffect(Effect):
         self.margin = margin
         self.spacing = spacing
 
-        self.images = [Image(renderer, path, height=rh, svg_aa_factor=svg_aa_factor) for path in image_paths]
-        self.animations = []
-        self.rects = []
+        # Note: The images are packed into an atlas, so the whole strip is drawn with one call per atlas page
+        self.atlas = _acquire_atlas(renderer, [(path, rh, 0, svg_aa_factor) for path in image_paths])
+
+        # Width, vertical extent and atlas region of each image, as drawn
+        self.quads = []
         self.full_width = 0.0
 
-        for image in self.images:
+        for idx, (image_w, image_h) in enumerate(self.atlas.sizes):
 
-            s = (rh - (self.margin * 2)) / float(image.height)
+            s = (rh - (self.margin * 2)) / float(image_h)
 
-            w = float(image.width) * s
-            h = float(image.height) * s
+            w = float(image_w) * s
+            h = float(image_h) * s
             y = (rh - h) * 0.5
 
-            rect = sdl2.SDL_FRect(x=0, y=y, w=w, h=h)
-            self.rects.append(rect)
+            page_idx, uv = self.atlas.regions[idx]
+            self.quads.append((w, y, y + h, page_idx, uv))
+
+            self.full_width += w + self.spacing
 
-            self.full_width += rect.w + self.spacing
+        self.indices = None
 
         pos0 = -self.full_width
         pos1 = (math.ceil(rw / self.full_width) + 1) * self.full_width
@@ -936,14 +3109,20 @@ class HorizontalScrollImagesEffect(Effect):
     def is_stopped(self):
         return self.stopped
 
-    def draw_image(self, renderer, idx, alpha, scroll):
-        image = self.images[idx]
-        rect = self.rects[idx]
-        rect.x = scroll
-        sdl2.SDL_SetTextureAlphaMod(image.texture, int(alpha * 255.0))
-        sdl2.SDL_RenderCopyF(renderer, image.texture, image.rect, rect)
+    def _get_indices(self, quad_count):
+        """
+        Get the vertex indices of (at least) 'quad_count' quads, two triangles each
+        """
+        import ctypes
+        if self.indices is None or len(self.indices) < quad_count * 6:
+            indices = []
+            for base in range(0, max(quad_count, 16) * 4, 4):
+                indices.extend((base, base + 1, base + 2, base + 2, base + 1, base + 3))
+            self.indices = (ctypes.c_int * len(indices))(*indices)
+        return self.indices
 
     def render(self, renderer):
+        import ctypes
 
         rw, rh = _get_renderer_dimensions(renderer)
 
@@ -953,22 +3132,46 @@ class HorizontalScrollImagesEffect(Effect):
         repeat_behind = math.ceil(scroll_val / self.full_width)
         pos = scroll_val - (repeat_behind * self.full_width)
 
+        # Vertex positions and texture coordinates of the visible images, per atlas page
+        page_count = len(self.atlas.textures)
+        xy = [[] for _ in range(page_count)]
+        uv = [[] for _ in range(page_count)]
+
         done = False
         while not done:
-            for idx, _ in enumerate(self.images):
-                self.draw_image(renderer, idx, alpha_val, pos)
-                rect = self.rects[idx]
-                pos += rect.w + self.spacing
+            for w, y0, y1, page_idx, quad_uv in self.quads:
+                # Note: Images that are entirely off screen (to the left) are skipped
+                if pos + w > 0:
+                    xy[page_idx].extend((pos, y0, pos + w, y0, pos, y1, pos + w, y1))
+                    uv[page_idx].extend(quad_uv)
+                pos += w + self.spacing
                 done = pos > rw
                 if done:
                     break
 
+        alpha = int(alpha_val * 255.0)
+        for tex, page_xy, page_uv in zip(self.atlas.textures, xy, uv):
+            if not page_xy:
+                continue
+            vertex_count = len(page_xy) // 2
+            colors = (sdl2.SDL_Color * vertex_count)(*[sdl2.SDL_Color(255, 255, 255, alpha)] * vertex_count)
+            indices = self._get_indices(vertex_count // 4)
+            sdl2.SDL_RenderGeometryRaw(
+                renderer, tex,
+                (ctypes.c_float * len(page_xy))(*page_xy), 8,
+                colors, 4,
+                (ctypes.c_float * len(page_uv))(*page_uv), 8,
+                vertex_count,
+                indices, vertex_count // 4 * 6, 4)
+
         if self.stopping and alpha_anim_done:
             self.stopped = True
 
+    def memory_usage(self):
+        return self.atlas.byte_size
+
     def cleanup(self):
-        for image in self.images:
-            image.cleanup()
+        _release_image(self.atlas)
 
 
 class CpuUsageVisualizationEffect(Effect):
@@ -1096,7 +3299,7 @@ class VerticalScrollImagesEffect(Effect):
         self.PIXELS_PER_SECOND = 100
 
         rw, rh = _get_renderer_dimensions(renderer)
-        self.images = [Image(renderer, path, height=rh) for path in image_paths]
+        self.images = [_acquire_image(renderer, path, height=rh) for path in image_paths]
         self.animations = []
         self.rects = []
         self.current_image_idx = 0
@@ -1164,9 +3367,12 @@ class VerticalScrollImagesEffect(Effect):
         if self.stopping and alpha_anim_done:
             self.stopped = True
 
+    def memory_usage(self):
+        return sum(image.byte_size for image in self.images)
+
     def cleanup(self):
         for image in self.images:
-            image.cleanup()
+            _release_image(image)
 
 
 def _get_marquee_display_bounds(display_idx=DISPLAY_ONLY_MARQUEE):
@@ -1227,6 +3433,9 @@ def _open_marquee_window(display_idx=DISPLAY_ONLY_MARQUEE):
         sdl2.render.SDL_RENDERER_ACCELERATED | sdl2.SDL_RENDERER_PRESENTVSYNC)
 
     sdl2.SDL_SetHint(sdl2.SDL_HINT_RENDER_SCALE_QUALITY, b'best')
+    # Note: Video frames are converted to YUV by OpenCV as BT.601 (limited range), by
+    # default SDL would take frames taller than 576 lines to be BT.709
+    sdl2.SDL_SetYUVConversionMode(sdl2.surface.SDL_YUV_CONVERSION_BT601)
     sdl2.SDL_SetRenderDrawColor(renderer, 0, 0, 0, 255)
     sdl2.SDL_RenderClear(renderer)
     sdl2.SDL_RenderPresent(renderer)
@@ -1234,84 +3443,134 @@ def _open_marquee_window(display_idx=DISPLAY_ONLY_MARQUEE):
     return window, renderer
 
 
-def _close_marquee_window(window, renderer):
+def _close_marquee_window(window, renderer):
+    """
+    Close marquee window (used on shutdown)
+    """
+    sdl2.SDL_DestroyWindow(window)
+    sdl2.SDL_DestroyRenderer(renderer)
+    sdl2.SDL_Quit()
+
+
+def _get_renderer_dimensions(renderer):
+    """
+    Get renderer dimensions
+    """
+    w = c_int(0)
+    h = c_int(0)
+    sdl2.SDL_GetRendererOutputSize(renderer, byref(w), byref(h))
+    return w.value, h.value
+
+
+def _get_effect_images(command, renderer):
+    """
+    Get the images the effect created by a command loads, as the arguments of '_acquire_image'
+    """
+    name = command['name']
+    args = command['arguments']
+    _, h = _get_renderer_dimensions(renderer)
+
+    if name in (COMMAND_SHOW_IMAGE, COMMAND_GROW_IMAGE, COMMAND_PULSE_IMAGE):
+        return [(args['image'], h, 0, 1)]
+    elif name == COMMAND_FLYOUT:
+        return [(args['image'], int(h * args['height']), 0, 1)]
+    elif name == COMMAND_HORZ_SCROLL_IMAGES:
+        return [(image_path, h, 0, args['svgaafactor']) for image_path in args['images']]
+    elif name == COMMAND_VERT_SCROLL_IMAGES:
+        return [(image_path, h, 0, 1) for image_path in args['images']]
+    return []
+
+
+def _prepare_images(images):
     """
-    Close marquee window (used on shutdown)
+    Check and load the images of an effect, on a worker thread. Returns the loaded
+    images by the arguments of '_acquire_image', or None if an image file is missing
     """
-    sdl2.SDL_DestroyWindow(window)
-    sdl2.SDL_DestroyRenderer(renderer)
-    sdl2.SDL_Quit()
+    if not all(os.path.isfile(path) for path, _, _, _ in images):
+        return None
+    prepared = {}
+    try:
+        for image in images:
+            if image not in prepared:
+                prepared[image] = _load_surface(*image)
+    except:
+        _free_prepared_images(prepared)
+        raise
+    return prepared
 
 
-def _get_renderer_dimensions(renderer):
+def _free_prepared_images(prepared):
+    for loaded in prepared.values():
+        _free_surface(*loaded)
+
+
+def _discard_prepared_images(future):
     """
-    Get renderer dimensions
+    Done callback of an effect preparation that is no longer needed
     """
-    w = c_int(0)
-    h = c_int(0)
-    sdl2.SDL_GetRendererOutputSize(renderer, byref(w), byref(h))
-    return w.value, h.value
-
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        _free_prepared_images(future.result())
 
-def _process_marquee_command(command, render_manager):
 
+def _create_effect(command, renderer):
+    """
+    Create the effect for a command, once its images are prepared (see 'RenderManager.add_pending_effect')
+    """
     name = command['name']
     args = command['arguments']
 
     if name == COMMAND_SHOW_IMAGE:
-        image_path = Path(args['image'])
-        if image_path.is_file():
-            effect = ShowImageEffect(render_manager.renderer, args['image'], args['margin'])
-            render_manager.add_effect(effect)
+        return ShowImageEffect(renderer, args['image'], args['margin'])
 
     elif name == COMMAND_GROW_IMAGE:
-        image_path = Path(args['image'])
-        if image_path.is_file():
-            effect = GrowImageEffect(render_manager.renderer, args['image'], args['startmargin'], args['endmargin'], args['duration'], args['fade'])
-            render_manager.add_effect(effect)
+        return GrowImageEffect(renderer, args['image'], args['startmargin'], args['endmargin'], args['duration'], args['fade'])
 
     elif name == COMMAND_FLYOUT:
-        image_path = Path(args['image'])
-        if image_path.is_file():
-            effect = FlyoutEffect(render_manager.renderer, args['image'], args['alpha'], args['height'], args['margin'], args['delay'])
-            render_manager.add_effect(effect)
+        return FlyoutEffect(renderer, args['image'], args['alpha'], args['height'], args['margin'], args['delay'])
 
     elif name == COMMAND_PULSE_IMAGE:
-        image_path = Path(args['image'])
-        if image_path.is_file():
-            effect = PulseImageEffect(render_manager.renderer, args['image'])
-            render_manager.add_effect(effect)
+        return PulseImageEffect(renderer, args['image'])
 
     elif name == COMMAND_HORZ_SCROLL_IMAGES:
-        if all([Path(image_path).is_file() for image_path in args['images']]):
-            effect = HorizontalScrollImagesEffect(
-                render_manager.renderer,
-                args['images'],
-                args['speed'],
-                args['reverse'],
-                args['margin'],
-                args['spacing'],
-                args['svgaafactor'])
-            render_manager.add_effect(effect)
+        return HorizontalScrollImagesEffect(
+            renderer,
+            args['images'],
+            args['speed'],
+            args['reverse'],
+            args['margin'],
+            args['spacing'],
+            args['svgaafactor'])
 
     elif name == COMMAND_VERT_SCROLL_IMAGES:
-        if all([Path(image_path).is_file() for image_path in args['images']]):
-            effect = VerticalScrollImagesEffect(
-                render_manager.renderer,
-                args['images'])
-            render_manager.add_effect(effect)
+        return VerticalScrollImagesEffect(renderer, args['images'])
+
+    elif name == COMMAND_PLAY_VIDEOS:
+        return VideoPlaybackEffect(renderer, args['videos'], args['margin'], args['alpha'], args['fit'], args['delay'])
+
+    elif name == COMMAND_CPU_USAGE_VISUALIZATION:
+        return CpuUsageVisualizationEffect(renderer)
+
+
+def _process_marquee_command(command, render_manager):
+
+    name = command['name']
+    args = command['arguments']
+
+    if name in _EFFECT_COMMANDS:
+        # Note: The effect is created once its images have been loaded on a worker thread
+        render_manager.add_pending_effect(command)
 
     elif name == COMMAND_BACKGROUND:
         color = list(args['color'])
         render_manager.set_background_color(*color)
 
-    elif name == COMMAND_PLAY_VIDEOS:
-        effect = VideoPlaybackEffect(render_manager.renderer, args['videos'], args['margin'], args['alpha'], args['fit'], args['delay'])
-        render_manager.add_effect(effect)
+    elif name == COMMAND_SET_MEMORY_BUDGET:
+        if _resource_manager is not None:
+            _resource_manager.set_budget(args['budget'])
 
-    elif name == COMMAND_CPU_USAGE_VISUALIZATION:
-        effect = CpuUsageVisualizationEffect(render_manager.renderer)
-        render_manager.add_effect(effect)
+    elif name == COMMAND_PREFETCH:
+        if _prefetcher is not None:
+            _prefetcher.prefetch(args['paths'], args['kind'], args['height'], args['svgaafactor'], render_manager.renderer)
 
     elif name == COMMAND_CLEAR:
         render_manager.stop_all_effects()
@@ -1342,61 +3601,708 @@ def _process_events(events):
     return True
 
 
-def _run_command_listener(command_queue):
+class _ClientConnection(object):
+    """
+    Command listener side of a client connection
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = _FrameReader(sock, frame_timeout=None)
+        self.pending_output = bytearray()
+        self.partial_frame_time = None
+        # Set once the client subscribes to state changes, see '_StateStore'
+        self.subscribed = False
+        self.subscribed_keys = None
+        self.subscription_codec = None
+
+
+# Clients that don't read what we send are dropped once this much output is pending
+_MAX_PENDING_OUTPUT = 4 * 1024 * 1024
+
+
+class _StateSnapshotWriter(object):
+    """
+    Publishes the state store in shared memory, see '_StateSnapshotReader'. There
+    must only be one writer (i.e. the command listener thread)
+    """
+    def __init__(self, path, size=SNAPSHOT_SIZE):
+        import mmap
+        self.path = path
+        self.sequence = 0
+
+        # Note: The file is set up under a temporary name and then moved into place, so
+        # readers never see a file that isn't initialized yet
+        temp_path = f'{path}.{os.getpid()}'
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, size)
+            self.buffer = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.publish({})
+        try:
+            os.replace(temp_path, path)
+        except OSError:
+            self.buffer.close()
+            os.unlink(temp_path)
+            raise
+
+    def publish(self, values):
+        try:
+            payload = _encode_binary(values, _PAYLOAD_VALUE)
+        except (TypeError, ValueError):
+            # Values that only pickle can handle
+            payload = None
+        if payload is not None and _SNAPSHOT_HEADER.size + len(payload) > len(self.buffer):
+            payload = None
+
+        buffer = self.buffer
+        self.sequence += 1
+        _SNAPSHOT_SEQUENCE.pack_into(buffer, _SNAPSHOT_SEQUENCE_OFFSET, self.sequence)
+        if payload is not None:
+            buffer[_SNAPSHOT_HEADER.size:_SNAPSHOT_HEADER.size + len(payload)] = payload
+        length = len(payload) if payload is not None else _SNAPSHOT_UNAVAILABLE
+        self.sequence += 1
+        _SNAPSHOT_HEADER.pack_into(buffer, 0, _SNAPSHOT_MAGIC, os.getpid(), self.sequence, length, 0)
+
+    def close(self):
+        # Invalidate the snapshot for readers that still have it mapped
+        _SNAPSHOT_HEADER.pack_into(self.buffer, 0, 0, 0, self.sequence + 1, _SNAPSHOT_UNAVAILABLE, 0)
+        self.buffer.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class _StateStore(object):
+    """
+    Client state store of the command listener. Only accessed on the command
+    listener thread. Changes (i.e. values that differ from the current ones) are
+    pushed to the clients that subscribed to them, and published to the snapshot (if any)
+    """
+    def __init__(self, snapshot=None):
+        self.values = {}
+        self.subscribers = []
+        self.snapshot = snapshot
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def update(self, values):
+        changes = {}
+        for key, value in values.items():
+            if key not in self.values or self.values[key] != value:
+                self.values[key] = value
+                changes[key] = value
+        if changes and self.subscribers:
+            self._notify(changes)
+        if changes and self.snapshot is not None:
+            self.snapshot.publish(self.values)
+
+    def compare_and_set(self, expected, values):
+        """
+        Update 'values' if all the keys in 'expected' have the expected values, returns whether it did
+        """
+        for key, value in expected.items():
+            if self.values.get(key) != value:
+                return False
+        self.update(values)
+        return True
+
+    def subscribe(self, client, keys, codec):
+        client.subscribed = True
+        client.subscribed_keys = set(keys) if keys is not None else None
+        client.subscription_codec = codec
+        if client not in self.subscribers:
+            self.subscribers.append(client)
+        # Start the subscriber off with the current values
+        if keys is None:
+            current = dict(self.values)
+        else:
+            current = {key: self.values.get(key) for key in keys}
+        client.pending_output += _encode_frame(current, codec, _PAYLOAD_VALUE)
+
+    def unsubscribe(self, client):
+        if client.subscribed:
+            self.subscribers.remove(client)
+            client.subscribed = False
+
+    def _notify(self, changes):
+        for client in self.subscribers:
+            keys = client.subscribed_keys
+            client_changes = changes if keys is None else {key: value for key, value in changes.items() if key in keys}
+            if client_changes:
+                client.pending_output += _encode_frame(client_changes, client.subscription_codec, _PAYLOAD_VALUE)
+
+
+def _is_hashable(value):
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+
+def _is_key_list(keys):
+    return isinstance(keys, (list, tuple)) and all(_is_hashable(key) for key in keys)
+
+
+def _handle_client_command(command, codec, client, command_queue, state, get_metrics, event_handlers, listener_metrics):
+    """
+    Handle a command received by the command listener. State commands and events
+    are served right away, everything else is queued for the render loop. Returns
+    false if the command listener should stop. Raises ValueError for invalid
+    arguments that can't be answered with None
+    """
+    name = command['name']
+    args = command['arguments']
+
+    if name == COMMAND_SET_STATE:
+        if not _is_hashable(args['key']):
+            raise ValueError('Invalid state key')
+        state[args['key']] = args['value']
+
+    elif name == COMMAND_GET_STATE:
+        value = state.get(args['key']) if _is_hashable(args['key']) else None
+        client.pending_output += _encode_frame(value, codec, _PAYLOAD_VALUE)
+
+    elif name == COMMAND_SET_STATES:
+        # Note: No response is sent for this command, so the client is dropped instead
+        if not isinstance(args['values'], dict):
+            raise ValueError('Invalid state values')
+        state.update(args['values'])
+
+    elif name == COMMAND_GET_STATES:
+        values = [state.get(key) for key in args['keys']] if _is_key_list(args['keys']) else None
+        client.pending_output += _encode_frame(values, codec, _PAYLOAD_VALUE)
+
+    elif name == COMMAND_COMPARE_AND_SET_STATES:
+        if isinstance(args['expected'], dict) and isinstance(args['values'], dict):
+            result = state.compare_and_set(args['expected'], args['values'])
+        else:
+            # Note: None rather than False, the states weren't compared at all
+            result = None
+        client.pending_output += _encode_frame(result, codec, _PAYLOAD_VALUE)
+
+    elif name == COMMAND_SUBSCRIBE_STATE:
+        if args['keys'] is not None and not _is_key_list(args['keys']):
+            raise ValueError('Invalid state keys')
+        state.subscribe(client, args['keys'], codec)
+
+    elif name == COMMAND_GET_METRICS:
+        client.pending_output += _encode_frame(get_metrics(), codec, _PAYLOAD_VALUE)
+
+    elif name in (COMMAND_EVENT, COMMAND_HANDLE_EVENT):
+        if not isinstance(args['event'], str) or not isinstance(args['args'], (list, tuple)):
+            raise ValueError('Invalid event')
+        result = _route_event(args['event'], args['args'], command_queue, state, event_handlers)
+        if result != EVENT_HANDLED:
+            listener_metrics['eventsunhandled'] += 1
+            listener_metrics['eventlastunhandled'] = [args['event'], result]
+        if name == COMMAND_HANDLE_EVENT:
+            client.pending_output += _encode_frame(result, codec, _PAYLOAD_VALUE)
+
+    else:
+        command_queue.put(command)
+        if name == COMMAND_CLOSE:
+            return False
+
+    return True
+
+
+def _route_event(event, args, command_queue, state, event_handlers):
+    """
+    Run the handler of an event and queue the commands it returns as a single command
+    list. Returns EVENT_HANDLED, EVENT_NO_HANDLER(S) or EVENT_FAILED
+    """
+    handler = event_handlers.get(event)
+    if handler is None:
+        return EVENT_NO_HANDLER if event_handlers else EVENT_NO_HANDLERS
+    try:
+        commands = handler(args, state)
+    except Exception:
+        # Note: A broken handler must not take down the command listener
+        return EVENT_FAILED
+    if commands:
+        command_queue.put(_make_command(COMMAND_COMMAND_LIST, {'commands': commands}))
+    return EVENT_HANDLED
+
+
+def _load_event_handlers(path):
+    """
+    Load the event handlers from a module. The module maps event names to handlers
+    in 'EVENT_HANDLERS'. A handler is called with the event arguments and the client
+    state store, and returns the commands to run (or None). Handlers run on the
+    command listener thread, so they can keep warm caches (e.g. directory listings)
+    between events, but should not block for long
+    """
+    import importlib.util
+
+    # Note: Handler modules import marqueemanager to build commands, which needs to
+    # resolve to this module (and its state) also when it runs as the main script
+    sys.modules.setdefault('marqueemanager', sys.modules[__name__])
+
+    # Like a script, the handler module can import the modules next to it
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    spec = importlib.util.spec_from_file_location('_marquee_event_handlers', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.EVENT_HANDLERS
+
+
+def _serve_client(client, command_queue, state, allow_pickle, get_metrics, event_handlers, listener_metrics):
+    """
+    Receive and handle everything a client has sent. Returns whether to keep the
+    client connection, and whether the command listener should keep running. A client
+    sending a command that can't be handled is dropped (and counted in 'listener_metrics')
+    """
+    try:
+        client.reader.receive()
+    except (BlockingIOError, InterruptedError):
+        return True, True
+    except (EOFError, OSError, ValueError):
+        # Client disconnected, or sent an oversized frame
+        return False, True
+
+    running = True
+    while running:
+        try:
+            frame = client.reader.next_frame()
+            if frame is None:
+                break
+            command, codec = _decode_payload(frame, allow_pickle)
+        except Exception:
+            # Malformed or oversized payload (or pickle, which we don't trust by default,
+            # and which can fail in any way when we do)
+            listener_metrics['commandsrejected'] += 1
+            return False, True
+        try:
+            running = _handle_client_command(command, codec, client, command_queue, state, get_metrics, event_handlers, listener_metrics)
+        except Exception:
+            # Note: A bad request must only cost the client that sent it its connection,
+            # not take down the command listener (and with it all other clients)
+            listener_metrics['commandsrejected'] += 1
+            return False, True
+
+    # Keep track of when a partially received frame started, see '_run_command_listener'
+    if not client.reader.has_partial_frame:
+        client.partial_frame_time = None
+    elif client.partial_frame_time is None:
+        client.partial_frame_time = time.monotonic()
+
+    return True, running
+
+
+def _flush_client(client):
+    """
+    Send as much pending output as the socket accepts. Returns false if the client should be dropped
+    """
+    if len(client.pending_output) > _MAX_PENDING_OUTPUT:
+        return False
+    try:
+        byte_count_sent = client.sock.send(client.pending_output)
+    except (BlockingIOError, InterruptedError):
+        return True
+    except OSError:
+        return False
+    del client.pending_output[:byte_count_sent]
+    return True
+
+
+def _remove_stale_unix_socket(path):
+    """
+    Remove a socket file left behind by a marquee process that didn't shut down
+    cleanly. A socket file that is still accepting connections is left alone
+    """
+    if not os.path.exists(path):
+        return
+    try:
+        with _connect(path, 0.5):
+            pass
+    except ConnectionRefusedError:
+        os.unlink(path)
+
+
+def _run_command_listener(command_queue, address, allow_pickle=False, get_metrics=None, on_ready=None, event_handlers=None):
     """
-    Run the command listener
+    Run the command listener. All client connections are multiplexed on this
+    thread, so a slow client can't hold up the others. Pickled commands are only
+    accepted if 'allow_pickle' is set, since unpickling data from any client is unsafe.
+    'get_metrics' returns the metrics reported to clients, it is called on this thread.
+    'on_ready' is called once the listener accepts connections. 'event_handlers' maps
+    event names to handlers, see '_load_event_handlers'
     """
+    if get_metrics is None:
+        get_metrics = command_queue.get_metrics
+    if event_handlers is None:
+        event_handlers = {}
+
+    listener_metrics = {'commandsrejected': 0, 'eventsunhandled': 0, 'eventlastunhandled': None}
+    def get_all_metrics():
+        return {**get_metrics(), **listener_metrics}
+
+    import selectors
 
     # Client state store
-    state = {}
+    state = _StateStore()
+
+    # Filesystem unix domain sockets leave a file behind that we need to manage
+    socket_path = address if isinstance(address, str) and not address.startswith('@') else None
+    if socket_path is not None:
+        _remove_stale_unix_socket(socket_path)
 
     # Create socket
     TIMEOUT = 0.5
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        sock.bind((HOST, PORT))
-        sock.settimeout(TIMEOUT)
-        sock.listen(1)
+    sock, sock_address = _create_socket(address)
+    selector = selectors.DefaultSelector()
+    with sock, selector:
+        sock.bind(sock_address)
+        sock.listen()
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ)
+
+        # Publish the state store in shared memory, so clients can read it without a
+        # round trip. Note: Only once we own the address, so we don't replace the
+        # snapshot of another marquee process
+        try:
+            state.snapshot = _StateSnapshotWriter(_state_snapshot_path(address))
+        except OSError:
+            pass
+        if on_ready is not None:
+            on_ready()
+
+        def drop_client(client):
+            state.unsubscribe(client)
+            selector.unregister(client.sock)
+            client.sock.close()
+
+        def update_client(client, keep_client=True):
+            if keep_client and client.pending_output:
+                keep_client = _flush_client(client)
+            if not keep_client:
+                drop_client(client)
+                return
+            # Only wait for the socket to become writable while we have output pending
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.pending_output else 0)
+            if events != selector.get_key(client.sock).events:
+                selector.modify(client.sock, events, client)
+
+        # Main event loop
+        running = True
+        while running:
+            for key, events in selector.select(TIMEOUT):
+
+                if key.fileobj is sock:
+                    # Accept all pending connections
+                    while True:
+                        try:
+                            connection, _ = sock.accept()
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        connection.setblocking(False)
+                        if connection.family == socket.AF_INET:
+                            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                        selector.register(connection, selectors.EVENT_READ, _ClientConnection(connection))
+                    continue
+
+                client = key.data
+                if client.sock.fileno() == -1:
+                    # Dropped while pushing state changes earlier in this iteration
+                    continue
+                keep_client = True
+                if events & selectors.EVENT_READ:
+                    keep_client, running = _serve_client(client, command_queue, state, allow_pickle, get_all_metrics, event_handlers, listener_metrics)
+                update_client(client, keep_client)
+
+                # Push the state changes made by this client to the subscribers
+                for subscriber in list(state.subscribers):
+                    if subscriber is not client and subscriber.pending_output:
+                        update_client(subscriber)
+
+                if not running:
+                    break
 
-        # Main receive loop
-        while True:
-            try:
-                connection, _ = sock.accept()
-                command = _receive_on_socket(connection)
+            # Drop clients that stalled in the middle of a frame
+            now = time.monotonic()
+            for key in list(selector.get_map().values()):
+                client = key.data
+                if client is not None and client.partial_frame_time is not None and now - client.partial_frame_time > FRAME_TIMEOUT:
+                    drop_client(client)
+
+        for key in list(selector.get_map().values()):
+            if key.data is not None:
+                key.data.sock.close()
+
+    if state.snapshot is not None:
+        state.snapshot.close()
+    if socket_path is not None:
+        # Note: The socket file may have been removed already, e.g. by a tmp cleanup
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
 
-                name = command['name']
-                args = command['arguments']
 
-                if name == COMMAND_SET_STATE:
-                    state[args['key']] = args['value']
+# Worker threads of the marquee process, see '_main' and '_run_in_worker'
+_worker_pool = None
 
-                elif name == COMMAND_GET_STATE:
-                    _send_on_socket(connection, state.get(args['key']))
 
-                else:
-                    command_queue.put(command)
-                    if name == COMMAND_CLOSE:
-                        break
+def _run_in_worker(func, *args):
+    """
+    Run a function on a worker thread, returns a future. Runs it right away if there are no workers
+    """
+    if _worker_pool is not None:
+        return _worker_pool.submit(func, *args)
+    return _run_inline(func, *args)
 
-            except TimeoutError:
-                continue
+
+def _run_inline(func, *args):
+    """
+    Run a function right away, returns a (completed) future
+    """
+    from concurrent.futures import Future
+    future = Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as ex:
+        future.set_exception(ex)
+    return future
+
+
+def _lower_thread_priority():
+    """
+    Worker thread initializer, lowers the priority of the thread so it yields to
+    rendering (only supported on Linux, where threads have a priority of their own)
+    """
+    if sys.platform.startswith('linux'):
+        import threading
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except OSError:
+            pass
+
+
+def _prefetch_video(video_path):
+    """
+    Open a video and decode its first frame, on the prefetch thread. Returns None if the video can't be opened
+    """
+    video = VideoPlaybackEffect._open_video(video_path)
+    if video is not None:
+        video.read()
+        video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    return video
+
+
+class Prefetcher(object):
+    """
+    Loads media ahead of the effects using it, see 'prefetch'. Loading happens on a
+    thread of its own with a lower priority than the workers preparing effects, and
+    the textures are only created in frames without pending effects (one per frame).
+    Prefetched images are held in the texture cache (so the effects find them
+    there) and videos are handed over to the first effect playing them. Only used
+    on the main thread
+    """
+    MAX_PENDING = 16
+
+    def __init__(self, max_bytes=PREFETCH_MAX_BYTES, max_videos=PREFETCH_MAX_VIDEOS):
+        from concurrent.futures import ThreadPoolExecutor
+        self.pool = ThreadPoolExecutor(1, thread_name_prefix='Marquee prefetch thread', initializer=_lower_thread_priority)
+        self.max_bytes = max_bytes
+        self.max_videos = max_videos
+        # Images being loaded, as (image, future) where image is the arguments of '_acquire_image'
+        self.pending = deque()
+        # Prefetched images (oldest first), held until they're dropped
+        self.images = OrderedDict()
+        self.total_bytes = 0
+        # Video path -> future of the opened video (oldest first)
+        self.videos = OrderedDict()
+
+    def prefetch(self, paths, kind, height, svg_aa_factor, renderer):
+        if kind == PREFETCH_VIDEO:
+            for path in paths:
+                if path in self.videos:
+                    self.videos.move_to_end(path)
+                    continue
+                self.videos[path] = self.pool.submit(_prefetch_video, path)
+                while len(self.videos) > self.max_videos:
+                    _, future = self.videos.popitem(last=False)
+                    if not future.cancel():
+                        future.add_done_callback(VideoPlaybackEffect._release_video)
+            return
+
+        _, h = _get_renderer_dimensions(renderer)
+        pending_images = {image for image, _ in self.pending}
+        for path in paths:
+            image = (path, int(h * height), 0, svg_aa_factor)
+            if image in self.images:
+                self.images.move_to_end(image)
+            elif image not in pending_images and (_texture_cache is None or not _texture_cache.contains(*image)):
+                self.pending.append((image, self.pool.submit(_prepare_images, [image])))
+
+        # Newer requests are more relevant (e.g. while scrolling through a list)
+        while len(self.pending) > self.MAX_PENDING:
+            _, future = self.pending.popleft()
+            if not future.cancel():
+                future.add_done_callback(_discard_prepared_images)
+
+    def take_video(self, video_path):
+        """
+        Take over the prefetched video (future of the opened video), or None if it wasn't prefetched
+        """
+        return self.videos.pop(video_path, None)
+
+    def update(self):
+        """
+        Create the texture for one prefetched image (if any are loaded), once per frame
+        """
+        if not self.pending or not self.pending[0][1].done():
+            return
+        image, future = self.pending.popleft()
+        try:
+            prepared = future.result()
+        except Exception:
+            # Note: Prefetching is best effort, the effect will report the error if the image is used
+            return
+        if prepared is None:
+            return
+        # Note: Prefetching never evicts anything to make room
+        if _texture_cache is None or (_resource_manager is not None and
+                                      _resource_manager.total_bytes + _surface_bytes(prepared[image][0]) > _resource_manager.budget_bytes):
+            _free_prepared_images(prepared)
+            return
+
+        try:
+            cached_image = _texture_cache.acquire(*image, loaded=prepared[image])
+        except SDLError:
+            return
+        self.images[image] = cached_image
+        self.total_bytes += TextureCache._image_bytes(cached_image)
+        self.trim(self.total_bytes - self.max_bytes)
+
+    def trim(self, size):
+        """
+        Drop prefetched images (oldest first) until 'size' bytes are released to the texture cache
+        """
+        target_bytes = max(0, self.total_bytes - size)
+        while self.total_bytes > target_bytes and self.images:
+            _, dropped_image = self.images.popitem(last=False)
+            self.total_bytes -= TextureCache._image_bytes(dropped_image)
+            _texture_cache.release(dropped_image)
+
+    def cleanup(self):
+        for _, future in self.pending:
+            future.add_done_callback(_discard_prepared_images)
+        for future in self.videos.values():
+            future.add_done_callback(VideoPlaybackEffect._release_video)
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        for image in self.images.values():
+            _texture_cache.release(image)
+        self.pending.clear()
+        self.images.clear()
+        self.videos.clear()
+        self.total_bytes = 0
+
+    def get_metrics(self):
+        return {
+            'prefetchpending': len(self.pending),
+            'prefetchimages': len(self.images),
+            'prefetchbytes': self.total_bytes,
+            'prefetchvideos': len(self.videos)}
+
+
+# Prefetcher of the marquee process, see '_main'
+_prefetcher = None
 
 
 class RenderManager(object):
 
-    def __init__(self, renderer, max_effects_count):
+    def __init__(self, renderer, max_effects_count, metrics=None):
         self.effects = []
+        # Effects waiting for their images to be loaded, as (command, future) in command order
+        self.pending_effects = deque()
         self.renderer = renderer
         self.color_anim = ColorAnimation((0, 0, 0), (0, 0, 0), 0)
         self.max_effects_count = max_effects_count
+        # Effects that failed to load or to be created are counted in 'effectsfailed'
+        self.metrics = metrics if metrics is not None else {}
+        self.metrics.setdefault('effectsfailed', 0)
 
     def add_effect(self, effect):
         self.effects.append(effect)
 
+    def add_pending_effect(self, command):
+        """
+        Create the effect for a command once its images have been loaded on a worker thread
+        """
+        images = _get_effect_images(command, self.renderer)
+        # Images in the texture cache don't need to be loaded (the scroller only uses its atlas)
+        if _texture_cache is not None:
+            if command['name'] == COMMAND_HORZ_SCROLL_IMAGES:
+                images = [] if _texture_cache.contains_atlas(images) else images
+            else:
+                images = [image for image in images if not _texture_cache.contains(*image)]
+        future = _run_in_worker(_prepare_images, images) if images else _run_inline(_prepare_images, images)
+        self.pending_effects.append((command, future))
+
+    def activate_pending_effects(self):
+        """
+        Create the effects whose images are loaded. Effects are created in command
+        order (it's also the draw order), so an effect waits for the ones before it
+        """
+        global _prepared_images
+        while self.pending_effects and self.pending_effects[0][1].done():
+            command, future = self.pending_effects.popleft()
+            try:
+                prepared = future.result()
+            except Exception:
+                # Note: Some media files fail to load (see '_apply_command') or disappear
+                # while they're loaded, that mustn't take down the render loop. The images
+                # loaded so far are freed by '_prepare_images'
+                self.metrics['effectsfailed'] += 1
+                continue
+            if prepared is None:
+                continue
+
+            # Note: The textures take as much memory as the surfaces they're uploaded from
+            texture_bytes = sum(_surface_bytes(surface) for surface, _ in prepared.values())
+            if _resource_manager is not None and not _resource_manager.reserve(texture_bytes):
+                _resource_manager.refuse(command['name'], texture_bytes)
+                _free_prepared_images(prepared)
+                continue
+
+            # Only the texture uploads happen here
+            _prepared_images = prepared
+            try:
+                self.add_effect(_create_effect(command, self.renderer))
+            except Exception:
+                self.metrics['effectsfailed'] += 1
+            finally:
+                _free_prepared_images(_prepared_images)
+                _prepared_images = {}
+
+    def cancel_pending_effects(self):
+        for _, future in self.pending_effects:
+            if not future.cancel():
+                future.add_done_callback(_discard_prepared_images)
+        self.pending_effects.clear()
+
     def stop_all_effects(self):
+        self.cancel_pending_effects()
         for effect in self.effects:
             effect.stop()
 
     def cleanup(self):
+        self.cancel_pending_effects()
         for effect in self.effects:
             effect.cleanup()
 
@@ -1408,6 +4314,11 @@ class RenderManager(object):
         self.color_anim = ColorAnimation(color0, color1, 1.0, ease=True)
 
     def render(self):
+        self.activate_pending_effects()
+        # Note: Prefetched images only get a texture in frames where no effect is waiting for one
+        if _prefetcher is not None and not self.pending_effects:
+            _prefetcher.update()
+
         color, _ = self.color_anim.evaluate()
         sdl2.SDL_SetRenderDrawColor(
             self.renderer,
@@ -1432,41 +4343,307 @@ class RenderManager(object):
         for effect in effects_to_remove:
             self.effects.remove(effect)
 
+        if _resource_manager is not None:
+            _resource_manager.update_effects(self.effects)
+
         sdl2.SDL_RenderPresent(self.renderer)
 
 
-def _dequeue_command(queue):
+# Commands that create effects, i.e. commands that are made obsolete by a later 'clear'
+_EFFECT_COMMANDS = {
+    COMMAND_SHOW_IMAGE,
+    COMMAND_GROW_IMAGE,
+    COMMAND_FLYOUT,
+    COMMAND_PULSE_IMAGE,
+    COMMAND_PLAY_VIDEOS,
+    COMMAND_HORZ_SCROLL_IMAGES,
+    COMMAND_VERT_SCROLL_IMAGES,
+    COMMAND_CPU_USAGE_VISUALIZATION,
+}
+
+
+def _starts_with_clear(command):
+    name = command['name']
+    if name == COMMAND_CLEAR:
+        return True
+    if name == COMMAND_COMMAND_LIST:
+        commands = command['arguments']['commands']
+        return len(commands) > 0 and _starts_with_clear(commands[0])
+    return False
+
+
+def _remove_obsolete_commands(command):
+    """
+    Remove everything a later 'clear' makes obsolete from a queued command. Returns
+    the remaining command (or None if nothing remains) and the number of commands removed
+    """
+    name = command['name']
+    if name in _EFFECT_COMMANDS or name in (COMMAND_CLEAR, COMMAND_NOOP):
+        return None, 1
+
+    if name == COMMAND_COMMAND_LIST:
+        remaining = []
+        removed_count = 0
+        for child_command in command['arguments']['commands']:
+            child_command, child_removed_count = _remove_obsolete_commands(child_command)
+            removed_count += child_removed_count
+            if child_command is not None:
+                remaining.append(child_command)
+        if not remaining:
+            return None, removed_count + 1
+        return _make_command(COMMAND_COMMAND_LIST, {'commands': remaining}), removed_count
+
+    return command, 0
+
+
+class CommandQueue(object):
+    """
+    Thread safe command queue between the command listener and the render loop.
+
+    Commands that start with a 'clear' (such as the command lists sent when scrolling
+    through a game list) make all queued effects obsolete, so those are dropped right
+    away instead of being built only to be stopped again. 'clear' and 'close' skip the
+    queue, and if the queue is full the oldest command is dropped
+    """
+    def __init__(self, max_size=64):
+        from threading import Lock
+        self.lock = Lock()
+        # Note: Entries are (enqueue time, command) tuples
+        self.priority_commands = deque()
+        self.commands = deque()
+        self.max_size = max_size
+        self.max_depth = 0
+        self.coalesced_count = 0
+        self.dropped_count = 0
+
+    def put(self, command):
+        with self.lock:
+            if _starts_with_clear(command):
+                remaining = deque()
+                for enqueue_time, queued_command in self.commands:
+                    queued_command, removed_count = _remove_obsolete_commands(queued_command)
+                    self.coalesced_count += removed_count
+                    if queued_command is not None:
+                        remaining.append((enqueue_time, queued_command))
+                self.commands = remaining
+                if any(c['name'] == COMMAND_CLEAR for _, c in self.priority_commands):
+                    self.priority_commands = deque((t, c) for t, c in self.priority_commands if c['name'] != COMMAND_CLEAR)
+                    self.coalesced_count += 1
+
+            entry = (time.monotonic(), command)
+            if command['name'] in (COMMAND_CLEAR, COMMAND_CLOSE):
+                self.priority_commands.append(entry)
+            else:
+                if len(self.commands) >= self.max_size:
+                    # Drop the oldest command, but never one that starts with a 'clear', since
+                    # the commands queued after it rely on it (there is at most one of those)
+                    idx = 1 if len(self.commands) > 1 and _starts_with_clear(self.commands[0][1]) else 0
+                    del self.commands[idx]
+                    self.dropped_count += 1
+                self.commands.append(entry)
+
+            self.max_depth = max(self.max_depth, len(self.priority_commands) + len(self.commands))
+
+    def requeue(self, command, enqueue_time):
+        """
+        Put the unprocessed remainder of a command back at the front of the queue
+        """
+        with self.lock:
+            self.commands.appendleft((enqueue_time, command))
+
+    def get(self):
+        """
+        Dequeue command and the time it was enqueued; if the queue is empty return (None, None)
+        """
+        with self.lock:
+            if self.priority_commands:
+                enqueue_time, command = self.priority_commands.popleft()
+            elif self.commands:
+                enqueue_time, command = self.commands.popleft()
+            else:
+                return None, None
+            return command, enqueue_time
+
+    def qsize(self):
+        with self.lock:
+            return len(self.priority_commands) + len(self.commands)
+
+    def get_metrics(self):
+        with self.lock:
+            return {
+                'queuedepth': len(self.priority_commands) + len(self.commands),
+                'queuemaxdepth': self.max_depth,
+                'queuecoalesced': self.coalesced_count,
+                'queuedropped': self.dropped_count}
+
+
+def _apply_command(command, render_manager):
     """
-    Dequeue command; if the queue is empty return None
+    Process a single command, returns false if termination was requested
     """
     try:
-        return queue.get(block=False)
-    except Empty:
-        return None
+        return _process_marquee_command(command, render_manager)
+    except SDLError:
+        # Hacky, but some media files fail to load and this is the easiest
+        # place to handle/ignore that
+        return True
+
+
+def _drain_commands(command_queue, render_manager, time_budget, metrics):
+    """
+    Process queued commands until the per-frame time budget is used up. Command lists
+    are processed one child command at a time, and whatever doesn't fit in the budget
+    is put back in the queue for the next frame. At least one command is processed per
+    call, so we always make progress. Returns false if termination was requested
+    """
+    t0 = time.monotonic()
+    while True:
+        command, enqueue_time = command_queue.get()
+        if command is None:
+            return True
+
+        if command['name'] == COMMAND_COMMAND_LIST:
+            child_commands = deque(command['arguments']['commands'])
+            while child_commands:
+                # Note: A close in a command list is ignored, like in nested command lists.
+                # Only a close on its own stops the command listener too
+                _apply_command(child_commands.popleft(), render_manager)
+                if child_commands and time.monotonic() - t0 > time_budget:
+                    command_queue.requeue(_make_command(COMMAND_COMMAND_LIST, {'commands': list(child_commands)}), enqueue_time)
+                    metrics['commandscarriedover'] += 1
+                    return True
+        elif not _apply_command(command, render_manager):
+            return False
+
+        # Record latency from enqueue to apply
+        latency = time.monotonic() - enqueue_time
+        metrics['commandsapplied'] += 1
+        metrics['commandlatencylast'] = latency
+        metrics['commandlatencymax'] = max(metrics['commandlatencymax'], latency)
+        metrics['commandlatencytotal'] += latency
+
+        if time.monotonic() - t0 > time_budget:
+            return True
+
+
+def _import_render_modules():
+    """
+    Import SDL. Deferred until the command listener is up, so clients waiting
+    for the marquee process to start don't have to wait for this too
+    """
+    global sdl2, SDLError
+    import sdl2
+    import sdl2.ext
+    from sdl2.ext.err import SDLError
+
+
+def _import_video_modules():
+    """
+    Import the video decoding modules. These are slow to import, so it's
+    deferred until the first video is played
+    """
+    global cv2, np
+    import numpy as np
+    import cv2
 
 
 def _main():
     """
     Main entry point
     """
-    # Create marquee window
+    global _texture_cache, _raster_cache, _worker_pool, _prefetcher, _resource_manager
+
     display_idx = int(sys.argv[1]) if len(sys.argv) > 1 else DISPLAY_ONLY_MARQUEE
-    window, renderer = _open_marquee_window(display_idx)
 
-    # Create a command queue that we share between threads
-    command_queue = Queue()
+    # Listen on the address we were started with, this is also the address
+    # used when we send commands to ourselves (see 'close' below)
+    if len(sys.argv) > 2:
+        set_address(_address_from_str(sys.argv[2]))
+    address = _get_address()
+
+    # Only accept pickled commands if we were explicitly started with the pickle codec
+    if len(sys.argv) > 3:
+        set_codec(sys.argv[3])
+    allow_pickle = _codec == CODEC_PICKLE
+
+    # Pipe used to signal readiness to 'start_marquee' ('-' if there is none)
+    ready_fd = int(sys.argv[4]) if len(sys.argv) > 4 and sys.argv[4] != '-' else None
 
-    # Start the command listener thread
+    # Load the event handlers before accepting connections, so no event goes unhandled
+    event_handlers = {}
+    if len(sys.argv) > 5:
+        try:
+            event_handlers = _load_event_handlers(sys.argv[5])
+        except Exception:
+            # Note: Still serve the clients, the events are ignored like any unhandled event
+            pass
+
+    # Create a command queue that we share between threads
+    MAX_QUEUED_COMMANDS = 64
+    command_queue = CommandQueue(MAX_QUEUED_COMMANDS)
+
+    # Render loop metrics, reported along with the command queue metrics
+    loop_metrics = {
+        'commandsapplied': 0,
+        'commandscarriedover': 0,
+        'commandlatencylast': 0.0,
+        'commandlatencymax': 0.0,
+        'commandlatencytotal': 0.0,
+        'effectsfailed': 0,
+        'firstframetime': None}
+    def get_metrics():
+        metrics = {**command_queue.get_metrics(), **loop_metrics}
+        texture_cache = _texture_cache
+        if texture_cache is not None:
+            metrics.update(texture_cache.get_metrics())
+        prefetcher = _prefetcher
+        if prefetcher is not None:
+            metrics.update(prefetcher.get_metrics())
+        resource_manager = _resource_manager
+        if resource_manager is not None:
+            metrics.update(resource_manager.get_metrics())
+        metrics.update(_video_metrics)
+        raster_cache = _raster_cache
+        if raster_cache is not None:
+            metrics['rastercachehits'] = raster_cache.hit_count
+            metrics['rastercachemisses'] = raster_cache.miss_count
+        return metrics
+
+    # Start the command listener thread before anything else, commands received
+    # while we open the window are queued until the main loop is running
+    listener_ready = Event()
     command_listener_thread = Thread(
         target=_run_command_listener,
         name='Marquee command listener thread',
-        args=(command_queue,),
+        args=(command_queue, address, allow_pickle, get_metrics, listener_ready.set, event_handlers),
         daemon=True)
     command_listener_thread.start()
+    while not listener_ready.wait(0.01):
+        if not command_listener_thread.is_alive():
+            # Failed to bind, most likely another marquee process is running
+            sys.exit(1)
+    if ready_fd is not None:
+        _signal_ready(ready_fd)
+
+    # Create marquee window
+    _import_render_modules()
+    window, renderer = _open_marquee_window(display_idx)
+    _set_output_size(*_get_renderer_dimensions(renderer))
+
+    # Create texture cache, shared by all the effects, on top of the raster cache. The
+    # resource manager keeps the memory they (and the effects) use within the budget
+    _resource_manager = ResourceManager()
+    _raster_cache = RasterCache(_get_raster_cache_dir())
+    _texture_cache = TextureCache(renderer)
+
+    # Create the worker threads that load media
+    from concurrent.futures import ThreadPoolExecutor
+    _worker_pool = ThreadPoolExecutor(WORKER_THREAD_COUNT, thread_name_prefix='Marquee worker thread')
+    _prefetcher = Prefetcher()
 
     # Create render manager
     MAX_EFFECT_COUNT = 10
-    render_manager = RenderManager(renderer, MAX_EFFECT_COUNT)
+    render_manager = RenderManager(renderer, MAX_EFFECT_COUNT, loop_metrics)
 
     # Enter main loop
     while True:
@@ -1476,43 +4653,32 @@ def _main():
         if not _process_events(events):
             close()
 
-        # Get command
-        command = _dequeue_command(command_queue)
-
-        # Process command
-        if command is not None:
-            try:
-                if not _process_marquee_command(command, render_manager):
-                    break
-            except SDLError:
-                # Hacky, but some media files fail to load and this is the easiest
-                # place to handle/ignore that
-                pass
+        # Process as many commands as the time budget allows
+        if not _drain_commands(command_queue, render_manager, COMMAND_TIME_BUDGET_SECONDS, loop_metrics):
+            break
 
         # Render
         render_manager.render()
+        if loop_metrics['firstframetime'] is None:
+            loop_metrics['firstframetime'] = time.time()
 
-    # Cleanup render resources
+    # Cleanup render resources, once the workers are done with whatever they were loading
     render_manager.cleanup()
+    _worker_pool.shutdown(wait=True, cancel_futures=True)
+    _prefetcher.cleanup()
+    _texture_cache.cleanup()
+    VideoDecoder.join_threads(1.0)
 
-    # Wait for command listener thread to finish
-    command_listener_thread.join()
+    # Wait for command listener thread to finish. Note: It's a daemon thread, so if it
+    # doesn't stop in time it won't keep the process alive
+    command_listener_thread.join(1.0)
 
     # Close marquee window and cleanup
     _close_marquee_window(window, renderer)
 
 
 if __name__ == "__main__":
-    import sys
-    import sdl2
-    import sdl2.ext
-    from sdl2.ext.err import SDLError
-    from ctypes import c_int, c_ubyte, c_void_p, byref, cast, POINTER, pythonapi, py_object
+    from ctypes import c_int, c_ubyte, byref, cast, POINTER
     from threading import Thread, Event
-    from queue import Queue, Empty
-    from multiprocessing.connection import Listener
-    from pathlib import Path
     import math
-    import numpy as np
-    import cv2
     _main()
@@ -0,0 +1,330 @@
+"""
+Asyncio client for the marquee process. Mirrors the blocking client functions in
+'marqueemanager', but all commands go through a shared persistent connection, so
+a frontend can update the marquee without stalling its event loop. Requests that
+expect a response (i.e. 'get_state') may be in flight concurrently; responses
+arrive in request order and are matched to their requests accordingly
+"""
+import asyncio
+from collections import deque
+
+import marqueemanager as mm
+from marqueemanager import (
+    horizontal_scroll_images_command,
+    vertical_scroll_images_command,
+    grow_image_command,
+    show_image_command,
+    flyout_command,
+    pulse_image_command,
+    cpu_usage_visualization_command,
+    play_videos_command,
+    set_background_color_command,
+    prefetch_command,
+    set_memory_budget_command,
+    clear_command,
+    set_state_command,
+    set_states_command,
+    event_command)
+
+
+async def _open_connection(address, timeout):
+    if isinstance(address, str):
+        path = '\0' + address[1:] if address.startswith('@') else address
+        connection = asyncio.open_unix_connection(path)
+    else:
+        connection = asyncio.open_connection(*address)
+    return await asyncio.wait_for(connection, timeout)
+
+
+class AsyncSession(object):
+    """
+    Persistent asyncio connection to the marquee process, (re)connected on demand.
+    If 'address' is not specified the address set with 'marqueemanager.set_address' is used
+    """
+    TIMEOUT = 0.5
+
+    def __init__(self, address=None):
+        self.address = address
+        self.reader = None
+        self.writer = None
+        self.receive_task = None
+        self.pending_responses = deque()
+        self.connect_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _connect(self):
+        address = self.address if self.address is not None else mm._get_address()
+        self.reader, self.writer = await _open_connection(address, self.TIMEOUT)
+        self.receive_task = asyncio.create_task(self._receive_responses(self.reader))
+
+    async def _receive_responses(self, reader):
+        """
+        Receive responses and hand them to the requests waiting for them (in order)
+        """
+        try:
+            while True:
+                header = await reader.readexactly(mm._FRAME_HEADER.size)
+                frame_size, = mm._FRAME_HEADER.unpack(header)
+                if frame_size > mm.MAX_FRAME_SIZE:
+                    raise ValueError(f'Frame too large ({frame_size} bytes)')
+                frame = await reader.readexactly(frame_size)
+                response, _ = mm._decode_payload(frame, allow_pickle=mm._codec == mm.CODEC_PICKLE)
+                future = self.pending_responses.popleft()
+                # Note: The request may have timed out (and given up) in the meantime
+                if not future.done():
+                    future.set_result(response)
+        except (asyncio.IncompleteReadError, OSError, ValueError, IndexError):
+            self._disconnect()
+
+    def _disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+        if self.receive_task is not None and self.receive_task is not asyncio.current_task():
+            self.receive_task.cancel()
+        self.receive_task = None
+        while self.pending_responses:
+            future = self.pending_responses.popleft()
+            if not future.done():
+                future.set_result(None)
+
+    async def close(self):
+        writer = self.writer
+        self._disconnect()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _transact(self, command, expect_response):
+        try:
+            frame = mm._encode_frame(command)
+        except ValueError:
+            return None if expect_response else False
+        # Note: If the connection was dropped (e.g. the marquee process was restarted) we
+        # reconnect and retry once; if we can't connect at all we give up right away. Once
+        # the command was written it's never sent again, the marquee process may have run it
+        for _ in range(2):
+            try:
+                async with self.connect_lock:
+                    if self.writer is not None and self._is_connection_closed():
+                        self._disconnect()
+                    if self.writer is None:
+                        await self._connect()
+            except (ConnectionRefusedError, FileNotFoundError, asyncio.TimeoutError):
+                self._disconnect()
+                break
+            except OSError:
+                self._disconnect()
+                continue
+            writer = self.writer
+            try:
+                future = None
+                if expect_response:
+                    future = asyncio.get_running_loop().create_future()
+                    self.pending_responses.append(future)
+                writer.write(frame)
+                await writer.drain()
+                if future is None:
+                    return True
+                return await asyncio.wait_for(future, self.TIMEOUT)
+            except asyncio.TimeoutError:
+                break
+            except OSError:
+                # Note: The receive task may have torn down the connection already
+                if writer is self.writer:
+                    self._disconnect()
+                break
+        return None if expect_response else False
+
+    def _is_connection_closed(self):
+        """
+        Check whether the other end closed the connection (as far as the event loop
+        has seen), writing to it would still succeed but whatever is written is lost
+        """
+        if self.writer.is_closing() or self.reader.at_eof() or self.receive_task.done():
+            return True
+        # Note: The event loop may not have seen the end of the connection yet. Anything to
+        # read is a response to a request in flight, or else it's the end of the connection
+        return not self.pending_responses and mm._is_connection_closed(self.writer.get_extra_info('socket'))
+
+    async def send(self, command):
+        """
+        Send command without waiting for the marquee process to handle it
+        """
+        return await self._transact(command, expect_response=False)
+
+    async def send_and_receive(self, command):
+        """
+        Send command and wait for the response
+        """
+        return await self._transact(command, expect_response=True)
+
+
+# Session shared by the module level functions, one per event loop
+_session = None
+_session_loop = None
+
+
+def _get_session():
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session_loop is not loop:
+        _session = AsyncSession()
+        _session_loop = loop
+    return _session
+
+
+async def aclose():
+    """
+    Close the shared connection
+    """
+    global _session, _session_loop
+    if _session is not None:
+        session = _session
+        _session = None
+        _session_loop = None
+        await session.close()
+
+
+async def start_marquee(display_idx=mm.DISPLAY_ONLY_MARQUEE, address=None, codec=None, event_handlers=None):
+    return await asyncio.to_thread(mm.start_marquee, display_idx, address, codec, event_handlers)
+
+
+async def horizontal_scroll_images(image_paths: list[str], speed: float, reverse: bool, margin: float, spacing: float, svg_aa_factor: float):
+    return await _get_session().send(horizontal_scroll_images_command(image_paths, speed, reverse, margin, spacing, svg_aa_factor))
+
+
+async def vertical_scroll_images(image_paths: list[str]):
+    return await _get_session().send(vertical_scroll_images_command(image_paths))
+
+
+async def grow_image(image_path: str, margin_start: float, margin_end: float, duration: float, fade: str):
+    return await _get_session().send(grow_image_command(image_path, margin_start, margin_end, duration, fade))
+
+
+async def show_image(image_path: str, margin: float):
+    return await _get_session().send(show_image_command(image_path, margin))
+
+
+async def flyout(image_path: str, alpha: float, height: float, margin: float, delay: float):
+    return await _get_session().send(flyout_command(image_path, alpha, height, margin, delay))
+
+
+async def pulse_image(image_path: str):
+    return await _get_session().send(pulse_image_command(image_path))
+
+
+async def cpu_usage_visualization():
+    return await _get_session().send(cpu_usage_visualization_command())
+
+
+async def play_videos(video_paths: str, margin: float, alpha: float, fit: str, delay: float):
+    return await _get_session().send(play_videos_command(video_paths, margin, alpha, fit, delay))
+
+
+async def set_background_color(r, g, b):
+    return await _get_session().send(set_background_color_command(r, g, b))
+
+
+async def prefetch(paths: list[str], kind: str, height: float = 1.0, svg_aa_factor: float = 1.0):
+    return await _get_session().send(prefetch_command(paths, kind, height, svg_aa_factor))
+
+
+async def set_memory_budget(budget_bytes: int):
+    return await _get_session().send(set_memory_budget_command(budget_bytes))
+
+
+async def command_list(commands: list[str]):
+    return await _get_session().send(mm._make_command(mm.COMMAND_COMMAND_LIST, {
+        'commands': commands }))
+
+
+async def noop():
+    return await _get_session().send(mm._make_command(mm.COMMAND_NOOP))
+
+
+async def clear():
+    return await _get_session().send(clear_command())
+
+
+async def close():
+    return await _get_session().send(mm._make_command(mm.COMMAND_CLOSE))
+
+
+async def set_state(key, value):
+    return await _get_session().send(set_state_command(key, value))
+
+
+async def get_state(key):
+    return await _get_session().send_and_receive(mm._make_command(mm.COMMAND_GET_STATE, {
+        'key': key}))
+
+
+async def set_states(values: dict):
+    return await _get_session().send(set_states_command(values))
+
+
+async def read_state(key):
+    values = mm._read_state_snapshot()
+    if values is None:
+        return await get_state(key)
+    return values.get(key)
+
+
+async def get_states(keys: list):
+    return await _get_session().send_and_receive(mm._make_command(mm.COMMAND_GET_STATES, {
+        'keys': keys}))
+
+
+async def compare_and_set_states(expected: dict, values: dict):
+    return await _get_session().send_and_receive(mm._make_command(mm.COMMAND_COMPARE_AND_SET_STATES, {
+        'expected': expected,
+        'values': values}))
+
+
+async def subscribe_state(keys=None, address=None):
+    """
+    Async iterator over the state changes pushed by the marquee process, see
+    'marqueemanager.StateSubscription'. Uses a connection of its own
+    """
+    address = address if address is not None else mm._get_address()
+    reader, writer = await _open_connection(address, AsyncSession.TIMEOUT)
+    try:
+        writer.write(mm._encode_frame(mm._make_command(mm.COMMAND_SUBSCRIBE_STATE, {
+            'keys': keys})))
+        await writer.drain()
+        while True:
+            try:
+                header = await reader.readexactly(mm._FRAME_HEADER.size)
+            except asyncio.IncompleteReadError:
+                return
+            frame_size, = mm._FRAME_HEADER.unpack(header)
+            if frame_size > mm.MAX_FRAME_SIZE:
+                raise ValueError(f'Frame too large ({frame_size} bytes)')
+            frame = await reader.readexactly(frame_size)
+            changes, _ = mm._decode_payload(frame, allow_pickle=mm._codec == mm.CODEC_PICKLE)
+            yield changes
+    finally:
+        writer.close()
+
+
+async def get_metrics():
+    return await _get_session().send_and_receive(mm._make_command(mm.COMMAND_GET_METRICS))
+
+
+async def event(event: str, args: list[str]):
+    return await _get_session().send(event_command(event, args))
+
+
+async def handle_event(event: str, args: list[str]):
+    return await _get_session().send_and_receive(mm._make_command(mm.COMMAND_HANDLE_EVENT, {
+        'event': event,
+        'args': args}))
@@ -0,0 +1,752 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmarks for the marquee manager. Run with the name of a benchmark,
+e.g. 'python scripts/benchmark.py connection'
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from threading import Thread
+
+MM_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(MM_ROOT)
+import marqueemanager as mm
+
+
+def _start_listener(address=None, event_handlers=None):
+    """
+    Run the command listener on a background thread (no window needed)
+    """
+    mm.set_address(address)
+    command_queue = mm.CommandQueue()
+    thread = Thread(
+        target=mm._run_command_listener,
+        args=(command_queue, mm._get_address()),
+        kwargs={'event_handlers': event_handlers},
+        daemon=True)
+    thread.start()
+    t0 = time.time()
+    while not mm.noop():
+        assert time.time() - t0 < 5, 'Command listener did not start'
+        time.sleep(0.01)
+    return thread, command_queue
+
+
+def _stop_listener(thread, command_queue):
+    mm.close()
+    thread.join()
+    mm.set_address(None)
+
+
+def _import_main_globals():
+    """
+    Import the modules the marquee process imports in its __main__ block, for
+    benchmarks that render effects in this process
+    """
+    import ctypes
+    import math
+    mm._import_render_modules()
+    for name in ('c_int', 'c_ubyte', 'byref', 'cast', 'POINTER'):
+        setattr(mm, name, getattr(ctypes, name))
+    mm.math = math
+
+
+def _open_hidden_window(width, height):
+    mm.sdl2.SDL_Init(mm.sdl2.SDL_INIT_VIDEO)
+    window = mm.sdl2.SDL_CreateWindow(b'Benchmark', 0, 0, width, height, mm.sdl2.SDL_WINDOW_HIDDEN)
+    renderer = mm.sdl2.SDL_CreateRenderer(window, -1, 0)
+    return window, renderer
+
+
+def _close_hidden_window(window, renderer):
+    mm.sdl2.SDL_DestroyRenderer(renderer)
+    mm.sdl2.SDL_DestroyWindow(window)
+    mm.sdl2.SDL_Quit()
+
+
+def _report(name, count, elapsed):
+    print(f'{name:<48} {count / elapsed:>10.0f} commands/s {elapsed / count * 1e6:>10.1f} us/command')
+
+
+def bench_connection(count=2000):
+    """
+    Commands per second, one connection per command vs. a persistent session
+    """
+    thread, command_queue = _start_listener()
+    command = mm.show_image_command('/path/to/marquee.png', 64)
+
+    t0 = time.perf_counter()
+    for _ in range(count):
+        mm._send_marquee_command(command)
+    _report('connection per command', count, time.perf_counter() - t0)
+
+    with mm.Session() as session:
+        t0 = time.perf_counter()
+        for _ in range(count):
+            session.send(command)
+        # Round trip, so that all the pipelined commands have been received
+        session.send_and_receive(mm._make_command(mm.COMMAND_GET_STATE, {'key': None}))
+        _report('persistent session', count, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for _ in range(count // 10):
+        mm.get_state('key')
+    _report('get_state, connection per call', count // 10, time.perf_counter() - t0)
+
+    with mm.Session():
+        t0 = time.perf_counter()
+        for _ in range(count // 10):
+            mm.get_state('key')
+        _report('get_state, persistent session', count // 10, time.perf_counter() - t0)
+
+    _stop_listener(thread, command_queue)
+
+
+def bench_transport(count=2000):
+    """
+    Round trip latency of TCP vs. unix domain sockets
+    """
+    addresses = [(mm.HOST, mm.PORT)]
+    if hasattr(mm.socket, 'AF_UNIX'):
+        addresses.append('/tmp/marqueemanager-benchmark.sock')
+        if sys.platform.startswith('linux'):
+            addresses.append('@marqueemanager-benchmark')
+
+    for address in addresses:
+        thread, command_queue = _start_listener(address)
+        name = mm._address_to_str(address)
+
+        t0 = time.perf_counter()
+        for _ in range(count // 10):
+            mm.get_state('key')
+        _report(f'{name}, connection per call', count // 10, time.perf_counter() - t0)
+
+        with mm.Session():
+            t0 = time.perf_counter()
+            for _ in range(count):
+                mm.get_state('key')
+            _report(f'{name}, session', count, time.perf_counter() - t0)
+
+        _stop_listener(thread, command_queue)
+
+
+def _example_commands():
+    """
+    Commands similar to the ones sent by the ES-DE hook scripts
+    """
+    logos = [f'/home/user/marqueemanager/logos/logo_{idx}.svg' for idx in range(18)]
+    videos = [f'/home/user/ES-DE/downloaded_media/neogeo/videos/game_{idx}.mp4' for idx in range(48)]
+    marquee = '/home/user/ES-DE/downloaded_media/snes/marquees/Some Game (USA).png'
+    buttons = '/home/user/marqueemanager/graphics/buttons_main_flattened.svg'
+    return {
+        'game-select': mm._make_command(mm.COMMAND_COMMAND_LIST, {'commands': [
+            mm.clear_command(),
+            mm.set_background_color_command(0.25, 0.25, 0.25),
+            mm.play_videos_command([videos[0]], 0, 0.45, 'fill', 0.25),
+            mm.show_image_command(marquee, 64),
+            mm.flyout_command(buttons, 0.6, 0.45, 8, 1.5)]}),
+        'game-start': mm._make_command(mm.COMMAND_COMMAND_LIST, {'commands': [
+            mm.grow_image_command(marquee, 32, -128, 2, 'fadeout'),
+            mm.grow_image_command(marquee, 0, 16, 2.5, 'fadein')]}),
+        'system-select': mm._make_command(mm.COMMAND_COMMAND_LIST, {'commands': [
+            mm.play_videos_command(videos, 0, 0.45, 'fill', 0),
+            mm.horizontal_scroll_images_command(logos, 180, True, 125, 80, 0.6)]}),
+        'set-state': mm.set_state_command('_last_event', 'game-select'),
+    }
+
+
+def bench_codec(count=20000):
+    """
+    Encode/decode throughput and payload size, pickle vs. the binary wire format
+    """
+    for name, command in _example_commands().items():
+        for codec in (mm.CODEC_PICKLE, mm.CODEC_BINARY):
+            t0 = time.perf_counter()
+            for _ in range(count):
+                buffer = mm._encode_payload(command, codec, mm._PAYLOAD_COMMAND)
+            encode_time = time.perf_counter() - t0
+
+            buffer = bytes(buffer)
+            t0 = time.perf_counter()
+            for _ in range(count):
+                mm._decode_payload(buffer, allow_pickle=True)
+            decode_time = time.perf_counter() - t0
+
+            print(f'{name:<14} {codec:<7} {len(buffer):>6} bytes '
+                  f'encode {encode_time / count * 1e6:>7.2f} us '
+                  f'decode {decode_time / count * 1e6:>7.2f} us')
+
+
+def bench_listener(client_count=48, count=200):
+    """
+    Load test, many parallel clients doing state round trips while a few
+    misbehaving clients stall in the middle of a frame
+    """
+    thread, command_queue = _start_listener()
+
+    stalled_clients = []
+    for _ in range(4):
+        sock = mm._connect(mm._get_address(), 1)
+        sock.sendall(mm._FRAME_HEADER.pack(64) + b'partial')
+        stalled_clients.append(sock)
+
+    latencies = []
+    def client(idx):
+        with mm.Session() as session:
+            for _ in range(count):
+                t0 = time.perf_counter()
+                session.send(mm.set_state_command(f'key{idx}', idx))
+                assert session.send_and_receive(mm._make_command(mm.COMMAND_GET_STATE, {'key': f'key{idx}'})) == idx
+                latencies.append(time.perf_counter() - t0)
+                session.send(mm.show_image_command('/path/to/marquee.png', 64))
+
+    t0 = time.perf_counter()
+    threads = [Thread(target=client, args=(idx,)) for idx in range(client_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    print(f'{client_count} clients, {len(latencies) / elapsed:.0f} round trips/s, '
+          f'p50 {latencies[len(latencies) // 2] * 1e3:.2f} ms, '
+          f'p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.2f} ms, '
+          f'queue metrics {mm.get_metrics()}')
+
+    for sock in stalled_clients:
+        sock.close()
+    _stop_listener(thread, command_queue)
+
+
+def bench_state(count=500, key_count=8):
+    """
+    State round trips, one key per request vs. batched, reading the shared memory
+    snapshot, and the latency of state changes pushed to a subscriber
+    """
+    thread, command_queue = _start_listener()
+    keys = [f'key{idx}' for idx in range(key_count)]
+
+    with mm.Session():
+        t0 = time.perf_counter()
+        for _ in range(count):
+            for key in keys:
+                mm.set_state(key, 1)
+            for key in keys:
+                mm.get_state(key)
+        _report(f'{key_count} keys, set_state/get_state', count, time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        for _ in range(count):
+            mm.set_states({key: 1 for key in keys})
+            mm.get_states(keys)
+        _report(f'{key_count} keys, set_states/get_states', count, time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        for idx in range(count):
+            mm.compare_and_set_states({'_last_event': idx}, {'_last_event': idx + 1})
+        _report('compare_and_set_states', count, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for _ in range(count):
+        mm.get_state('_last_event')
+    _report('get_state, connection per call', count, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for _ in range(count * 10):
+        mm.read_state('_last_event')
+    _report('read_state, shared memory snapshot', count * 10, time.perf_counter() - t0)
+
+    with mm.StateSubscription(['counter']) as subscription, mm.Session():
+        subscription.receive(1)
+        latencies = []
+        for idx in range(count):
+            t0 = time.perf_counter()
+            mm.set_state('counter', idx)
+            assert subscription.receive(1) == {'counter': idx}
+            latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+        print(f'subscription push latency p50 {latencies[len(latencies) // 2] * 1e6:.1f} us, '
+              f'p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} us')
+
+    _stop_listener(thread, command_queue)
+
+
+def bench_startup(count=5):
+    """
+    Time until the marquee process is ready to receive commands, and until it has
+    rendered its first frame. The first run is cold (modules not in the OS file
+    cache, unless the marquee ran recently), the remaining runs are warm. Needs a display
+    """
+    assert not mm.noop(), 'Close the running marquee process first'
+    for idx in range(count):
+        t0 = time.time()
+        assert mm.start_marquee(mm.DISPLAY_DEBUG) == 1, 'Failed to start marquee process'
+        ready_time = time.time() - t0
+
+        while True:
+            metrics = mm.get_metrics()
+            if metrics is not None and metrics['firstframetime'] is not None:
+                break
+            time.sleep(0.001)
+        first_frame_time = metrics['firstframetime'] - t0
+
+        print(f'{"cold" if idx == 0 else "warm"}: ready {ready_time * 1e3:.1f} ms, first frame {first_frame_time * 1e3:.1f} ms')
+
+        mm.close()
+        while mm.noop():
+            time.sleep(0.01)
+
+
+def bench_images(count=3):
+    """
+    Time to load the logos at the height the scroller uses, decoding/rasterizing them
+    vs. mapping them from a (warm) raster cache. Needs SDL
+    """
+    import tempfile
+    mm._import_render_modules()
+    logos_folder = os.path.join(MM_ROOT, 'logos')
+    paths = [os.path.join(logos_folder, name) for name in sorted(os.listdir(logos_folder)) if name.endswith('.svg')]
+    HEIGHT = 360
+
+    def load_all():
+        t0 = time.perf_counter()
+        for _ in range(count):
+            for path in paths:
+                surface, pixels = mm._load_surface(path, height=HEIGHT, svg_aa_factor=0.6)
+                mm.sdl2.SDL_FreeSurface(surface)
+                if pixels is not None:
+                    pixels.close()
+        return (time.perf_counter() - t0) / count
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f'decode {len(paths)} logos         {load_all() * 1e3:>8.1f} ms')
+        mm._raster_cache = mm.RasterCache(folder)
+        load_all()
+        print(f'raster cache {len(paths)} logos   {load_all() * 1e3:>8.1f} ms')
+        mm._raster_cache = None
+
+
+def bench_scroller(frame_count=600, width=1920, height=360):
+    """
+    Draw calls and CPU time per frame of the logo scroller (as used on ES-DE startup),
+    rendering to a hidden window. Needs SDL
+    """
+    _import_main_globals()
+    window, renderer = _open_hidden_window(width, height)
+    mm._texture_cache = mm.TextureCache(renderer)
+
+    logos_folder = os.path.join(MM_ROOT, 'logos')
+    paths = [os.path.join(logos_folder, name) for name in sorted(os.listdir(logos_folder)) if name.endswith('.svg')]
+    t0 = time.perf_counter()
+    effect = mm.HorizontalScrollImagesEffect(renderer, paths, 180, True, 125, 80, 0.6)
+    print(f'create             {(time.perf_counter() - t0) * 1e3:>8.1f} ms ({len(paths)} logos)')
+
+    # Count the draw calls by wrapping the SDL functions the effects draw with
+    draw_calls = [0]
+    def counted(func):
+        def wrapper(*args):
+            draw_calls[0] += 1
+            return func(*args)
+        return wrapper
+    for name in ('SDL_RenderCopy', 'SDL_RenderCopyF', 'SDL_RenderCopyExF', 'SDL_RenderGeometry', 'SDL_RenderGeometryRaw'):
+        setattr(mm.sdl2, name, counted(getattr(mm.sdl2, name)))
+
+    render_time = 0.0
+    for _ in range(frame_count):
+        mm.sdl2.SDL_RenderClear(renderer)
+        t0 = time.perf_counter()
+        effect.render(renderer)
+        # Note: Flush so the time includes the renderer executing the draw calls
+        mm.sdl2.SDL_RenderFlush(renderer)
+        render_time += time.perf_counter() - t0
+        mm.sdl2.SDL_RenderPresent(renderer)
+    print(f'draw calls/frame   {draw_calls[0] / frame_count:>8.1f}')
+    print(f'render time/frame  {render_time / frame_count * 1e3:>8.3f} ms')
+
+    effect.cleanup()
+    mm._texture_cache.cleanup()
+    mm._texture_cache = None
+    _close_hidden_window(window, renderer)
+
+
+def bench_downscale(count=5, frame_count=300, width=1920, height=360):
+    """
+    Load time, texture size and render time of a large raster marquee (a logo saved
+    as a PNG at 4x the display height), at its native size vs. downscaled on load to
+    what the display can show. Needs SDL
+    """
+    import tempfile
+    import sdl2.sdlimage
+    _import_main_globals()
+    window, renderer = _open_hidden_window(width, height)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'marquee.png')
+        surface = mm._decode_surface(os.path.join(MM_ROOT, 'logos', 'logo_capcom.svg'), height * 4)
+        sdl2.sdlimage.IMG_SavePNG(surface, path.encode())
+        mm.sdl2.SDL_FreeSurface(surface)
+
+        for name, output_size in (('native', (0, 0)), ('downscaled', (width, height))):
+            if output_size == (0, 0):
+                mm._raster_image_box = (0, 0)
+            else:
+                mm._set_output_size(*output_size)
+
+            t0 = time.perf_counter()
+            for _ in range(count):
+                surface, pixels = mm._load_surface(path)
+                mm._free_surface(surface, pixels)
+            load_time = (time.perf_counter() - t0) / count
+
+            t0 = time.perf_counter()
+            for _ in range(count):
+                image = mm.Image(renderer, path)
+                image.cleanup()
+            create_time = (time.perf_counter() - t0) / count
+
+            effect = mm.ShowImageEffect(renderer, path, 8)
+            render_time = 0.0
+            for _ in range(frame_count):
+                mm.sdl2.SDL_RenderClear(renderer)
+                t0 = time.perf_counter()
+                effect.render(renderer)
+                mm.sdl2.SDL_RenderFlush(renderer)
+                render_time += time.perf_counter() - t0
+                mm.sdl2.SDL_RenderPresent(renderer)
+
+            print(f'{name:<12} {effect.image.width}x{effect.image.height}, texture {effect.image.byte_size / 1e6:.1f} MB, '
+                  f'load {load_time * 1e3:.1f} ms, load+upload {create_time * 1e3:.1f} ms, render {render_time / frame_count * 1e3:.3f} ms/frame')
+            effect.cleanup()
+
+    mm._raster_image_box = (0, 0)
+    _close_hidden_window(window, renderer)
+
+
+def _make_test_video(path, width, height, fps=30, seconds=10):
+    """
+    Write a test video (MPEG-4, moving gradients plus noise so it doesn't compress to nothing)
+    """
+    import cv2
+    import numpy as np
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    rng = np.random.default_rng(0)
+    for idx in range(fps * seconds):
+        frame = np.empty((height, width, 3), np.uint8)
+        frame[:, :, 0] = (x + idx * 4) % 256
+        frame[:, :, 1] = (y + idx * 2) % 256
+        frame[:, :, 2] = ((x + y) * 0.5 + idx) % 256
+        frame[::4, ::4] = rng.integers(0, 256, frame[::4, ::4].shape, np.uint8)
+        writer.write(frame)
+    writer.release()
+
+
+def bench_video(frame_count=600, video_width=1920, video_height=1080, width=1920, height=360):
+    """
+    Frame time jitter of the render loop playing a video, i.e. the time spent in the
+    video effect per (60 Hz) frame, not counting the renderer drawing it. Also reports
+    the CPU time of all threads (i.e. including decoding) per second of playback and
+    the decoder underruns/overruns. Needs SDL and OpenCV
+    """
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    _import_main_globals()
+    mm._import_video_modules()
+    window, renderer = _open_hidden_window(width, height)
+    mm._worker_pool = ThreadPoolExecutor(1)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'video.mp4')
+        _make_test_video(path, video_width, video_height)
+
+        effect = mm.VideoPlaybackEffect(renderer, [path], 0, 0.45, mm.FIT_FILL, 0)
+        frame_times = []
+        cpu_times = []
+        process_t0 = None
+        next_frame_time = time.perf_counter()
+        while len(frame_times) < frame_count:
+            mm.sdl2.SDL_RenderClear(renderer)
+            t0 = time.perf_counter()
+            cpu_t0 = time.thread_time()
+            effect.render(renderer)
+            # Note: Only count frames with a video, opening it is done on a worker thread
+            if effect.last_frame is not None:
+                frame_times.append(time.perf_counter() - t0)
+                cpu_times.append(time.thread_time() - cpu_t0)
+                if process_t0 is None:
+                    process_t0 = time.perf_counter(), time.process_time()
+            mm.sdl2.SDL_RenderPresent(renderer)
+            # Stand-in for vsync
+            next_frame_time += 1.0 / 60
+            time.sleep(max(0.0, next_frame_time - time.perf_counter()))
+        process_time = (time.process_time() - process_t0[1]) / (time.perf_counter() - process_t0[0])
+        effect.cleanup()
+        mm.VideoDecoder.join_threads()
+
+    # Note: The wall time includes other threads (e.g. the decoder) preempting the render
+    # thread, which only happens when there are fewer cores than busy threads
+    for name, times in (('wall', frame_times), ('render thread cpu', cpu_times)):
+        times.sort()
+        mean = sum(times) / len(times)
+        std = (sum((t - mean) ** 2 for t in times) / len(times)) ** 0.5
+        print(f'{video_width}x{video_height} video, {name}: mean {mean * 1e3:.2f} ms, p50 {times[len(times) // 2] * 1e3:.2f} ms, '
+              f'p99 {times[int(len(times) * 0.99)] * 1e3:.2f} ms, max {times[-1] * 1e3:.2f} ms, '
+              f'std {std * 1e3:.2f} ms, over 16.7 ms: {sum(t > 1.0 / 60 for t in times)}')
+    print(f'{video_width}x{video_height} video on {width}x{height}, process cpu: {process_time * 1e3:.0f} ms/s')
+    video_metrics = getattr(mm, '_video_metrics', None)
+    if video_metrics is not None:
+        print(f'underruns {video_metrics["videounderruns"]}, overruns {video_metrics["videooverruns"]}')
+
+    mm._worker_pool.shutdown()
+    mm._worker_pool = None
+    _close_hidden_window(window, renderer)
+
+
+def bench_playlist(clip_count=9, clip_seconds=1, width=384, height=72):
+    """
+    Gaps at the transitions between the clips of a video playlist, i.e. the longest
+    time between two new frames, the frames drawn without a video and the render thread
+    time per frame. The clips have different sizes, some end up with the same texture
+    size (on the default output). Needs SDL and OpenCV
+    """
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    _import_main_globals()
+    mm._import_video_modules()
+    window, renderer = _open_hidden_window(width, height)
+    mm._worker_pool = ThreadPoolExecutor(1)
+    fps = 30
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for video_width, video_height in ((640, 360), (480, 270), (320, 240)):
+            path = os.path.join(folder, f'{video_width}x{video_height}.mp4')
+            _make_test_video(path, video_width, video_height, fps=fps, seconds=clip_seconds)
+            paths.append(path)
+
+        effect = mm.VideoPlaybackEffect(renderer, paths, 0, 0.45, mm.FIT_FILL, 0)
+        upload_times = []
+        copy_frame_to_tex = effect._copy_frame_to_tex
+
+        def timed_copy_frame_to_tex(frame, tex):
+            upload_times.append(time.perf_counter())
+            copy_frame_to_tex(frame, tex)
+        effect._copy_frame_to_tex = timed_copy_frame_to_tex
+
+        cpu_times = []
+        blank_count = 0
+        next_frame_time = time.perf_counter()
+        end_time = next_frame_time + clip_count * clip_seconds
+        while time.perf_counter() < end_time:
+            mm.sdl2.SDL_RenderClear(renderer)
+            cpu_t0 = time.thread_time()
+            effect.render(renderer)
+            cpu_times.append(time.thread_time() - cpu_t0)
+            if upload_times and effect.last_frame is None:
+                blank_count += 1
+            mm.sdl2.SDL_RenderPresent(renderer)
+            next_frame_time += 1.0 / 60
+            time.sleep(max(0.0, next_frame_time - time.perf_counter()))
+        effect.cleanup()
+        mm.VideoDecoder.join_threads()
+
+    gaps = sorted(t1 - t0 for t0, t1 in zip(upload_times, upload_times[1:]))
+    cpu_times.sort()
+    print(f'{clip_count} x {clip_seconds} s clips on {width}x{height}: longest gap between frames {gaps[-1] * 1e3:.0f} ms, '
+          f'gaps over 2 frames: {sum(gap > 2.0 / fps for gap in gaps)}, blank frames: {blank_count}, '
+          f'render thread p99 {cpu_times[int(len(cpu_times) * 0.99)] * 1e3:.2f} ms, max {cpu_times[-1] * 1e3:.2f} ms')
+
+    mm._worker_pool.shutdown()
+    mm._worker_pool = None
+    _close_hidden_window(window, renderer)
+
+
+def bench_upload(count=120, video_width=1920, video_height=1080, fps=30):
+    """
+    Render thread time and bytes per second spent uploading video frames at 60 Hz, for
+    the texture formats the renderer supports, vs. locking an ABGR texture and
+    copying the BGR frame and alpha channel into it every rendered frame (not
+    counting drawing the texture). Needs SDL and OpenCV
+    """
+    import ctypes
+    import cv2
+    import numpy as np
+    _import_main_globals()
+    window, renderer = _open_hidden_window(384, 72)
+    w, h = video_width, video_height
+    bgr = np.random.default_rng(0).integers(0, 256, (h, w, 3), np.uint8)
+
+    def lock_and_copy(frame, tex):
+        pixels = ctypes.c_void_p()
+        pitch = ctypes.c_int()
+        mm.sdl2.SDL_LockTexture(tex, None, ctypes.byref(pixels), ctypes.byref(pitch))
+        buffer = ctypes.cast(pixels, ctypes.POINTER(ctypes.c_ubyte * (pitch.value * h))).contents
+        tex_pixels = np.ndarray((h, w, pitch.value // w), np.uint8, buffer=buffer)
+        np.copyto(tex_pixels[:, :, 1:4], frame)
+        tex_pixels[:, :, 0] = 255
+        mm.sdl2.SDL_UnlockTexture(tex)
+
+    # Name, texture format, frame, upload function, bytes read and written per upload
+    # (by the render thread) and uploads per second
+    runs = [('lock + copy', mm.sdl2.SDL_PIXELFORMAT_ABGR32, bgr, lock_and_copy, w * h * (3 + 4 + 4), 60)]
+    effect = mm.VideoPlaybackEffect(renderer, [], 0, 1.0, mm.FIT_FILL, 0)
+    tex_format = effect._get_texture_format(renderer, w, h)
+    formats = {tex_format, mm.sdl2.SDL_PIXELFORMAT_BGRA32}
+    for tex_format in sorted(formats):
+        if tex_format == mm.sdl2.SDL_PIXELFORMAT_IYUV:
+            frame = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420)
+        else:
+            frame = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)
+        name = mm.sdl2.SDL_GetPixelFormatName(tex_format).decode().replace('SDL_PIXELFORMAT_', '')
+        runs.append((name, tex_format, frame, effect._copy_frame_to_tex, frame.nbytes, fps))
+
+    for name, tex_format, frame, upload, frame_bytes, uploads_per_second in runs:
+        tex = mm.sdl2.SDL_CreateTexture(renderer, tex_format, mm.sdl2.SDL_TEXTUREACCESS_STREAMING, w, h)
+        effect.tex_format = tex_format
+        times = []
+        for _ in range(count):
+            cpu_t0 = time.thread_time()
+            upload(frame, tex)
+            mm.sdl2.SDL_RenderFlush(renderer)
+            times.append(time.thread_time() - cpu_t0)
+        mm.sdl2.SDL_DestroyTexture(tex)
+        mean = sum(times) / count
+        print(f'{w}x{h} {name:<12} {mean * 1e3:>7.2f} ms/upload, {mean * uploads_per_second * 1e3:>7.1f} ms/s, '
+              f'{frame_bytes * uploads_per_second / 1e6:>7.1f} MB/s')
+
+    _close_hidden_window(window, renderer)
+
+
+def bench_catchup(stall_count=5, stall_seconds=0.5, video_width=1280, video_height=720, width=384, height=72):
+    """
+    How quickly video playback catches up after the render loop stalls (e.g. handling
+    a long command list), i.e. the time until the presented frame is due again and the
+    CPU time (all threads) spent meanwhile. Also reports the frames the decoder
+    skipped. Needs SDL and OpenCV
+    """
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    _import_main_globals()
+    mm._import_video_modules()
+    window, renderer = _open_hidden_window(width, height)
+    mm._worker_pool = ThreadPoolExecutor(1)
+
+    def render_frame():
+        mm.sdl2.SDL_RenderClear(renderer)
+        effect.render(renderer)
+        mm.sdl2.SDL_RenderPresent(renderer)
+        time.sleep(1.0 / 60)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'video.mp4')
+        _make_test_video(path, video_width, video_height, seconds=stall_count * 3)
+
+        effect = mm.VideoPlaybackEffect(renderer, [path], 0, 0.45, mm.FIT_FILL, 0)
+        while effect.last_frame is None:
+            render_frame()
+        recovery_times = []
+        cpu_times = []
+        for _ in range(stall_count):
+            for _ in range(60):
+                render_frame()
+            time.sleep(stall_seconds)
+            t0 = time.perf_counter()
+            cpu_t0 = time.process_time()
+            while True:
+                render_frame()
+                decoder = effect.decoder
+                timestamp = decoder.timestamps[decoder.read_count % decoder.ring_size]
+                if time.time() - decoder.start_time - timestamp < 2.0 / decoder.fps or decoder.ended:
+                    break
+            recovery_times.append(time.perf_counter() - t0)
+            cpu_times.append(time.process_time() - cpu_t0)
+        effect.cleanup()
+        mm.VideoDecoder.join_threads()
+
+    print(f'{video_width}x{video_height} video, {stall_seconds * 1e3:.0f} ms stalls: '
+          f'caught up in {sum(recovery_times) / stall_count * 1e3:.1f} ms (max {max(recovery_times) * 1e3:.1f} ms), '
+          f'{sum(cpu_times) / stall_count * 1e3:.1f} ms cpu')
+    print(', '.join(f'{name} {value}' for name, value in mm._video_metrics.items()))
+
+    mm._worker_pool.shutdown()
+    mm._worker_pool = None
+    _close_hidden_window(window, renderer)
+
+
+def bench_hooks(count=10):
+    """
+    Wall time per ES-DE 'game-select' event, the hook script (which sends the event
+    to the handler in the marquee process) vs. marqueectl sending the commands or the event
+    """
+    event_handlers = mm._load_event_handlers(os.path.join(MM_ROOT, 'scripts', 'es-de', 'events.py'))
+    thread, command_queue = _start_listener(event_handlers=event_handlers)
+
+    # Note: The hook scripts import marqueemanager from their hard-coded MM_ROOT. Also make
+    # sure cached bytecode is used, as it would be on the cabinet
+    env = dict(os.environ, PYTHONPATH=MM_ROOT)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    hook_args = ['/roms/snes/Some Game (USA).sfc', 'Some Game', 'snes', 'Super Nintendo']
+    commands = json.dumps([
+        ['clear'],
+        ['set_background_color', 0.25, 0.25, 0.25],
+        ['play_videos', ['/ES-DE/downloaded_media/snes/videos/Some Game (USA).mp4'], 0, 0.45, 'fill', 0.25],
+        ['show_image', '/ES-DE/downloaded_media/snes/marquees/Some Game (USA).png', 64],
+        ['flyout', os.path.join(MM_ROOT, 'graphics', 'buttons_main_flattened.svg'), 0.6, 0.45, 8, 1.5],
+        ['set_state', '_last_event', 'game-select']])
+    event = json.dumps([['event', 'game-select', hook_args]])
+
+    runs = {
+        'hook script': ([sys.executable, os.path.join(MM_ROOT, 'scripts', 'es-de', 'game-select.py')] + hook_args, None),
+        'marqueectl': ([sys.executable, os.path.join(MM_ROOT, 'marqueectl.py')], commands),
+        'marqueectl (python -S)': ([sys.executable, '-S', os.path.join(MM_ROOT, 'marqueectl.py')], commands),
+        'marqueectl event': ([sys.executable, '-S', os.path.join(MM_ROOT, 'marqueectl.py')], event),
+    }
+    for name, (args, stdin) in runs.items():
+        t0 = time.perf_counter()
+        for _ in range(count):
+            subprocess.run(args, input=stdin, env=env, text=True, capture_output=True, check=True)
+        print(f'{name:<24} {(time.perf_counter() - t0) / count * 1e3:>8.1f} ms/event')
+
+    # Time spent in the event handler, on the command listener thread
+    handler = event_handlers['game-select']
+    t0 = time.perf_counter()
+    for _ in range(count * 100):
+        handler(hook_args, {})
+    print(f'{"event handler":<24} {(time.perf_counter() - t0) / (count * 100) * 1e3:>8.3f} ms/event')
+
+    _stop_listener(thread, command_queue)
+
+
+BENCHMARKS = {
+    'connection': bench_connection,
+    'transport': bench_transport,
+    'codec': bench_codec,
+    'listener': bench_listener,
+    'state': bench_state,
+    'startup': bench_startup,
+    'hooks': bench_hooks,
+    'images': bench_images,
+    'scroller': bench_scroller,
+    'downscale': bench_downscale,
+    'video': bench_video,
+    'playlist': bench_playlist,
+    'upload': bench_upload,
+    'catchup': bench_catchup,
+}
+
+
+# Benchmarks that need a display (and SDL etc.), only run when named explicitly
+DISPLAY_BENCHMARKS = {'startup', 'images', 'scroller', 'downscale', 'video', 'playlist', 'upload', 'catchup'}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] if len(sys.argv) > 1 else [name for name in BENCHMARKS if name not in DISPLAY_BENCHMARKS]
+    for name in names:
+        print(f'[{name}]')
+        BENCHMARKS[name]()
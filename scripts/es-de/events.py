@@ -0,0 +1,112 @@
+"""
+ES-DE event handlers, run inside the marquee process (see 'utils.send_event').
+Each handler gets the arguments ES-DE passed to the hook script and the marquee
+state store, and returns the commands that build the scene for the event
+"""
+
+import os
+import random
+
+import utils
+
+mm = utils.get_marquee_manager()
+
+EVENT_HANDLERS = {}
+
+
+def event_handler(event_name):
+    """
+    Register a handler for an event. The event is recorded as the last event once the handler has run
+    """
+    def register(handler):
+        def handle_event(args, state):
+            commands = handler(args, state)
+            state[utils.LAST_EVENT_KEY] = event_name
+            return commands
+        EVENT_HANDLERS[event_name] = handle_event
+        return handler
+    return register
+
+
+@event_handler('startup')
+def startup(args, state):
+    return [
+        mm.clear_command(),
+        mm.set_background_color_command(0, 0, 0),
+    ]
+
+
+@event_handler('system-select')
+def system_select(args, state):
+    # Only update the UI if we transition to system-select from something different
+    if not args or state.get(utils.LAST_EVENT_KEY) == 'system-select':
+        return None
+
+    VIDEO_COUNT = 48
+    # Note: Pick video from the 'neogeo' system because they generally look attractive
+    video_paths = utils.get_random_video_paths(system='neogeo', count=VIDEO_COUNT)
+
+    logo_images = utils.get_logo_paths()
+    random.shuffle(logo_images)
+
+    info_img_path = os.path.join(utils.get_graphics_folder(), 'buttons_main_flattened.svg')
+
+    return [
+        mm.clear_command(),
+        mm.set_background_color_command(0.25, 0.25, 0.25),
+        mm.play_videos_command(video_paths, 0, 0.45, 'fill', 0),
+        mm.horizontal_scroll_images_command(logo_images, 180, True, 125, 80, svg_aa_factor=0.6),
+        mm.flyout_command(info_img_path, 0.6, 0.45, 8, 3),
+    ]
+
+
+@event_handler('game-select')
+def game_select(args, state):
+    if len(args) < 4:
+        return None
+
+    rom_path, game_name, sys_name, sys_full_name = args[:4]
+    rom_name = utils.rom_name_from_rom_path(rom_path)
+
+    marquee_image_path = utils.get_marquee_image_path_for(sys_name, rom_name)
+    video_path = utils.get_video_path_for(sys_name, rom_name)
+    info_img_path = os.path.join(utils.get_graphics_folder(), 'buttons_main_flattened.svg')
+
+    return [
+        mm.clear_command(),
+        mm.set_background_color_command(0.25, 0.25, 0.25),
+        mm.play_videos_command([video_path], 0, 0.45, 'fill', 0.25),
+        mm.show_image_command(marquee_image_path, 64),
+        mm.flyout_command(info_img_path, 0.6, 0.45, 8, 1.5),
+    ]
+
+
+@event_handler('game-start')
+def game_start(args, state):
+    if len(args) < 3:
+        return None
+
+    rom_path = args[0]
+    rom_system = args[2]
+    rom_name = utils.rom_name_from_rom_path(rom_path)
+
+    video_path = utils.get_video_path_for(rom_system, rom_name)
+    marquee_image_path = utils.get_marquee_image_path_for(rom_system, rom_name)
+    info_img_path = os.path.join(utils.get_graphics_folder(), 'buttons_flattened.svg')
+
+    return [
+        mm.clear_command(),
+        mm.set_background_color_command(0.25, 0.25, 0.25),
+        mm.play_videos_command([video_path], 0, 0.45, 'fill', 0),
+        mm.grow_image_command(marquee_image_path, 32, -128, 2, 'fadeout'),
+        mm.grow_image_command(marquee_image_path, 0, 16, 2.5, 'fadein'),
+        #mm.show_image_command(marquee_image_path, 32),
+        #mm.pulse_image_command(marquee_image_path),
+        mm.flyout_command(info_img_path, 0.6, 0.45, 8, 0),
+    ]
+
+
+@event_handler('game-end')
+def game_end(args, state):
+    # Note: Nothing to do here (for now), since the "game-select" event handles game termination
+    return None
@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 
+import sys
 import utils
 
 EVENT_NAME = 'game-end'
 print(EVENT_NAME)
 
-# Note: Nothing to do here (for now), since the "game-select" event handles game termination
-
-utils.set_last_event(EVENT_NAME)
\ No newline at end of file
+# Note: The scene is built by the handler in 'events.py', which runs in the marquee process
+utils.send_event(EVENT_NAME, sys.argv[1:])
\ No newline at end of file
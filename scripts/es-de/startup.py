@@ -1,14 +1,10 @@
 #!/usr/bin/env python3
 
+import sys
 import utils
 
 EVENT_NAME = 'startup'
 print(EVENT_NAME)
 
-mm = utils.get_marquee_manager()
-
-if mm.start_marquee() >= 0:
-    mm.clear()
-    mm.set_background_color(0, 0, 0)
-
-utils.set_last_event(EVENT_NAME)
\ No newline at end of file
+# Note: The scene is built by the handler in 'events.py', which runs in the marquee process
+utils.send_event(EVENT_NAME, sys.argv[1:])
\ No newline at end of file
@@ -2,36 +2,9 @@
 
 import sys
 import utils
-import random
-import os
 
 EVENT_NAME = 'system-select'
 print(EVENT_NAME)
 
-if len(sys.argv) > 1:
-
-    mm = utils.get_marquee_manager()
-
-    if mm.start_marquee() >= 0:
-
-        last_event = utils.get_last_event()
-
-        # Only update the UI if we transition to system-select from something different
-        if last_event != EVENT_NAME:
-
-            mm.clear()
-            mm.set_background_color(0.25, 0.25, 0.25),
-
-            VIDEO_COUNT = 48
-            # Note: Pick video from the 'neogeo' system because they generally look attractive
-            video_paths = utils.get_random_video_paths(system='neogeo', count=VIDEO_COUNT)
-            mm.play_videos(video_paths, 0, 0.45, 'fill', 0),
-
-            logo_images = utils.get_logo_paths()
-            random.shuffle(logo_images)
-            mm.horizontal_scroll_images(logo_images, 180, True, 125, 80, svg_aa_factor=0.6)
-
-            info_img_path = os.path.join(utils.get_graphics_folder(), 'buttons_main_flattened.svg')
-            mm.flyout(info_img_path, 0.6, 0.45, 8, 3)
-
-utils.set_last_event(EVENT_NAME)
\ No newline at end of file
+# Note: The scene is built by the handler in 'events.py', which runs in the marquee process
+utils.send_event(EVENT_NAME, sys.argv[1:])
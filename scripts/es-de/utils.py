@@ -1,12 +1,13 @@
 import sys
 import os
 import random
-from pathlib import Path
+import time
 
 MM_ROOT = '/home/thomas/Arcade/marqueemanager'
 ES_ROOT = '/home/thomas/ES-DE'
 LAST_EVENT_KEY = '_last_event'
 DOWNLOADED_MEDIA = 'downloaded_media'
+EVENT_HANDLERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'events.py')
 
 sys.path.append(MM_ROOT)
 import marqueemanager as mm
@@ -24,6 +25,32 @@ def get_marquee_manager():
     return mm
 
 
+def _stop_marquee():
+    """
+    Close the marquee process and wait (a bit) until it stopped listening
+    """
+    mm.close()
+    t0 = time.time()
+    while mm.noop() and time.time() - t0 < 2:
+        time.sleep(0.05)
+
+
+def send_event(event, args):
+    """
+    Send an event to the marquee process, which runs the handler in 'events.py'. The
+    marquee process is only started if it isn't running, or restarted if it runs without
+    the handlers (e.g. it was started by 'marqueectl.py'), so usually this is a single
+    round trip
+    """
+    result = mm.handle_event(event, args)
+    if result == mm.EVENT_NO_HANDLERS:
+        _stop_marquee()
+    if result in (None, mm.EVENT_NO_HANDLERS) and mm.start_marquee(event_handlers=EVENT_HANDLERS_PATH) >= 0:
+        result = mm.handle_event(event, args)
+    if result != mm.EVENT_HANDLED:
+        print(f'{event} not handled by the marquee process ({result})')
+
+
 def get_logos_folder():
     return os.path.join(MM_ROOT, 'logos')
 
@@ -60,25 +87,58 @@ def get_video_folder_for(system):
     return os.path.join(ES_ROOT, DOWNLOADED_MEDIA, system, 'videos')
 
 
+# Directory listings, by folder. The event handlers run in the (long running) marquee
+# process, so we only scan a folder again if it, or one of the subfolders the scan
+# walked, was modified since
+_listing_cache = {}
+
+
+def _get_mtimes(folders):
+    try:
+        return [os.stat(folder).st_mtime_ns for folder in folders]
+    except FileNotFoundError:
+        return None
+
+
+def _cached_listing(folder, scan):
+    cached = _listing_cache.get(folder)
+    if cached is None or _get_mtimes(cached[0]) != cached[1]:
+        listing, folders = scan(folder)
+        cached = (folders, _get_mtimes(folders), listing)
+        _listing_cache[folder] = cached
+    return list(cached[2])
+
+
+def _scan_videos(folder):
+    all = []
+    folders = []
+    for path, _, files in os.walk(folder):
+        folders.append(path)
+        for file in files:
+            if file.endswith('.mp4'):
+                all.append(_clean_path(os.path.join(path, file)))
+    return all, folders
+
+
+def _scan_logos(folder):
+    images = []
+    for f in os.listdir(folder):
+        if f.lower().endswith('.svg'):
+            images.append(os.path.join(folder, f))
+    return images, [folder]
+
+
 def get_random_video_paths(system=None, count=1):
     folder = None
     if system is None:
         folder = os.path.join(ES_ROOT, DOWNLOADED_MEDIA)
     else:
         folder = get_video_folder_for(system)
-    all = []
-    for file in Path(folder).rglob('*.mp4'):
-        full_path = _clean_path(os.path.join(folder, file))
-        all.append(full_path)
+    all = _cached_listing(folder, _scan_videos)
     random.shuffle(all)
     result = all[0:count]
     return result
 
 
 def get_logo_paths():
-    images = []
-    logos_folder = get_logos_folder()
-    for f in os.listdir(logos_folder):
-        if f.lower().endswith('.svg'):
-            images.append(os.path.join(logos_folder, f))
-    return images
+    return _cached_listing(get_logos_folder(), _scan_logos)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+Pre-populate the raster cache of the marquee manager for whole media trees, so the
+marquee process finds the images already decoded/rasterized, e.g.:
+
+    python scripts/warmcache.py logos graphics ~/ES-DE/downloaded_media
+
+SVGs are rasterized at the sizes the effects use, and larger raster images are
+downscaled, which depends on the size of the marquee display (queried from the
+display unless given with '--width' and '--height')
+"""
+
+import argparse
+import os
+import sys
+import time
+
+MM_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(MM_ROOT)
+import marqueemanager as mm
+
+IMAGE_EXTENSIONS = ('.svg', '.png', '.jpg', '.jpeg')
+
+# Sizes SVGs are rasterized at, as (fraction of the display height, SVG AA factor). The
+# defaults match what the ES-DE scripts use, i.e. full height images, the logo scroller
+# and the button flyouts
+DEFAULT_SIZES = ['1.0:1.0', '1.0:0.6', '0.45:1.0']
+
+
+def get_display_size(display_idx):
+    mm.sdl2.SDL_Init(mm.sdl2.SDL_INIT_VIDEO)
+    try:
+        bounds = mm._get_marquee_display_bounds(display_idx)
+        return bounds.w, bounds.h
+    finally:
+        mm.sdl2.SDL_Quit()
+
+
+def parse_size(size):
+    height_scale, _, svg_aa_factor = size.partition(':')
+    return float(height_scale), float(svg_aa_factor or 1)
+
+
+def find_images(folders, height, sizes):
+    """
+    Find the images in the folders, yields the path, height and SVG AA factor to load each at
+    """
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if name.lower().endswith('.svg'):
+                    # Note: Heights are computed like the effects do (see 'mm._get_effect_images'),
+                    # otherwise the marquee process wouldn't find the cache entries
+                    for height_scale, svg_aa_factor in sizes:
+                        yield path, int(height * height_scale), svg_aa_factor
+                elif name.lower().endswith(IMAGE_EXTENSIONS):
+                    # Note: Raster images are loaded at one size, see 'mm._set_output_size'
+                    yield path, 0, 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-populate the raster cache of the marquee manager')
+    parser.add_argument('folders', nargs='+', help='folders to scan (recursively) for images')
+    parser.add_argument('--display', type=int, default=mm.DISPLAY_ONLY_MARQUEE, help='marquee display index')
+    parser.add_argument('--width', type=int, help='width of the marquee display in pixels')
+    parser.add_argument('--height', type=int, help='height of the marquee display in pixels')
+    parser.add_argument('--size', action='append', dest='sizes', metavar='SCALE:AA',
+                        help=f'size to rasterize SVGs at, as fraction of the display height and SVG AA factor (default: {" ".join(DEFAULT_SIZES)})')
+    parser.add_argument('--cache-dir', default=mm._get_raster_cache_dir(), help='raster cache folder')
+    parser.add_argument('--max-bytes', type=int, default=mm.RASTER_CACHE_MAX_BYTES, help='raster cache size limit')
+    args = parser.parse_args()
+
+    mm._import_render_modules()
+    if args.width and args.height:
+        width, height = args.width, args.height
+    else:
+        width, height = get_display_size(args.display)
+    mm._set_output_size(width, height)
+    sizes = [parse_size(size) for size in args.sizes or DEFAULT_SIZES]
+
+    cache = mm.RasterCache(args.cache_dir, args.max_bytes)
+    mm._raster_cache = cache
+
+    t0 = time.time()
+    failed_count = 0
+    for path, image_height, svg_aa_factor in find_images(args.folders, height, sizes):
+        # Note: Stop once the cache is full, otherwise we'd evict what we just added
+        if cache.is_full():
+            print(f'Raster cache is full ({args.max_bytes} bytes), stopping')
+            break
+        try:
+            surface, pixels = mm._load_surface(path, height=image_height, svg_aa_factor=svg_aa_factor)
+        except Exception as ex:
+            print(f'Failed to load {path}: {ex}')
+            failed_count += 1
+            continue
+        mm.sdl2.SDL_FreeSurface(surface)
+        if pixels is not None:
+            pixels.close()
+
+    print(f'{cache.miss_count} images added, {cache.hit_count} already cached, {failed_count} failed '
+          f'in {time.time() - t0:.1f} s ({args.cache_dir})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Tests for the raster cache. Need SDL (pysdl2 with SDL_image), run headless with
+e.g. SDL_VIDEODRIVER=offscreen:
+
+    python -m unittest discover tests
+"""
+
+import ctypes
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+MM_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, MM_ROOT)
+import marqueemanager as mm
+
+try:
+    mm._import_render_modules()
+except ImportError:
+    mm.sdl2 = None
+
+
+def _import_warmcache():
+    spec = importlib.util.spec_from_file_location('warmcache', os.path.join(MM_ROOT, 'scripts', 'warmcache.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@unittest.skipIf(mm.sdl2 is None, 'SDL is not available')
+class StoreTest(unittest.TestCase):
+    """
+    The cache size must match the entries on disk, also when an entry is stored again
+    """
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = mm.RasterCache(self.cache_dir)
+        self.surface = mm.sdl2.SDL_CreateRGBSurfaceWithFormat(0, 64, 32, 32, mm.sdl2.SDL_PIXELFORMAT_ARGB8888).contents
+
+    def tearDown(self):
+        mm.sdl2.SDL_FreeSurface(self.surface)
+        shutil.rmtree(self.cache_dir)
+
+    def _disk_bytes(self):
+        return sum(size for _, size, _ in self.cache._list_entries())
+
+    def test_store_again(self):
+        image_path = os.path.join(MM_ROOT, 'graphics', 'buttons_main_flattened.svg')
+        other_path = os.path.join(MM_ROOT, 'tests', 'test_raster_cache.py')
+        self.cache.store(image_path, 32, 64, 1, self.surface)
+        self.cache.store(other_path, 32, 64, 1, self.surface)
+        for _ in range(3):
+            self.cache.store(image_path, 32, 64, 1, self.surface)
+        self.assertEqual(len(self.cache._list_entries()), 2)
+        self.assertEqual(self.cache.total_bytes, self._disk_bytes())
+
+
+@unittest.skipIf(mm.sdl2 is None, 'SDL is not available')
+class WarmCacheTest(unittest.TestCase):
+    """
+    An image cache warmed with 'warmcache.py' must be hit by the marquee process
+    """
+    WIDTH = 1920
+    HEIGHT = 360
+
+    def setUp(self):
+        # Globals the marquee process imports in its __main__ block
+        for name in ('c_int', 'c_ubyte', 'byref', 'cast', 'POINTER'):
+            setattr(mm, name, getattr(ctypes, name))
+        sdl2 = mm.sdl2
+        if sdl2.SDL_Init(sdl2.SDL_INIT_VIDEO) != 0:
+            self.skipTest('No video driver, try SDL_VIDEODRIVER=offscreen')
+        self.window = sdl2.SDL_CreateWindow(b'Test', 0, 0, self.WIDTH, self.HEIGHT, sdl2.SDL_WINDOW_HIDDEN)
+        self.renderer = sdl2.SDL_CreateRenderer(self.window, -1, sdl2.SDL_RENDERER_SOFTWARE)
+        self.cache_dir = tempfile.mkdtemp()
+        mm._raster_cache = mm.RasterCache(self.cache_dir)
+        mm._set_output_size(self.WIDTH, self.HEIGHT)
+
+    def tearDown(self):
+        mm._raster_cache = None
+        shutil.rmtree(self.cache_dir)
+        mm._close_marquee_window(self.window, self.renderer)
+
+    def test_warmed_images_are_hit(self):
+        warmcache = _import_warmcache()
+        sizes = [warmcache.parse_size(size) for size in warmcache.DEFAULT_SIZES]
+        graphics_folder = os.path.join(MM_ROOT, 'graphics')
+        for path, height, svg_aa_factor in warmcache.find_images([graphics_folder], self.HEIGHT, sizes):
+            mm._free_surface(*mm._load_surface(path, height=height, svg_aa_factor=svg_aa_factor))
+
+        # The commands the ES-DE scripts send, as received by the marquee process
+        image_path = os.path.join(graphics_folder, 'buttons_main_flattened.svg')
+        commands = [
+            mm.show_image_command(image_path, 64),
+            mm.flyout_command(image_path, 0.6, 0.45, 8, 1.5),
+            mm.horizontal_scroll_images_command([image_path], 180, True, 125, 80, svg_aa_factor=0.6),
+        ]
+        cache = mm._raster_cache
+        cache.hit_count = cache.miss_count = 0
+        for command in commands:
+            buffer = mm._encode_payload(command, mm.CODEC_BINARY, mm._PAYLOAD_COMMAND)
+            command, _ = mm._decode_payload(bytes(buffer), allow_pickle=False)
+            prepared = mm._prepare_images(mm._get_effect_images(command, self.renderer))
+            mm._free_prepared_images(prepared)
+
+        self.assertEqual(cache.miss_count, 0)
+        self.assertEqual(cache.hit_count, len(commands))
+
+
+if __name__ == '__main__':
+    unittest.main()
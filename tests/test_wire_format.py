@@ -0,0 +1,48 @@
+"""
+Tests for the binary wire format:
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import marqueemanager as mm
+
+
+def _command_payload(opcode, body):
+    buffer = bytearray(mm._HEADER.pack(mm._WIRE_MAGIC, mm.WIRE_FORMAT_VERSION, mm._PAYLOAD_COMMAND))
+    mm._write_varint(buffer, 0)
+    buffer.append(opcode)
+    return bytes(buffer + body)
+
+
+class NestingTest(unittest.TestCase):
+    """
+    Deeply nested payloads from a client must be rejected, not exhaust the stack
+    """
+    def test_nested_values(self):
+        body = bytes([mm._VALUE_LIST, 1]) * 10000 + bytes([mm._VALUE_NONE])
+        payload = _command_payload(mm._OPCODES[mm.COMMAND_GET_STATE], body)
+        with self.assertRaises(ValueError):
+            mm._decode_payload(payload, allow_pickle=False)
+
+    def test_nested_command_lists(self):
+        body = bytes([mm._OPCODES[mm.COMMAND_COMMAND_LIST], 1]) * 10000 + bytes([mm._OPCODES[mm.COMMAND_NOOP]])
+        payload = _command_payload(mm._OPCODES[mm.COMMAND_COMMAND_LIST], bytes([1]) + body)
+        with self.assertRaises(ValueError):
+            mm._decode_payload(payload, allow_pickle=False)
+
+    def test_nesting_within_limit(self):
+        value = None
+        for _ in range(mm._MAX_NESTING):
+            value = [value]
+        command = mm.set_state_command('key', value)
+        payload = bytes(mm._encode_payload(command, mm.CODEC_BINARY, mm._PAYLOAD_COMMAND))
+        self.assertEqual(mm._decode_payload(payload, allow_pickle=False), (command, mm.CODEC_BINARY))
+
+
+if __name__ == '__main__':
+    unittest.main()